@@ -1,10 +1,75 @@
 # app/api/deps.py
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from fastapi import Depends, HTTPException, Query, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.routing import WROTE
 from app.db.session import SessionLocal
+from app.db.types import InvalidUUID, canonical_uuid
+from app.crud.step_buffer import step_write_buffer
+from app.core.pagination import decode_cursor, decode_uuid_cursor
 
 
-def get_db():
-    try:
-        db = SessionLocal()
+# レプリカに読み取りを流してよいメソッド
+READ_ONLY_METHODS = {"GET", "HEAD"}
+
+
+async def get_db(request: Request) -> AsyncIterator[AsyncSession]:
+    """GET / HEAD はレプリカに振り分けるセッション、それ以外はプライマリのセッション"""
+    async with SessionLocal(read_only=request.method in READ_ONLY_METHODS) as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
+
+
+async def wait_for_buffered_steps(user_uuid: str, db: AsyncSession = Depends(get_db)) -> None:
+    """書き込みバッファ（STEP_INGEST_MODE=buffered）にこのユーザーの未書き込みの歩数があれば、書き終わるまで待つ"""
+    # バッファは canonical な uuid で覚えているので、パスの大文字・ハイフンなしもそろえて引く
+    try:
+        user_uuid = canonical_uuid(user_uuid)
+    except InvalidUUID:
+        # UUID として読めなければ書き込み待ちの行もない（エンドポイント側で 422 になる）
+        return
+    if await step_write_buffer.wait_for_user(user_uuid):
+        # 書いたばかりの行はレプリカにまだ届いていないことがあるので、このリクエストの読み取りはプライマリで行う
+        db.info[WROTE] = True
+
+
+def get_keyset_cursor(cursor: Optional[str] = None) -> Optional[tuple[datetime, str]]:
+    """?cursor= を (created_at, uuid) のキーセット位置に変換する"""
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def get_uuid_cursor(cursor: Optional[str] = None) -> Optional[str]:
+    """?cursor= を uuid のキーセット位置に変換する"""
+    if cursor is None:
+        return None
+    try:
+        return decode_uuid_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+# ?include= で展開できる関連
+INCLUDABLE_RELATIONS = {"user"}
+
+
+def get_include_user(
+    include: Optional[str] = Query(None, description="カンマ区切りで展開する関連を指定（user）"),
+) -> bool:
+    """?include=user のときだけ関連ユーザーを読み込む（指定がなければレスポンスの user は null）"""
+    if not include:
+        return False
+    relations = {name.strip() for name in include.split(",") if name.strip()}
+    unknown = relations - INCLUDABLE_RELATIONS
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown include: {', '.join(sorted(unknown))}",
+        )
+    return "user" in relations
@@ -0,0 +1,66 @@
+# app/api/endpoints/ops.py
+# 運用向けのエンドポイント
+from dataclasses import asdict
+
+from fastapi import APIRouter, Response
+
+from app.core.cache import cache
+from app.core.metrics import CONTENT_TYPE, Counter, Gauge, Metric, registry
+from app.db.session import pool_stats
+
+router = APIRouter()
+
+
+@router.get("/cache/stats")
+async def read_cache_stats():
+    return {"backend": type(cache).__name__, **asdict(cache.stats)}
+
+
+def collect_cache_metrics() -> list[Metric]:
+    """読み出しキャッシュの統計を /metrics 用に変換する"""
+    collected: list[Metric] = []
+    for field, value in asdict(cache.stats).items():
+        counter = Counter(f"cache_{field}_total", f"Read-through cache {field}.", ("backend",))
+        counter.inc(type(cache).__name__, amount=value)
+        collected.append(counter)
+    if hasattr(cache, "__len__"):
+        entries = Gauge("cache_entries", "Entries currently held by the read-through cache.", ("backend",))
+        entries.set(len(cache), type(cache).__name__)
+        collected.append(entries)
+    return collected
+
+
+registry.register_collector(collect_cache_metrics)
+
+
+@router.get("/db/pool/stats")
+async def read_pool_stats():
+    stats = pool_stats()
+    return asdict(stats) if stats is not None else {"pool": None}
+
+
+def collect_pool_metrics() -> list[Metric]:
+    """コネクションプールの現在の状態を /metrics 用に変換する（待ち時間・タイムアウトは app.db.metrics で数える）"""
+    stats = pool_stats()
+    if stats is None:
+        return []
+    collected: list[Metric] = []
+    for name, value, documentation in (
+        ("db_pool_size", stats.size, "Connections the pool keeps open."),
+        ("db_pool_checked_out", stats.checked_out, "Connections currently checked out of the pool."),
+        ("db_pool_checked_in", stats.checked_in, "Idle connections currently in the pool."),
+        ("db_pool_overflow", stats.overflow, "Overflow connections currently open beyond db_pool_size."),
+        ("db_pool_max_overflow", stats.max_overflow, "Maximum overflow connections allowed."),
+    ):
+        gauge = Gauge(name, documentation)
+        gauge.set(value)
+        collected.append(gauge)
+    return collected
+
+
+registry.register_collector(collect_pool_metrics)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
@@ -1,15 +1,35 @@
 # app/api/endpoints/step.py
-from typing import List
+from typing import List, Optional, Tuple
 import logging
-from datetime import date as date_type
+from datetime import date as date_type, datetime
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_db
-from app.schemas.step import StepCreate, StepUpdate, StepResponse, DailyTotalStepsResponse, LatestSessionStepsResponse
-from app.crud.step import step_crud
-from app.core.timezone import JST, jst_day_to_utc_range
+from app.api.deps import get_db, get_keyset_cursor, get_include_user, wait_for_buffered_steps
+from app.api.export import ExportFormat, export_response
+from app.core import idempotency
+from app.core.bulk_import import ImportFormat, iter_batches
+from app.core.config import IMPORT_BATCH_ROWS, STEP_INGEST_MODE
+from app.schemas.bulk_import import ImportResponse
+from app.schemas.step import (
+    StepCreate,
+    StepUpdate,
+    StepResponse,
+    DailyTotalStepsResponse,
+    DailyTotalsResponse,
+    LatestSessionStepsResponse,
+    StepSessionResponse,
+    StepSessionsResponse,
+    StepBatchCreate,
+    StepBatchResponse,
+)
+from app.crud.step import EXPORT_COLUMNS, step_crud
+from app.crud.user import user_crud
+from app.crud.step_buffer import StepBufferFull, step_write_buffer
+from app.core.timezone import JST, jst_day_to_utc_range, to_utc
+from app.core.pagination import NEXT_CURSOR_HEADER, encode_cursor, split_page
 
 router = APIRouter()
 
@@ -21,25 +41,107 @@ logger = logging.getLogger(__name__)
     response_model=StepResponse,
     status_code=status.HTTP_201_CREATED,
 )
-def create_step(*, db: Session = Depends(get_db), step_in: StepCreate):
-    logging.info("[START] create_step")
+async def create_step(
+    *,
+    db: AsyncSession = Depends(get_db),
+    response: Response,
+    step_in: StepCreate,
+    idempotency_key: Optional[str] = Header(None, alias=idempotency.IDEMPOTENCY_KEY_HEADER, max_length=255),
+):
+    logger.debug("[START] create_step")
+    scope = f"step:{step_in.user_uuid}"
+    if idempotency_key:
+        # 同じキーの再送には覚えておいたレスポンスをそのまま返す（DB に触れない）
+        try:
+            stored = await idempotency.replay(scope, idempotency_key, step_in)
+        except idempotency.IdempotencyKeyReused as e:
+            logger.error(f"create_step failed: {e}")
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+        if stored is not None:
+            response.status_code = stored.status_code
+            logger.info("[END] create_step (replayed)")
+            return stored.body
+
+    if STEP_INGEST_MODE == "buffered":
+        # キューに積んで 202 を返す（書き込みはバックグラウンドでまとめて行う）。存在しないユーザーだけは先に弾く
+        if await user_crud.get(db, step_in.user_uuid) is None:
+            logger.error(f"create_step failed: user {step_in.user_uuid} not found")
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User not found")
+        try:
+            row = step_write_buffer.submit(step_in)
+        except StepBufferFull:
+            logger.warning("create_step rejected: step buffer is full")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many step posts, retry later",
+                headers={"Retry-After": "1"},
+            )
+        response.status_code = status.HTTP_202_ACCEPTED
+        step = StepResponse(**row)
+    else:
+        try:
+            step, created = await step_crud.create(db, obj_in=step_in)
+        except ValueError as e:
+            logger.error(f"create_step failed: {e}")
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        if not created:
+            # 登録済みの計測の再送。既存の行を返す
+            response.status_code = status.HTTP_200_OK
+
+    if idempotency_key:
+        await idempotency.remember(
+            scope,
+            idempotency_key,
+            step_in,
+            status_code=response.status_code or status.HTTP_201_CREATED,
+            body=StepResponse.model_validate(step).model_dump(mode="json"),
+        )
+    logger.info("[END] create_step")
+    return step
+
+
+# オフラインで溜めた歩数データの一括登録
+@router.post(
+    "/steps/batch",
+    response_model=StepBatchResponse,
+)
+async def create_steps_batch(*, db: AsyncSession = Depends(get_db), batch_in: StepBatchCreate):
+    logger.debug("[START] create_steps_batch")
     try:
-        step = step_crud.create(db, obj_in=step_in)
+        results = await step_crud.create_batch(db, rows_in=batch_in.steps)
     except ValueError as e:
-        logging.error(f"create_step failed: {e}")
+        logger.error(f"create_steps_batch failed: {e}")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
-    logging.info("[END] create_step")
-    return step
+    accepted = sum(1 for r in results if r.accepted)
+    duplicates = sum(1 for r in results if r.duplicate)
+    logger.info("[END] create_steps_batch")
+    return StepBatchResponse(
+        accepted=accepted, rejected=len(results) - accepted, duplicates=duplicates, results=results
+    )
 
 
 @router.get(
     "/steps",
     response_model=List[StepResponse],
 )
-def read_steps(*, db: Session = Depends(get_db), skip: int = 0, limit: int = 100):
-    logging.info("[START] read_steps")
-    steps = step_crud.get_multi(db, skip=skip, limit=limit)
-    logging.info("[END] read_steps")
+async def read_steps(
+    *,
+    db: AsyncSession = Depends(get_db),
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    before: Optional[Tuple[datetime, str]] = Depends(get_keyset_cursor),
+    include_user: bool = Depends(get_include_user),
+):
+    logger.debug("[START] read_steps")
+    # 次ページの有無を知るため1件多く取る
+    steps = await step_crud.get_multi(
+        db, skip=skip, limit=limit + 1, before=before, include_user=include_user
+    )
+    steps, next_cursor = split_page(steps, limit, lambda s: encode_cursor(s.created_at, s.uuid))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    logger.info("[END] read_steps")
     return steps
 
 
@@ -47,13 +149,15 @@ def read_steps(*, db: Session = Depends(get_db), skip: int = 0, limit: int = 100
     "/steps/{uuid}",
     response_model=StepResponse,
 )
-def read_step(*, db: Session = Depends(get_db), uuid: str):
-    logging.info("[START] read_step")
-    step = step_crud.get(db, uuid)
+async def read_step(
+    *, db: AsyncSession = Depends(get_db), uuid: str, include_user: bool = Depends(get_include_user)
+):
+    logger.debug("[START] read_step")
+    step = await step_crud.get(db, uuid, include_user=include_user)
     if step is None:
-        logging.error(f"Step with uuid {uuid} not found")
+        logger.error(f"Step with uuid {uuid} not found")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Step not found")
-    logging.info("[END] read_step")
+    logger.info("[END] read_step")
     return step
 
 
@@ -61,20 +165,18 @@ def read_step(*, db: Session = Depends(get_db), uuid: str):
     "/steps/{uuid}",
     response_model=StepResponse,
 )
-def update_step(*, db: Session = Depends(get_db), uuid: str, step_in: StepUpdate):
-    logging.info("[START] update_step")
-    step = step_crud.get(db, uuid)
-    if step is None:
-        logging.error(f"Step with uuid {uuid} not found")
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Step not found")
-
+async def update_step(*, db: AsyncSession = Depends(get_db), uuid: str, step_in: StepUpdate):
+    logger.debug("[START] update_step")
     try:
-        step = step_crud.update(db, db_obj=step, obj_in=step_in)
+        step = await step_crud.update(db, uuid=uuid, obj_in=step_in)
     except ValueError as e:
-        logging.error(f"update_step failed: {e}")
+        logger.error(f"update_step failed: {e}")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if step is None:
+        logger.error(f"Step with uuid {uuid} not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Step not found")
 
-    logging.info("[END] update_step")
+    logger.info("[END] update_step")
     return step
 
 
@@ -82,20 +184,14 @@ def update_step(*, db: Session = Depends(get_db), uuid: str, step_in: StepUpdate
     "/steps/{uuid}",
     response_model=StepResponse,
 )
-def delete_step(*, db: Session = Depends(get_db), uuid: str):
-    logging.info("[START] delete_step")
-    step = step_crud.get(db, uuid)
-    if step is None:
-        logging.error(f"Step with uuid {uuid} not found")
+async def delete_step(*, db: AsyncSession = Depends(get_db), uuid: str):
+    logger.debug("[START] delete_step")
+    deleted = await step_crud.remove(db, uuid=uuid)
+    if deleted is None:
+        logger.error(f"Step with uuid {uuid} not found")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Step not found")
 
-    try:
-        deleted = step_crud.remove(db, uuid=uuid)
-    except ValueError as e:
-        logging.error(f"delete_step failed: {e}")
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
-
-    logging.info("[END] delete_step")
+    logger.info("[END] delete_step")
     return deleted
 
 
@@ -104,50 +200,190 @@ def delete_step(*, db: Session = Depends(get_db), uuid: str):
     "/users/{user_uuid}/steps",
     response_model=List[StepResponse],
 )
-def read_steps_by_user(
-    *, db: Session = Depends(get_db), user_uuid: str, skip: int = 0, limit: int = 100
+async def read_steps_by_user(
+    *,
+    db: AsyncSession = Depends(get_db),
+    response: Response,
+    user_uuid: str,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    before: Optional[Tuple[datetime, str]] = Depends(get_keyset_cursor),
+    include_user: bool = Depends(get_include_user),
 ):
-    logging.info("[START] read_steps_by_user")
-    steps = step_crud.get_multi_by_user(db, user_uuid=user_uuid, skip=skip, limit=limit)
-    logging.info("[END] read_steps_by_user")
+    logger.debug("[START] read_steps_by_user")
+    steps = await step_crud.get_multi_by_user(
+        db, user_uuid=user_uuid, skip=skip, limit=limit + 1, before=before, include_user=include_user
+    )
+    steps, next_cursor = split_page(steps, limit, lambda s: encode_cursor(s.created_at, s.uuid))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    logger.info("[END] read_steps_by_user")
     return steps
 
 
+# ユーザーの全歩数履歴を NDJSON / CSV で書き出す（古い順）
+# /users/{user_uuid}/steps/{target_date} より先に登録する
+@router.get(
+    "/users/{user_uuid}/steps/export",
+    response_class=StreamingResponse,
+)
+async def export_steps_by_user(
+    *,
+    db: AsyncSession = Depends(get_db),
+    user_uuid: str,
+    fmt: ExportFormat = Query("ndjson", alias="format"),
+):
+    logger.debug("[START] export_steps_by_user")
+    if await user_crud.get(db, user_uuid) is None:
+        logger.error(f"User with uuid {user_uuid} not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    logger.info("[END] export_steps_by_user")
+    return export_response(
+        step_crud.stream_by_user(db, user_uuid=user_uuid),
+        columns=EXPORT_COLUMNS,
+        fmt=fmt,
+        filename=f"steps_{user_uuid}",
+    )
+
+
+# ユーザーの歩数履歴を CSV / NDJSON（エクスポートと同じ形式）の本文から一括登録する
+@router.post(
+    "/users/{user_uuid}/steps/import",
+    response_model=ImportResponse,
+)
+async def import_steps_by_user(
+    *,
+    db: AsyncSession = Depends(get_db),
+    request: Request,
+    user_uuid: str,
+    fmt: ImportFormat = Query("ndjson", alias="format"),
+):
+    logger.debug("[START] import_steps_by_user")
+    if await user_crud.get(db, user_uuid) is None:
+        logger.error(f"User with uuid {user_uuid} not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    # 本文は受け取りながら IMPORT_BATCH_ROWS 行ずつ検証・COPY する（全体をメモリに載せない）
+    batches = iter_batches(request.stream(), fmt, IMPORT_BATCH_ROWS)
+    try:
+        result = await step_crud.import_rows(db, user_uuid=user_uuid, batches=batches)
+    except ValueError as e:
+        logger.error(f"import_steps_by_user failed: {e}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    logger.info("[END] import_steps_by_user", extra=result.model_dump(exclude={"errors"}))
+    return result
+
+
+# 期間内の日別合計歩数をまとめて取得（週・月グラフ用）
+# /users/{user_uuid}/steps/{target_date} より先に登録する
+@router.get(
+    "/users/{user_uuid}/steps/daily-totals",
+    response_model=DailyTotalsResponse,
+    dependencies=[Depends(wait_for_buffered_steps)],
+)
+async def get_daily_totals(
+    *,
+    db: AsyncSession = Depends(get_db),
+    user_uuid: str,
+    from_date: date_type = Query(..., alias="from"),
+    to_date: date_type = Query(..., alias="to"),
+):
+    logger.debug("[START] get_daily_totals")
+    try:
+        dates, totals = await step_crud.calc_daily_totals(
+            db, user_uuid=user_uuid, from_date=from_date, to_date=to_date
+        )
+    except ValueError as e:
+        logger.error(f"get_daily_totals failed: {e}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    logger.info("[END] get_daily_totals")
+    return DailyTotalsResponse(user_uuid=user_uuid, dates=dates, totals=totals)
+
+
+# 歩行セッション（start→stop の組）の一覧取得
+# /users/{user_uuid}/steps/{target_date} より先に登録する
+@router.get(
+    "/users/{user_uuid}/steps/sessions",
+    response_model=StepSessionsResponse,
+    dependencies=[Depends(wait_for_buffered_steps)],
+)
+async def read_sessions(
+    *,
+    db: AsyncSession = Depends(get_db),
+    user_uuid: str,
+    from_at: Optional[datetime] = Query(None, alias="from"),
+    to_at: Optional[datetime] = Query(None, alias="to"),
+    limit: int = Query(20, ge=1, le=100),
+    before: Optional[Tuple[datetime, str]] = Depends(get_keyset_cursor),
+):
+    logger.debug("[START] read_sessions")
+    # 次ページの有無を知るため1件多く取る
+    rows = await step_crud.get_sessions(
+        db,
+        user_uuid=user_uuid,
+        from_at=to_utc(from_at) if from_at else None,
+        to_at=to_utc(to_at) if to_at else None,
+        before=before,
+        limit=limit + 1,
+    )
+    rows, next_cursor = split_page(rows, limit, lambda r: encode_cursor(r.stopped_at, r.stop_uuid))
+
+    sessions = [
+        StepSessionResponse(
+            start_uuid=row.start_uuid,
+            stop_uuid=row.stop_uuid,
+            started_at=row.started_at,
+            stopped_at=row.stopped_at,
+            duration_seconds=(to_utc(row.stopped_at) - to_utc(row.started_at)).total_seconds(),
+            steps=row.stop_step - row.start_step,
+        )
+        for row in rows
+    ]
+    logger.info("[END] read_sessions")
+    return StepSessionsResponse(user_uuid=user_uuid, sessions=sessions, next_cursor=next_cursor)
+
+
 # ユーザー×日付の1件取得
 @router.get(
     "/users/{user_uuid}/steps/{target_date}",
     response_model=StepResponse,
 )
-def read_step_by_user_and_date(
-    *, db: Session = Depends(get_db), user_uuid: str, target_date: date_type
+async def read_step_by_user_and_date(
+    *,
+    db: AsyncSession = Depends(get_db),
+    user_uuid: str,
+    target_date: date_type,
+    include_user: bool = Depends(get_include_user),
 ):
-    logging.info("[START] read_step_by_user_and_date")
-    step = step_crud.get_by_user_and_date(db, user_uuid=user_uuid, target_date=target_date)
+    logger.debug("[START] read_step_by_user_and_date")
+    step = await step_crud.get_by_user_and_date(
+        db, user_uuid=user_uuid, target_date=target_date, include_user=include_user
+    )
     if step is None:
-        logging.error(f"Step not found: user_uuid={user_uuid}, date={target_date}")
+        logger.error(f"Step not found: user_uuid={user_uuid}, date={target_date}")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Step not found")
-    logging.info("[END] read_step_by_user_and_date")
+    logger.info("[END] read_step_by_user_and_date")
     return step
 
 # 最新セッションの歩数取得
 @router.get(
     "/users/{user_uuid}/steps/steps/session/latest",
     response_model=LatestSessionStepsResponse,
+    dependencies=[Depends(wait_for_buffered_steps)],
 )
-def get_latest_session_steps(*, db: Session = Depends(get_db), user_uuid: str):
-    logging.info("[START] get_latest_session_steps")
+async def get_latest_session_steps(*, db: AsyncSession = Depends(get_db), user_uuid: str):
+    logger.debug("[START] get_latest_session_steps")
     try:
-        start_row, stop_row, diff = step_crud.calc_latest_session_steps(db, user_uuid=user_uuid)
+        session, diff = await step_crud.calc_latest_session_steps(db, user_uuid=user_uuid)
     except ValueError as e:
-        logging.error(f"get_latest_session_steps failed: {e}")
+        logger.error(f"get_latest_session_steps failed: {e}")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
-    logging.info("[END] get_latest_session_steps")
+    logger.info("[END] get_latest_session_steps")
     return LatestSessionStepsResponse(
         user_uuid=user_uuid,
-        start_uuid=start_row.uuid,
-        stop_uuid=stop_row.uuid,
-        started_at=start_row.created_at,
-        stopped_at=stop_row.created_at,
+        start_uuid=session.start_uuid,
+        stop_uuid=session.stop_uuid,
+        started_at=session.started_at,
+        stopped_at=session.stopped_at,
         steps=diff,
     )
 
@@ -155,9 +391,10 @@ def get_latest_session_steps(*, db: Session = Depends(get_db), user_uuid: str):
 @router.get(
     "/users/{user_uuid}/steps/daily-total/{target_date}",
     response_model=DailyTotalStepsResponse,
+    dependencies=[Depends(wait_for_buffered_steps)],
 )
-def get_daily_total_steps(*, db: Session = Depends(get_db), user_uuid: str, target_date: date_type):
-    logging.info("[START] get_daily_total_steps")
-    total = step_crud.calc_daily_total_steps(db, user_uuid=user_uuid, target_date=target_date)
-    logging.info("[END] get_daily_total_steps")
+async def get_daily_total_steps(*, db: AsyncSession = Depends(get_db), user_uuid: str, target_date: date_type):
+    logger.debug("[START] get_daily_total_steps")
+    total = await step_crud.calc_daily_total_steps(db, user_uuid=user_uuid, target_date=target_date)
+    logger.info("[END] get_daily_total_steps")
     return DailyTotalStepsResponse(user_uuid=user_uuid, total_steps=total)
\ No newline at end of file
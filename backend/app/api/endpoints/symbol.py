@@ -1,16 +1,23 @@
 # app/api/endpoints/symbol.py
 import logging
-from typing import List
-from datetime import datetime, timedelta, timezone
+from datetime import date as date_type, datetime
+from typing import List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_db
+from app.api.deps import get_db, get_keyset_cursor, get_include_user
+from app.api.export import ExportFormat, export_response
+from app.core.bulk_import import ImportFormat, iter_batches
+from app.schemas.bulk_import import ImportResponse
 from app.schemas.symbol import SymbolCreate, SymbolUpdate, SymbolResponse, UserSymbolsResponse
-from app.crud.symbol import symbol_crud
+from app.crud.symbol import EXPORT_COLUMNS, symbol_crud
+from app.crud.user import user_crud
 from app.core.timezone import JST, jst_day_to_utc_range
-from app.core.config import DECAY_HOURS
+from app.core.kirakira import kirakira_remaining_hours
+from app.core.pagination import NEXT_CURSOR_HEADER, encode_cursor, split_page
+from app.core.config import IMPORT_BATCH_ROWS, SYMBOL_SPATIAL_MAX_RESULTS
 
 router = APIRouter()
 
@@ -21,108 +28,220 @@ logger = logging.getLogger(__name__)
     response_model=SymbolResponse,
     status_code=status.HTTP_201_CREATED,
 )
-def create_symbol(*, db: Session = Depends(get_db), symbol_in: SymbolCreate):
-    logging.info("[START] create_symbol")
+async def create_symbol(*, db: AsyncSession = Depends(get_db), symbol_in: SymbolCreate):
+    logger.debug("[START] create_symbol")
     try:
-        symbol = symbol_crud.create(db, obj_in=symbol_in)
+        symbol = await symbol_crud.create(db, obj_in=symbol_in)
     except ValueError as e:
-        logging.error(f"create_symbol failed: {e}")
+        logger.error(f"create_symbol failed: {e}")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
-    logging.info("[END] create_symbol")
+    logger.info("[END] create_symbol")
     return symbol
 
 @router.get(
     "/symbols",
     response_model=List[SymbolResponse],
 )
-def read_symbols(*, db: Session = Depends(get_db), skip: int = 0, limit: int = 100):
-    logging.info("[START] read_symbols")
-    symbols = symbol_crud.get_multi(db, skip=skip, limit=limit)
-    logging.info("[END] read_symbols")
+async def read_symbols(
+    *,
+    db: AsyncSession = Depends(get_db),
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    before: Optional[Tuple[datetime, str]] = Depends(get_keyset_cursor),
+    include_user: bool = Depends(get_include_user),
+):
+    logger.debug("[START] read_symbols")
+    # 次ページの有無を知るため1件多く取る
+    symbols = await symbol_crud.get_multi(
+        db, skip=skip, limit=limit + 1, before=before, include_user=include_user
+    )
+    symbols, next_cursor = split_page(symbols, limit, lambda s: encode_cursor(s.created_at, s.uuid))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    logger.info("[END] read_symbols")
+    return symbols
+
+# 地図の表示範囲内のシンボルを取得（/symbols/{uuid} より先に登録する）
+@router.get(
+    "/symbols/in-box",
+    response_model=List[SymbolResponse],
+)
+async def read_symbols_in_box(
+    *,
+    db: AsyncSession = Depends(get_db),
+    min_x: float,
+    min_y: float,
+    max_x: float,
+    max_y: float,
+    limit: int = Query(SYMBOL_SPATIAL_MAX_RESULTS, ge=1, le=SYMBOL_SPATIAL_MAX_RESULTS),
+    include_user: bool = Depends(get_include_user),
+):
+    logger.debug("[START] read_symbols_in_box")
+    if min_x > max_x or min_y > max_y:
+        logger.error(f"Invalid box: ({min_x}, {min_y}) - ({max_x}, {max_y})")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'min_x'/'min_y' must be less than or equal to 'max_x'/'max_y'.",
+        )
+    symbols = await symbol_crud.get_in_box(
+        db, min_x=min_x, min_y=min_y, max_x=max_x, max_y=max_y, limit=limit, include_user=include_user
+    )
+    logger.info("[END] read_symbols_in_box")
+    return symbols
+
+# 指定地点から近い順にシンボルを取得
+@router.get(
+    "/symbols/nearest",
+    response_model=List[SymbolResponse],
+)
+async def read_nearest_symbols(
+    *,
+    db: AsyncSession = Depends(get_db),
+    x: float,
+    y: float,
+    k: int = Query(10, ge=1, le=SYMBOL_SPATIAL_MAX_RESULTS),
+    include_user: bool = Depends(get_include_user),
+):
+    logger.debug("[START] read_nearest_symbols")
+    symbols = await symbol_crud.get_nearest(db, x=x, y=y, k=k, include_user=include_user)
+    logger.info("[END] read_nearest_symbols")
     return symbols
 
 @router.get(
     "/symbols/{uuid}",
     response_model=SymbolResponse,
 )
-def read_symbol(*, db: Session = Depends(get_db), uuid: str):
-    logging.info("[START] read_symbol")
-    symbol = symbol_crud.get(db, uuid)
+async def read_symbol(
+    *, db: AsyncSession = Depends(get_db), uuid: str, include_user: bool = Depends(get_include_user)
+):
+    logger.debug("[START] read_symbol")
+    symbol = await symbol_crud.get(db, uuid, include_user=include_user)
     if symbol is None:
-        logging.error(f"Symbol with uuid {uuid} not found")
+        logger.error(f"Symbol with uuid {uuid} not found")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Symbol not found")
-    logging.info("[END] read_symbol")
+    logger.info("[END] read_symbol")
     return symbol
 
 @router.put(
     "/symbols/{uuid}",
     response_model=SymbolResponse,
 )
-def update_symbol(*, db: Session = Depends(get_db), uuid: str, symbol_in: SymbolUpdate):
-    logging.info("[START] update_symbol")
-    symbol = symbol_crud.get(db, uuid)
-    if symbol is None:
-        logging.error(f"Symbol with uuid {uuid} not found")
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Symbol not found")
+async def update_symbol(*, db: AsyncSession = Depends(get_db), uuid: str, symbol_in: SymbolUpdate):
+    logger.debug("[START] update_symbol")
     try:
-        symbol = symbol_crud.update(db, db_obj=symbol, obj_in=symbol_in)
+        symbol = await symbol_crud.update(db, uuid=uuid, obj_in=symbol_in)
     except ValueError as e:
-        logging.error(f"update_symbol failed: {e}")
+        logger.error(f"update_symbol failed: {e}")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
-    logging.info("[END] update_symbol")
+    if symbol is None:
+        logger.error(f"Symbol with uuid {uuid} not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Symbol not found")
+    logger.info("[END] update_symbol")
     return symbol
 
 @router.delete(
     "/symbols/{uuid}",
     status_code=status.HTTP_204_NO_CONTENT,
 )
-def delete_symbol(*, db: Session = Depends(get_db), uuid: str):
-    logging.info("[START] delete_symbol")
-    symbol = symbol_crud.get(db, uuid)
+async def delete_symbol(*, db: AsyncSession = Depends(get_db), uuid: str):
+    logger.debug("[START] delete_symbol")
+    symbol = await symbol_crud.remove(db, uuid=uuid)
     if symbol is None:
-        logging.error(f"Symbol with uuid {uuid} not found")
+        logger.error(f"Symbol with uuid {uuid} not found")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Symbol not found")
-    symbol_crud.remove(db, db_obj=symbol)
-    logging.info("[END] delete_symbol")
+    logger.info("[END] delete_symbol")
     return
 
 @router.get(
     "/users/{user_uuid}/symbols",
     response_model=UserSymbolsResponse,
 )
-def read_symbols_by_user(
-    *, db: Session = Depends(get_db), user_uuid: str, skip: int = 0, limit: int = 100
+async def read_symbols_by_user(
+    *,
+    db: AsyncSession = Depends(get_db),
+    user_uuid: str,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    before: Optional[Tuple[datetime, str]] = Depends(get_keyset_cursor),
+    local_date: Optional[date_type] = Query(None, alias="date", description="作成日（JST）で絞る"),
+    include_user: bool = Depends(get_include_user),
+):
+    logger.debug("[START] read_symbols_by_user")
+    symbols = await symbol_crud.get_multi_by_user(
+        db,
+        user_uuid=user_uuid,
+        skip=skip,
+        limit=limit + 1,
+        before=before,
+        local_date=local_date,
+        include_user=include_user,
+    )
+    symbols, next_cursor = split_page(symbols, limit, lambda s: encode_cursor(s.created_at, s.uuid))
+    logger.info("[END] read_symbols_by_user")
+    return UserSymbolsResponse(user_uuid=user_uuid, symbols=symbols, next_cursor=next_cursor)
+
+# ユーザーの全シンボルを NDJSON / CSV で書き出す（古い順）
+@router.get(
+    "/users/{user_uuid}/symbols/export",
+    response_class=StreamingResponse,
+)
+async def export_symbols_by_user(
+    *,
+    db: AsyncSession = Depends(get_db),
+    user_uuid: str,
+    fmt: ExportFormat = Query("ndjson", alias="format"),
+):
+    logger.debug("[START] export_symbols_by_user")
+    if await user_crud.get(db, user_uuid) is None:
+        logger.error(f"User with uuid {user_uuid} not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    logger.info("[END] export_symbols_by_user")
+    return export_response(
+        symbol_crud.stream_by_user(db, user_uuid=user_uuid),
+        columns=EXPORT_COLUMNS,
+        fmt=fmt,
+        filename=f"symbols_{user_uuid}",
+    )
+
+# ユーザーのシンボルを CSV / NDJSON（エクスポートと同じ形式）の本文から一括登録する
+@router.post(
+    "/users/{user_uuid}/symbols/import",
+    response_model=ImportResponse,
+)
+async def import_symbols_by_user(
+    *,
+    db: AsyncSession = Depends(get_db),
+    request: Request,
+    user_uuid: str,
+    fmt: ImportFormat = Query("ndjson", alias="format"),
 ):
-    logging.info("[START] read_symbols_by_user")
-    symbols = symbol_crud.get_multi_by_user(db, user_uuid=user_uuid, skip=skip, limit=limit)
-    logging.info("[END] read_symbols_by_user")
-    return UserSymbolsResponse(user_uuid=user_uuid, symbols=symbols)
+    logger.debug("[START] import_symbols_by_user")
+    if await user_crud.get(db, user_uuid) is None:
+        logger.error(f"User with uuid {user_uuid} not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    # 本文は受け取りながら IMPORT_BATCH_ROWS 行ずつ検証・COPY する（全体をメモリに載せない）
+    batches = iter_batches(request.stream(), fmt, IMPORT_BATCH_ROWS)
+    try:
+        result = await symbol_crud.import_rows(db, user_uuid=user_uuid, batches=batches)
+    except ValueError as e:
+        logger.error(f"import_symbols_by_user failed: {e}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    logger.info("[END] import_symbols_by_user", extra=result.model_dump(exclude={"errors"}))
+    return result
 
 # 特定のシンボルの、キラキラレベルが減少するまでの残り時間（hours）を取得するエンドポイント
 @router.get(
     "/symbols/{uuid}/kirakira_remaining_time",
     response_model=int,
 )
-def get_kirakira_remaining_time(*, db: Session = Depends(get_db), uuid: str):
-    logging.info("[START] get_kirakira_remaining_time")
-    symbol = symbol_crud.get(db, uuid)
+async def get_kirakira_remaining_time(*, db: AsyncSession = Depends(get_db), uuid: str):
+    logger.debug("[START] get_kirakira_remaining_time")
+    symbol = await symbol_crud.get(db, uuid)
     if symbol is None:
-        logging.error(f"Symbol with uuid {uuid} not found")
+        logger.error(f"Symbol with uuid {uuid} not found")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Symbol not found")
 
-    if symbol.kirakira_level <= 0:
-        logging.info("[END] get_kirakira_remaining_time")
-        return 0  # キラキラレベルが0以下なら残り時間は0
-
-        # Python側で現在時刻を作る（UTC推奨）
-    now = datetime.now(timezone.utc)
-
-    updated_at = symbol.updated_at
-    # DBからnaive datetime（tz無し）が返る環境対策：UTC扱いで寄せる
-    if updated_at.tzinfo is None:
-        updated_at = updated_at.replace(tzinfo=timezone.utc)
-
-    elapsed_hours = (now - updated_at).total_seconds() / 3600.0
-    remaining = max(0, DECAY_HOURS - elapsed_hours)
-    logging.info("[END] get_kirakira_remaining_time")
-    return int(remaining)
\ No newline at end of file
+    remaining = kirakira_remaining_hours(symbol.kirakira_level, symbol.level_set_at)
+    logger.info("[END] get_kirakira_remaining_time")
+    return int(remaining)
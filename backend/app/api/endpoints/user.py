@@ -1,13 +1,14 @@
 # app/api/endpoints/user.py
-from typing import List
+from typing import List, Optional
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_db
+from app.api.deps import get_db, get_uuid_cursor
 from app.schemas.user import UserCreate, UserUpdate, UserResponse
 from app.crud.user import user_crud
+from app.core.pagination import NEXT_CURSOR_HEADER, encode_uuid_cursor, split_page
 
 router = APIRouter()
 
@@ -19,10 +20,10 @@ logger = logging.getLogger(__name__)
     response_model=UserResponse,
     status_code=status.HTTP_201_CREATED,
 )
-def create_user(*, db: Session = Depends(get_db), user_in: UserCreate):
-    logging.info("[START] create_user")
-    user = user_crud.create(db, obj_in=user_in)
-    logging.info("[END] create_user")
+async def create_user(*, db: AsyncSession = Depends(get_db), user_in: UserCreate):
+    logger.debug("[START] create_user")
+    user = await user_crud.create(db, obj_in=user_in)
+    logger.info("[END] create_user")
     return user
 
 
@@ -30,10 +31,21 @@ def create_user(*, db: Session = Depends(get_db), user_in: UserCreate):
     "/users",
     response_model=List[UserResponse],
 )
-def read_users(*, db: Session = Depends(get_db), skip: int = 0, limit: int = 100):
-    logging.info("[START] read_users")
-    users = user_crud.get_multi(db, skip=skip, limit=limit)
-    logging.info("[END] read_users")
+async def read_users(
+    *,
+    db: AsyncSession = Depends(get_db),
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = Depends(get_uuid_cursor),
+):
+    logger.debug("[START] read_users")
+    # 次ページの有無を知るため1件多く取る
+    users = await user_crud.get_multi(db, skip=skip, limit=limit + 1, after=after)
+    users, next_cursor = split_page(users, limit, lambda u: encode_uuid_cursor(u.uuid))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    logger.info("[END] read_users")
     return users
 
 
@@ -41,13 +53,13 @@ def read_users(*, db: Session = Depends(get_db), skip: int = 0, limit: int = 100
     "/users/{uuid}",
     response_model=UserResponse,
 )
-def read_user(*, db: Session = Depends(get_db), uuid: str):
-    logging.info("[START] read_user")
-    user = user_crud.get(db, uuid)
+async def read_user(*, db: AsyncSession = Depends(get_db), uuid: str):
+    logger.debug("[START] read_user")
+    user = await user_crud.get(db, uuid)
     if user is None:
-        logging.error(f"User with uuid {uuid} not found")
+        logger.error(f"User with uuid {uuid} not found")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    logging.info("[END] read_user")
+    logger.info("[END] read_user")
     return user
 
 
@@ -55,14 +67,13 @@ def read_user(*, db: Session = Depends(get_db), uuid: str):
     "/users/{uuid}",
     response_model=UserResponse,
 )
-def update_user(*, db: Session = Depends(get_db), uuid: str, user_in: UserUpdate):
-    logging.info("[START] update_user")
-    user = user_crud.get(db, uuid)
+async def update_user(*, db: AsyncSession = Depends(get_db), uuid: str, user_in: UserUpdate):
+    logger.debug("[START] update_user")
+    user = await user_crud.update(db, uuid=uuid, obj_in=user_in)
     if user is None:
-        logging.error(f"User with uuid {uuid} not found")
+        logger.error(f"User with uuid {uuid} not found")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    user = user_crud.update(db, db_obj=user, obj_in=user_in)
-    logging.info("[END] update_user")
+    logger.info("[END] update_user")
     return user
 
 
@@ -70,13 +81,11 @@ def update_user(*, db: Session = Depends(get_db), uuid: str, user_in: UserUpdate
     "/users/{uuid}",
     response_model=UserResponse,
 )
-def delete_user(*, db: Session = Depends(get_db), uuid: str):
-    logging.info("[START] delete_user")
-    user = user_crud.get(db, uuid)
-    if user is None:
-        logging.error(f"User with uuid {uuid} not found")
+async def delete_user(*, db: AsyncSession = Depends(get_db), uuid: str):
+    logger.debug("[START] delete_user")
+    deleted = await user_crud.remove(db, uuid=uuid)
+    if deleted is None:
+        logger.error(f"User with uuid {uuid} not found")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-
-    deleted = user_crud.remove(db, uuid=uuid)
-    logging.info("[END] delete_user")
+    logger.info("[END] delete_user")
     return deleted
@@ -0,0 +1,73 @@
+# app/api/export.py
+# 履歴のエクスポート（NDJSON / CSV）
+# crud の stream_* が返す行のまとまり（yield_per 件ずつ）をその都度文字列にして流すので、件数によらずメモリは一定
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Literal, Sequence
+
+from fastapi.responses import StreamingResponse
+
+from app.core.timezone import to_jst
+
+ExportFormat = Literal["ndjson", "csv"]
+
+MEDIA_TYPES: dict[str, str] = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _plain(value: Any) -> Any:
+    # 日時はレスポンスと同じく JST で出す
+    if isinstance(value, datetime):
+        return to_jst(value).isoformat()
+    return value
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return _plain(value)
+
+
+def ndjson_chunk(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> str:
+    return "".join(
+        json.dumps(dict(zip(columns, map(_plain, row))), ensure_ascii=False) + "\n" for row in rows
+    )
+
+
+def csv_chunk(rows: Sequence[Sequence[Any]]) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerows([_csv_value(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+
+async def _encode(
+    batches: AsyncIterator[Sequence[Sequence[Any]]], columns: Sequence[str], fmt: ExportFormat
+) -> AsyncIterator[str]:
+    if fmt == "csv":
+        yield csv_chunk([columns])
+    async for rows in batches:
+        yield ndjson_chunk(columns, rows) if fmt == "ndjson" else csv_chunk(rows)
+
+
+def export_response(
+    batches: AsyncIterator[Sequence[Sequence[Any]]],
+    *,
+    columns: Sequence[str],
+    fmt: ExportFormat,
+    filename: str,
+) -> StreamingResponse:
+    """
+    batches をそのまま StreamingResponse にする
+    セッション（get_db）はレスポンスを送り終えてから閉じられるので、batches は同じセッションのカーソルを読み続けてよい
+    """
+    extension = "ndjson" if fmt == "ndjson" else "csv"
+    return StreamingResponse(
+        _encode(batches, columns, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{extension}"'},
+    )
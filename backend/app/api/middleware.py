@@ -0,0 +1,99 @@
+# app/api/middleware.py
+import re
+import time
+import uuid
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import metrics
+from app.core.logging import request_id_var
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# クライアントから受け取る ID はログに載せるので長さと文字種を制限する
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class RequestIdMiddleware:
+    """
+    リクエストごとに ID を決めてログ（request_id）とレスポンスヘッダに載せる
+    X-Request-ID が付いていればそれを使い、なければ生成する
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                candidate = value.decode("latin-1")
+                if _VALID_REQUEST_ID.match(candidate):
+                    request_id = candidate
+                break
+        if request_id is None:
+            request_id = uuid.uuid4().hex
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)[REQUEST_ID_HEADER] = request_id
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
+
+
+class MetricsMiddleware:
+    """
+    ルートごとのレイテンシ・レスポンスサイズ・DB 時間・SQL 文数を記録する
+    BaseHTTPMiddleware はレスポンスを作り直すので使わず、ASGI のメッセージを覗くだけにする
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        response_size = 0
+        db_stats = metrics.RequestDBStats()
+        token = metrics.request_db_stats.set(db_stats)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, response_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        metrics.http_requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.http_requests_in_flight.dec()
+            metrics.request_db_stats.reset(token)
+
+            # ラベルはパスそのものではなくルートのテンプレート（/users/{uuid} など）にして数を抑える
+            route = scope.get("route")
+            route_name = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            metrics.http_requests_total.inc(method, route_name, str(status_code))
+            metrics.http_request_duration_seconds.observe(elapsed, method, route_name)
+            metrics.http_response_size_bytes.observe(response_size, method, route_name)
+            metrics.http_request_db_seconds.observe(db_stats.seconds, method, route_name)
+            metrics.http_request_sql_statements.observe(db_stats.statements, method, route_name)
+            if 200 <= status_code < 400:
+                metrics.record_first_request()
@@ -0,0 +1,135 @@
+# app/cli.py
+# 運用コマンド: python -m app.cli <command>
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+from app.core.bulk_import import iter_batches, read_file
+from app.core.config import IMPORT_BATCH_ROWS, STEP_RETENTION_ACTION, STEP_RETENTION_MONTHS
+from app.core.logging import setup_logging
+from app.db import migrations, partitions
+from app.db.session import SessionLocal, dispose_engine, get_engine
+from app.crud.step import step_crud
+from app.crud.step_daily_total import step_daily_total_crud
+from app.crud.symbol import symbol_crud
+from app.crud.user import user_crud
+from app.schemas.bulk_import import ImportResponse
+
+
+async def migrate(args: argparse.Namespace) -> None:
+    if args.check:
+        version = await migrations.check(get_engine())
+        print(f"schema is up to date (version {version})")
+        return
+    applied = await migrations.upgrade(get_engine())
+    if applied:
+        print(f"migrated to version {migrations.HEAD} (applied {', '.join(map(str, applied))})")
+    else:
+        print(f"schema is up to date (version {migrations.HEAD})")
+
+
+async def rebuild_step_rollup(args: argparse.Namespace) -> None:
+    await migrations.check(get_engine())
+    async with SessionLocal() as db:
+        count = await step_daily_total_crud.rebuild(db, user_uuid=args.user_uuid)
+    print(f"rebuilt step_daily_total: {count} rows")
+
+
+async def maintain_partitions(args: argparse.Namespace) -> None:
+    await migrations.check(get_engine())
+    result = await partitions.run_maintenance(
+        get_engine(), retention_months=args.retention_months, retention_action=args.retention_action
+    )
+    if result.skipped:
+        print("skipped: step is not partitioned or maintenance is running elsewhere")
+        return
+    print(f"created partitions: {', '.join(result.created) or '-'}")
+    if result.retention.cutoff is not None:
+        print(
+            f"retention cutoff {result.retention.cutoff.isoformat()}: "
+            f"{args.retention_action} {', '.join(result.retention.partitions) or '-'}, "
+            f"deleted {result.retention.default_rows_deleted} rows from {partitions.DEFAULT_PARTITION}"
+        )
+
+
+async def import_history(args: argparse.Namespace) -> None:
+    await migrations.check(get_engine())
+    path = Path(args.file)
+    fmt = args.format or ("csv" if path.suffix.lower() == ".csv" else "ndjson")
+    crud = step_crud if args.command == "import-steps" else symbol_crud
+
+    def progress(result: ImportResponse) -> None:
+        print(f"read {result.total} rows (rejected {result.rejected})", file=sys.stderr)
+
+    async with SessionLocal() as db:
+        if await user_crud.get(db, args.user_uuid) is None:
+            raise SystemExit(f"user not found: {args.user_uuid}")
+        result = await crud.import_rows(
+            db,
+            user_uuid=args.user_uuid,
+            batches=iter_batches(read_file(path), fmt, args.batch_rows),
+            progress=progress,
+        )
+    for error in result.errors:
+        print(f"row {error.row}: {error.error}", file=sys.stderr)
+    print(
+        f"imported {path}: {result.inserted} inserted, {result.skipped} skipped, "
+        f"{result.rejected} rejected of {result.total} rows"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate", help="DB のスキーマを最新まで作成・更新する")
+    migrate_parser.add_argument("--check", action="store_true", help="更新せず、最新かどうかだけ確かめる")
+    migrate_parser.set_defaults(func=migrate)
+
+    rebuild = subparsers.add_parser(
+        "rebuild-step-rollup", help="step テーブルから日別集計（step_daily_total）を作り直す"
+    )
+    rebuild.add_argument("--user-uuid", default=None, help="指定したユーザーのみ作り直す")
+    rebuild.set_defaults(func=rebuild_step_rollup)
+
+    maintain = subparsers.add_parser(
+        "maintain-partitions", help="step の先の月のパーティションを作り、保持期間を過ぎた月を外す"
+    )
+    maintain.add_argument(
+        "--retention-months", type=int, default=STEP_RETENTION_MONTHS, help="生データを残す月数（0 で無期限）"
+    )
+    maintain.add_argument(
+        "--retention-action",
+        choices=("detach", "drop"),
+        default=STEP_RETENTION_ACTION,
+        help="保持期間を過ぎたパーティションの扱い",
+    )
+    maintain.set_defaults(func=maintain_partitions)
+
+    for command, target in (("import-steps", "歩数履歴"), ("import-symbols", "シンボル")):
+        importer = subparsers.add_parser(command, help=f"CSV / NDJSON ファイルからユーザーの{target}を一括登録する")
+        importer.add_argument("file", help="エクスポートと同じ形式のファイル")
+        importer.add_argument("--user-uuid", required=True, help="登録先のユーザー")
+        importer.add_argument(
+            "--format", choices=("ndjson", "csv"), default=None, help="省略時は拡張子が .csv なら csv、それ以外は ndjson"
+        )
+        importer.add_argument(
+            "--batch-rows", type=int, default=IMPORT_BATCH_ROWS, help="1回に検証・COPY する行数"
+        )
+        importer.set_defaults(func=import_history)
+
+    args = parser.parse_args()
+    setup_logging()
+
+    async def run() -> None:
+        try:
+            await args.func(args)
+        finally:
+            await dispose_engine()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# app/core/bulk_import.py
+# 履歴のインポート（CSV / NDJSON）の読み取り
+# アップロード本文・ファイルをバイト列のまま少しずつ受け取り、行に分けて size 行ずつのまとまりで返す（全体をメモリに載せない）
+# 書き出し（app.api.export）と同じ形式を受け付ける。CSV は1行目が列名
+import asyncio
+import codecs
+import csv
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Literal, Union
+
+from pydantic import ValidationError
+
+ImportFormat = Literal["ndjson", "csv"]
+
+# ファイルを読むときの1回の読み取りサイズ
+READ_CHUNK_BYTES = 1 << 20
+
+
+@dataclass
+class RowError:
+    row: int  # データ行の番号（1始まり。CSV の列名の行は数えない）
+    error: str
+
+
+# (行番号, 列名 → 値) または読み取れなかった行
+Record = Union[tuple[int, dict[str, Any]], RowError]
+
+
+def validation_error_message(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors())
+
+
+def _quotes_balanced(text: str) -> bool:
+    # CSV の引用符は "" でエスケープされるので、数が偶数なら引用の外で行が終わっている
+    return text.count('"') % 2 == 0
+
+
+async def iter_batches(
+    chunks: AsyncIterator[bytes], fmt: ImportFormat, size: int
+) -> AsyncIterator[list[Record]]:
+    """
+    chunks（UTF-8、BOM 可）を size 行前後ずつのまとまりにして返す。空行は飛ばす
+    引用符の中に改行を含む CSV のフィールドは、引用符が閉じるまで物理行をつないで1行として扱う
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    header: list[str] | None = None
+    pending = ""  # まだ改行が来ていない末尾
+    record: list[str] = []  # CSV: 引用符が閉じていない物理行
+    row = 0
+    batch: list[Record] = []
+
+    def add_ndjson(line: str) -> None:
+        nonlocal row
+        if not line.strip():
+            return
+        row += 1
+        try:
+            value = json.loads(line)
+        except json.JSONDecodeError as e:
+            batch.append(RowError(row, f"invalid JSON: {e.msg}"))
+            return
+        if not isinstance(value, dict):
+            batch.append(RowError(row, "each line must be a JSON object"))
+            return
+        batch.append((row, value))
+
+    def add_csv(line: str) -> None:
+        nonlocal header, row
+        record.append(line)
+        text = "\n".join(record)
+        if not _quotes_balanced(text):
+            return
+        record.clear()
+        if not text.strip():
+            return
+        fields = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in fields]
+            return
+        row += 1
+        if len(fields) != len(header):
+            batch.append(RowError(row, f"expected {len(header)} columns, got {len(fields)}"))
+            return
+        # 空欄は未指定として扱う（スキーマの既定値を使う）
+        batch.append((row, {name: value for name, value in zip(header, fields) if value != ""}))
+
+    add = add_ndjson if fmt == "ndjson" else add_csv
+
+    async for chunk in chunks:
+        lines = (pending + decoder.decode(chunk)).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            add(line.removesuffix("\r"))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+
+    tail = pending + decoder.decode(b"", final=True)
+    if tail:
+        add(tail.removesuffix("\r"))
+    if record:
+        row += 1
+        batch.append(RowError(row, "unterminated quoted field"))
+    if batch:
+        yield batch
+
+
+async def read_file(path: Path) -> AsyncIterator[bytes]:
+    """ファイルを READ_CHUNK_BYTES ずつ読む（読み取りはスレッドで行い、イベントループを止めない）"""
+    with path.open("rb") as f:
+        while chunk := await asyncio.to_thread(f.read, READ_CHUNK_BYTES):
+            yield chunk
@@ -0,0 +1,117 @@
+# app/core/cache.py
+import time
+import uuid as uuid_lib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from app.core.config import CACHE_BACKEND, CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0  # 容量超過で追い出した件数
+    expirations: int = 0  # TTL 切れで捨てた件数
+    invalidations: int = 0  # 書き込みによる明示的な削除件数
+
+
+class CacheBackend(ABC):
+    """
+    キャッシュの保存先。値は dict / list / str などのプレーンなデータに限る
+    Redis のような外部ストアはこのインターフェースを実装して差し替える
+    """
+
+    def __init__(self) -> None:
+        self.stats = CacheStats()
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]: ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None: ...
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> None: ...
+
+    async def namespace(self, name: str) -> str:
+        """
+        name 配下のキーに付けるバージョントークンを返す
+        invalidate_namespace でトークンが変わり、古いキーには二度と当たらなくなる（削除は容量/TTLに任せる）
+        """
+        token = await self.get(f"ns:{name}")
+        if token is None:
+            token = uuid_lib.uuid4().hex
+            await self.set(f"ns:{name}", token)
+        return token
+
+    async def invalidate_namespace(self, *names: str) -> None:
+        await self.delete(*(f"ns:{name}" for name in names))
+
+
+class LRUCache(CacheBackend):
+    """プロセス内の LRU + TTL キャッシュ（ワーカー間では共有されない）"""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, default_ttl: float = CACHE_TTL_SECONDS) -> None:
+        super().__init__()
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            if self._entries.pop(key, None) is not None:
+                self.stats.invalidations += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class NullCache(CacheBackend):
+    """キャッシュ無効時の実装（常にミス）"""
+
+    async def get(self, key: str) -> Optional[Any]:
+        self.stats.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        return None
+
+    async def delete(self, *keys: str) -> None:
+        return None
+
+
+def build_cache(backend: str = CACHE_BACKEND) -> CacheBackend:
+    if backend == "lru":
+        return LRUCache()
+    if backend == "none":
+        return NullCache()
+    raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
+
+
+cache = build_cache()
@@ -1 +1,91 @@
-DECAY_HOURS = 72 # キラキラレベルが減少するまでの時間（72時間）
\ No newline at end of file
+import os
+
+DECAY_HOURS = 72 # キラキラレベルが減少するまでの時間（72時間）
+
+# キラキラレベルの減少方式
+#   lazy: 保存値と level_set_at から読み出し時に実効レベルを計算する（定期UPDATEなし）
+#   job : 10分ごとのジョブで保存値を減らす（従来方式）
+KIRAKIRA_DECAY_MODE = os.getenv("KIRAKIRA_DECAY_MODE", "lazy").lower()
+
+# job モードで1トランザクションに減少させる最大件数
+KIRAKIRA_DECAY_BATCH_SIZE = int(os.getenv("KIRAKIRA_DECAY_BATCH_SIZE", "5000"))
+
+STEP_BATCH_MAX_ROWS = 10000 # 一括登録で1リクエストに受け付ける最大件数
+
+DAILY_TOTALS_MAX_DAYS = 366 # 日別合計の期間取得で1リクエストに指定できる最大日数
+
+# 履歴のエクスポートでサーバー側カーソルから1回に読む行数（この件数ずつ書き出す）
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "1000"))
+
+# 履歴のインポート（CSV / NDJSON）。この行数ずつ検証してステージングテーブルに COPY し、最後に1文でマージする
+IMPORT_BATCH_ROWS = int(os.getenv("IMPORT_BATCH_ROWS", "10000"))
+IMPORT_MAX_REPORTED_ERRORS = 100 # レスポンスに含める検証エラーの行数（件数はすべて数える）
+
+# POST /step/steps の書き込み方式（app.crud.step_buffer）
+#   direct  : リクエストごとに INSERT して COMMIT する
+#   buffered: プロセス内のキューに積んで 202 を返し、バックグラウンドでまとめて1トランザクションで書く
+#             同じユーザーの集計・最新セッションの読み出しは、そのユーザーの未書き込み分を書き終えてから行う（同じプロセス内のみ）
+STEP_INGEST_MODE = os.getenv("STEP_INGEST_MODE", "direct").lower()
+STEP_BUFFER_MAX_ROWS = int(os.getenv("STEP_BUFFER_MAX_ROWS", "10000")) # キューの上限。埋まっていたら 429 を返す
+STEP_BUFFER_FLUSH_ROWS = int(os.getenv("STEP_BUFFER_FLUSH_ROWS", "500")) # この行数たまったらすぐ書く（1トランザクションの上限）
+STEP_BUFFER_FLUSH_INTERVAL_MS = int(os.getenv("STEP_BUFFER_FLUSH_INTERVAL_MS", "50")) # 少なくともこの間隔で書く
+
+# POST /step/steps の Idempotency-Key ヘッダー（app.core.idempotency）。同じキーの再送には覚えておいたレスポンスを返す
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400")) # キーを覚えておく時間（秒）
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "100000")) # 覚えておくキーの上限（古いものから捨てる）
+
+# 読み出しキャッシュ（ユーザー、ユーザーごとのシンボル一覧）
+#   lru : プロセス内 LRU + TTL
+#   none: キャッシュしない
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "lru").lower()
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+# シンボルの空間検索用グリッド（座標は 経度=x / 緯度=y の度単位）
+SYMBOL_GRID_CELL_SIZE = float(os.getenv("SYMBOL_GRID_CELL_SIZE", "0.01")) # 1セルの一辺（度）。0.01度 ≒ 1km
+SYMBOL_SPATIAL_MAX_RESULTS = 1000 # 範囲検索・近傍検索で1リクエストに返す最大件数
+SYMBOL_NEAREST_MAX_RADIUS_CELLS = 256 # 近傍検索で探索範囲を広げる上限（セル数）
+
+# ログ
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+SQL_LOG_LEVEL = os.getenv("SQL_LOG_LEVEL", "WARNING").upper() # INFO で SQL 文を出力する（engine の echo は使わない）
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower() # json: 1行1レコードの JSON / text: 従来の1行テキスト
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000")) # 書き出し待ちの上限。超えた分は捨てる
+# 大量に出る INFO 以下のログを残す割合（1.0 で全件）。WARNING 以上は常に残す
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+# サンプリング対象のロガー名の前方一致（カンマ区切り）
+LOG_SAMPLED_LOGGERS = tuple(
+    name.strip() for name in os.getenv("LOG_SAMPLED_LOGGERS", "app.api,uvicorn.access").split(",") if name.strip()
+)
+
+# 起動時のスキーマの扱い（app.db.init_db）
+#   check  : schema_version が最新か確かめるだけ（DDL を発行しない）。古ければ起動しない
+#   migrate: 起動時に最新まで上げる（単一プロセスの開発環境向け）
+#   skip   : 何もしない
+DB_STARTUP_MODE = os.getenv("DB_STARTUP_MODE", "check").lower()
+
+# コネクションプール（環境ごとに環境変数で変える。SQLite では使わない）
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5")) # 常に保持する接続数
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10")) # 混雑時に一時的に追加で張る接続数
+# 接続の空き待ちの上限（秒）。超えたら待ち続けずに 503 を返す
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "3"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800")) # この秒数より古い接続は張り直す（-1 で無効）
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes") # 貸し出し前に生存確認する
+# 1文あたりの実行時間の上限（ミリ秒、PostgreSQL の statement_timeout）。0 で無制限
+#   重い集計が接続を握り続けないようにする。migrate は SET LOCAL で外す
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "10000"))
+
+# リードレプリカ（カンマ区切りの URL）。GET リクエストの SELECT をラウンドロビンで振り分ける。空ならプライマリだけ
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_HEALTH_CHECK_INTERVAL = float(os.getenv("REPLICA_HEALTH_CHECK_INTERVAL", "5")) # ヘルスチェックの間隔（秒）
+REPLICA_HEALTH_CHECK_TIMEOUT = float(os.getenv("REPLICA_HEALTH_CHECK_TIMEOUT", "1")) # 1回のヘルスチェックの上限（秒）
+
+DB_WARM_CONNECTIONS = int(os.getenv("DB_WARM_CONNECTIONS", str(DB_POOL_SIZE))) # 起動時に張っておく接続数（0 で温めない）
+
+# step テーブルの月別パーティション（PostgreSQL のみ。境界は JST の月初）
+STEP_PARTITION_PREMAKE_MONTHS = int(os.getenv("STEP_PARTITION_PREMAKE_MONTHS", "3")) # 当月から先に作っておく月数
+# 生データを残す月数（当月を含まない）。0 で無期限。古い月は集計を確定させてからパーティションごと外す
+STEP_RETENTION_MONTHS = int(os.getenv("STEP_RETENTION_MONTHS", "0"))
+#   detach: パーティションを切り離して archive_ 付きの単独テーブルとして残す（pg_dump してから DROP する運用）
+#   drop  : そのまま DROP する
+STEP_RETENTION_ACTION = os.getenv("STEP_RETENTION_ACTION", "detach").lower()
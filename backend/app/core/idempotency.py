@@ -0,0 +1,47 @@
+# app/core/idempotency.py
+# Idempotency-Key ヘッダー付きの POST の結果を覚えておき、同じキーの再送には DB に触れずに同じレスポンスを返す
+# 保存先は容量と期限のあるプロセス内 LRU（ワーカー間では共有しない）。別のワーカーに届いた再送や期限切れの後の再送は、
+# 自然キーの ON CONFLICT DO NOTHING で重複にならない
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+from app.core.cache import LRUCache
+from app.core.config import IDEMPOTENCY_MAX_KEYS, IDEMPOTENCY_TTL_SECONDS
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+
+store = LRUCache(max_entries=IDEMPOTENCY_MAX_KEYS, default_ttl=IDEMPOTENCY_TTL_SECONDS)
+
+
+class IdempotencyKeyReused(ValueError):
+    """同じキーで内容の違うリクエストが来た（呼び出し側は 422 を返す）"""
+
+
+@dataclass
+class StoredResponse:
+    status_code: int
+    body: dict[str, Any]
+
+
+def _fingerprint(request_body: BaseModel) -> str:
+    return hashlib.sha256(request_body.model_dump_json().encode()).hexdigest()
+
+
+async def replay(scope: str, key: str, request_body: BaseModel) -> Optional[StoredResponse]:
+    """scope（ユーザーなど）内の key で覚えているレスポンス。なければ None"""
+    stored = await store.get(f"{scope}:{key}")
+    if stored is None:
+        return None
+    if stored["fingerprint"] != _fingerprint(request_body):
+        raise IdempotencyKeyReused(f"{IDEMPOTENCY_KEY_HEADER} was already used with a different request body")
+    return StoredResponse(status_code=stored["status_code"], body=stored["body"])
+
+
+async def remember(scope: str, key: str, request_body: BaseModel, *, status_code: int, body: dict[str, Any]) -> None:
+    await store.set(
+        f"{scope}:{key}",
+        {"fingerprint": _fingerprint(request_body), "status_code": status_code, "body": body},
+    )
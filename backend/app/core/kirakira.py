@@ -0,0 +1,25 @@
+# app/core/kirakira.py
+from datetime import datetime
+from typing import Optional
+
+from app.core.config import DECAY_HOURS
+from app.core.timezone import to_utc, utc_now
+
+
+def elapsed_hours_since(level_set_at: datetime, now: Optional[datetime] = None) -> float:
+    now = now or utc_now()
+    return max(0.0, (now - to_utc(level_set_at)).total_seconds() / 3600.0)
+
+
+def effective_kirakira_level(level: int, level_set_at: datetime, now: Optional[datetime] = None) -> int:
+    """保存されたレベルから、level_set_at 以降 DECAY_HOURS ごとに1ずつ減らした実効レベル（0未満にはしない）"""
+    periods = int(elapsed_hours_since(level_set_at, now) // DECAY_HOURS)
+    return max(0, level - periods)
+
+
+def kirakira_remaining_hours(level: int, level_set_at: datetime, now: Optional[datetime] = None) -> float:
+    """実効レベルが次に1下がるまでの残り時間（hours）。すでに0なら0"""
+    now = now or utc_now()
+    if effective_kirakira_level(level, level_set_at, now) <= 0:
+        return 0.0
+    return DECAY_HOURS - elapsed_hours_since(level_set_at, now) % DECAY_HOURS
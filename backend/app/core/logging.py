@@ -1,37 +1,168 @@
 # app/core/logging.py
+# ログはキューに積むだけにして、実際の書き出し（I/O）は QueueListener のスレッドで行う
+import atexit
+import json
 import logging
-import os
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
 from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.core import metrics
+from app.core.config import (
+    LOG_FORMAT,
+    LOG_LEVEL,
+    LOG_QUEUE_SIZE,
+    LOG_SAMPLE_RATE,
+    LOG_SAMPLED_LOGGERS,
+    SQL_LOG_LEVEL,
+)
+
+# RequestIdMiddleware がリクエストごとに入れる。バックグラウンドジョブでは None
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# LogRecord の標準属性（extra= で渡された項目だけを JSON に載せるために除外する）
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+
+class RequestIdFilter(logging.Filter):
+    """現在のリクエスト ID をレコードに付ける（ContextVar はリクエスト側のスレッドでしか読めないのでキューに積む前に付ける）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    LOG_SAMPLED_LOGGERS 配下の INFO 以下のレコードを rate の割合だけ残す
+    WARNING 以上は常に残す
+    """
+
+    def __init__(self, rate: float, prefixes: tuple[str, ...]) -> None:
+        super().__init__()
+        self.rate = rate
+        self.prefixes = prefixes
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1.0 or record.levelno > logging.INFO:
+            return True
+        if not record.name.startswith(self.prefixes):
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """1レコード1行の JSON（ts, level, logger, message, request_id, extra=, exc_info）"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id is not None:
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """従来の1行テキスト（LOG_FORMAT=text）。リクエスト外のレコードは request_id を - にする"""
+
+    def __init__(self) -> None:
+        super().__init__("%(asctime)s %(levelname)s [%(name)s] [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = "-"
+        return super().format(record)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """キューが一杯のときは待たずに捨てる（捨てた件数は log_records_dropped_total に数える）"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 書式化は QueueListener 側で行うので、ここでは引数の埋め込みと例外の文字列化だけ済ませる
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.log_records_dropped_total.inc()
+
 
 def setup_logging() -> None:
-    log_level = os.getenv("LOG_LEVEL", "INFO").upper()
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
 
     dictConfig(
         {
             "version": 1,
             "disable_existing_loggers": False,
-            "formatters": {
-                "default": {
-                    "format": "%(asctime)s %(levelname)s [%(name)s] %(message)s",
-                }
-            },
-            "handlers": {
-                "console": {
-                    "class": "logging.StreamHandler",
-                    "formatter": "default",
-                }
-            },
+            # root のハンドラは下で QueueHandler を付ける
             "root": {
-                "level": log_level,
-                "handlers": ["console"],
+                "level": LOG_LEVEL,
+                "handlers": [],
             },
+            # uvicorn が付けたハンドラを外して root（キュー）に流す
             "loggers": {
-                "uvicorn": {"level": log_level},
-                "uvicorn.error": {"level": log_level},
-                "uvicorn.access": {"level": log_level},
-                "sqlalchemy.engine": {
-                    "level": os.getenv("SQL_LOG_LEVEL", "WARNING").upper()
-                },
+                "uvicorn": {"level": LOG_LEVEL, "handlers": []},
+                "uvicorn.error": {"level": LOG_LEVEL, "handlers": []},
+                "uvicorn.access": {"level": LOG_LEVEL, "handlers": []},
+                # SQL の出力はこのレベルだけで決める（engine の echo は使わない）
+                "sqlalchemy.engine": {"level": SQL_LOG_LEVEL, "handlers": []},
+                "sqlalchemy.pool": {"level": SQL_LOG_LEVEL, "handlers": []},
+                # InstrumentedQueuePool のロガーは定義したモジュール名になる
+                "app.db.metrics": {"level": SQL_LOG_LEVEL, "handlers": []},
             },
         }
     )
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE, LOG_SAMPLED_LOGGERS))
+    _queue_handler.addFilter(RequestIdFilter())
+    logging.getLogger().addHandler(_queue_handler)
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """キューに残ったレコードを書き出してリスナーを止める"""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener.stop()
+    _listener = None
+    _queue_handler = None
@@ -0,0 +1,290 @@
+# app/core/metrics.py
+# Prometheus テキスト形式で出力する最小限のメトリクス（単一プロセス・単一イベントループ前提なのでロックは取らない）
+import math
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# レイテンシ用（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# レスポンスサイズ用（バイト）
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# 1リクエストあたりの SQL 文の数
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, extra: Optional[tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def render(self) -> list[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(self._values.items())
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # ラベルごとに [バケットごとの件数（累積前）..., +Inf の件数], 合計値
+        self._counts: dict[LabelValues, list[int]] = {}
+        self._sums: dict[LabelValues, float] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        counts = self._counts.get(labels)
+        if counts is None:
+            counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+            self._sums[labels] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[labels] += value
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for labels, counts in sorted(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = ("le", _format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(self._sums[labels])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: list[Metric] = []
+        # 出力時に値を読み取るメトリクス（キャッシュの統計など、他で数えているもの）
+        self._collectors: list[Callable[[], list[Metric]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], list[Metric]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        metrics = list(self._metrics)
+        for collector in self._collectors:
+            metrics += collector()
+        lines: list[str] = []
+        for metric in metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# ---- HTTP ----
+http_requests_total = registry.register(
+    Counter("http_requests_total", "HTTP requests by route template, method and status.", ("method", "route", "status"))
+)
+http_request_duration_seconds = registry.register(
+    Histogram("http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+)
+http_requests_in_flight = registry.register(
+    Gauge("http_requests_in_flight", "HTTP requests currently being handled.")
+)
+http_response_size_bytes = registry.register(
+    Histogram("http_response_size_bytes", "HTTP response body size.", ("method", "route"), SIZE_BUCKETS)
+)
+http_request_db_seconds = registry.register(
+    Histogram("http_request_db_seconds", "Time spent executing SQL per HTTP request.", ("method", "route"))
+)
+http_request_sql_statements = registry.register(
+    Histogram(
+        "http_request_sql_statements", "SQL statements executed per HTTP request.", ("method", "route"), COUNT_BUCKETS
+    )
+)
+
+# ---- DB ----
+db_statements_total = registry.register(
+    Counter("db_statements_total", "SQL statements executed (including background jobs).")
+)
+db_statement_duration_seconds = registry.register(
+    Histogram("db_statement_duration_seconds", "SQL statement execution time.")
+)
+db_pool_wait_seconds = registry.register(
+    Histogram(
+        "db_pool_wait_seconds",
+        "Time spent waiting to check a connection out of the pool.",
+        buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0),
+    )
+)
+db_pool_timeouts_total = registry.register(
+    Counter("db_pool_timeouts_total", "Connection checkouts that gave up after DB_POOL_TIMEOUT.")
+)
+db_statement_timeouts_total = registry.register(
+    Counter("db_statement_timeouts_total", "Statements cancelled by the server-side statement_timeout.")
+)
+db_replica_healthy = registry.register(
+    Gauge("db_replica_healthy", "Whether the read replica passed its last health check (1) or not (0).", ("replica",))
+)
+
+# ---- キラキラレベルの減少ジョブ ----
+kirakira_decay_runs_total = registry.register(
+    Counter("kirakira_decay_runs_total", "Completed kirakira decay job runs.")
+)
+kirakira_decay_rows_total = registry.register(
+    Counter("kirakira_decay_rows_total", "Symbols decayed by the kirakira decay job.")
+)
+kirakira_decay_duration_seconds = registry.register(
+    Histogram(
+        "kirakira_decay_duration_seconds",
+        "Duration of a kirakira decay job run.",
+        buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0),
+    )
+)
+kirakira_decay_last_rows = registry.register(
+    Gauge("kirakira_decay_last_rows", "Symbols decayed by the most recent kirakira decay job run.")
+)
+
+# ---- 歩数の書き込みバッファ（STEP_INGEST_MODE=buffered） ----
+step_buffer_rows = registry.register(
+    Gauge("step_buffer_rows", "Step rows queued in the write-behind buffer and not yet committed.")
+)
+step_buffer_rejected_total = registry.register(
+    Counter("step_buffer_rejected_total", "Step posts rejected with 429 because the write-behind buffer was full.")
+)
+step_buffer_flushed_rows_total = registry.register(
+    Counter("step_buffer_flushed_rows_total", "Step rows committed by the write-behind buffer.")
+)
+step_buffer_dropped_rows_total = registry.register(
+    Counter("step_buffer_dropped_rows_total", "Buffered step rows that could not be written (e.g. unknown user).")
+)
+step_buffer_flush_rows = registry.register(
+    Histogram(
+        "step_buffer_flush_rows",
+        "Rows committed per write-behind buffer transaction.",
+        buckets=(1, 5, 10, 50, 100, 250, 500, 1000, 5000),
+    )
+)
+step_buffer_flush_seconds = registry.register(
+    Histogram("step_buffer_flush_seconds", "Duration of a write-behind buffer transaction.")
+)
+
+# ---- 起動 ----
+# app.main の先頭で上書きする（import にかかる時間も含めるため）
+process_started_at = time.perf_counter()
+app_startup_seconds = registry.register(
+    Gauge("app_startup_seconds", "Seconds from process start until the lifespan startup finished.")
+)
+app_first_request_seconds = registry.register(
+    Gauge("app_first_request_seconds", "Seconds from process start until the first successful HTTP response.")
+)
+_first_request_recorded = False
+
+
+def record_first_request() -> None:
+    global _first_request_recorded
+    if not _first_request_recorded:
+        _first_request_recorded = True
+        app_first_request_seconds.set(time.perf_counter() - process_started_at)
+
+
+# ---- ログ ----
+log_records_dropped_total = registry.register(
+    Counter("log_records_dropped_total", "Log records dropped because the logging queue was full.")
+)
+
+
+# ---- リクエスト単位の DB 計測 ----
+@dataclass
+class RequestDBStats:
+    statements: int = 0
+    seconds: float = 0.0
+
+
+# ミドルウェアがリクエストごとに入れる。バックグラウンドジョブでは None
+request_db_stats: ContextVar[Optional[RequestDBStats]] = ContextVar("request_db_stats", default=None)
+
+
+def record_pool_wait(seconds: float, timed_out: bool) -> None:
+    db_pool_wait_seconds.observe(seconds)
+    if timed_out:
+        db_pool_timeouts_total.inc()
+
+
+def record_statement(seconds: float) -> None:
+    db_statements_total.inc()
+    db_statement_duration_seconds.observe(seconds)
+    stats = request_db_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.seconds += seconds
@@ -0,0 +1,62 @@
+# app/core/pagination.py
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+
+# カーソルはレスポンスボディが配列のエンドポイントではこのヘッダーで返す
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode(values: list[Any]) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> list[Any]:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    values = json.loads(raw)
+    if not isinstance(values, list):
+        raise ValueError("cursor must encode a list")
+    return values
+
+
+def encode_cursor(created_at: datetime, uuid: str) -> str:
+    """(created_at, uuid) のキーセット位置を不透明なカーソル文字列にする"""
+    return _encode([created_at.isoformat(), uuid])
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        created_at, uuid = _decode(cursor)
+        return datetime.fromisoformat(created_at), str(uuid)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor.") from e
+
+
+def encode_uuid_cursor(uuid: str) -> str:
+    """uuid だけで並べる一覧（created_at を持たない user）用のカーソル"""
+    return _encode([uuid])
+
+
+def decode_uuid_cursor(cursor: str) -> str:
+    try:
+        (uuid,) = _decode(cursor)
+        return str(uuid)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor.") from e
+
+
+def split_page(
+    rows: Sequence[T], limit: int, cursor_of: Callable[[T], str]
+) -> tuple[list[T], Optional[str]]:
+    """
+    limit + 1 件取得した結果を1ページ分に切り詰める
+    return: (ページの行, 次ページのカーソル（最後のページなら None）)
+    """
+    if len(rows) <= limit:
+        return list(rows), None
+    page = list(rows[:limit])
+    return page, cursor_of(page[-1])
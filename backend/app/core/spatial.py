@@ -0,0 +1,26 @@
+# app/core/spatial.py
+import math
+
+from app.core.config import SYMBOL_GRID_CELL_SIZE
+
+
+def grid_index(coord: float, cell_size: float = SYMBOL_GRID_CELL_SIZE) -> int:
+    """座標を含むグリッドセルの番号（負の座標も floor で揃える）"""
+    return math.floor(coord / cell_size)
+
+
+def grid_cell(x: float, y: float, cell_size: float = SYMBOL_GRID_CELL_SIZE) -> tuple[int, int]:
+    return grid_index(x, cell_size), grid_index(y, cell_size)
+
+
+def x_scale(y: float) -> float:
+    """緯度 y での経度1度あたりの長さ（緯度1度を1とした比）"""
+    return max(math.cos(math.radians(y)), 1e-6)
+
+
+def planar_distance(x1: float, y1: float, x2: float, y2: float) -> float:
+    """
+    経度方向を cos(緯度) で縮めた近似距離（度）。近傍の並べ替えに使う
+    縮尺は基準点 (x1, y1) の緯度で固定する（SQL の並べ替えと同じ式にするため）
+    """
+    return math.hypot((x2 - x1) * x_scale(y1), y2 - y1)
@@ -26,3 +26,6 @@ def jst_day_to_utc_range(d: date) -> tuple[datetime, datetime]:
     start_jst = datetime.combine(d, time.min).replace(tzinfo=JST)
     end_jst = start_jst + timedelta(days=1)
     return start_jst.astimezone(UTC), end_jst.astimezone(UTC)
+
+def to_jst_date(dt: datetime) -> date:
+    return to_jst(dt).date()
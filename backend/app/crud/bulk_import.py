@@ -0,0 +1,71 @@
+# app/crud/bulk_import.py
+# インポートの共通部分: まとまりごとに検証して、通った行をトランザクション内の一時テーブル（ステージング）へ COPY する
+# ステージングから本テーブルへのマージは step / symbol の crud がそれぞれ1文で行う
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Callable, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import Table
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.bulk_import import Record, RowError, validation_error_message
+from app.core.config import IMPORT_MAX_REPORTED_ERRORS
+from app.db.bulk import bulk_insert
+from app.schemas.bulk_import import ImportResponse, ImportRowError
+
+logger = logging.getLogger(__name__)
+
+# (行番号, 読み取った値) → ステージングの1行。不正なら ValidationError / ValueError を投げる
+Converter = Callable[[int, dict[str, Any]], dict[str, Any]]
+ProgressCallback = Callable[[ImportResponse], None]
+
+
+def _convert_batch(batch: list[Record], convert: Converter) -> tuple[list[dict[str, Any]], list[RowError]]:
+    rows: list[dict[str, Any]] = []
+    errors: list[RowError] = []
+    for record in batch:
+        if isinstance(record, RowError):
+            errors.append(record)
+            continue
+        row, values = record
+        try:
+            rows.append(convert(row, values))
+        except ValidationError as e:
+            errors.append(RowError(row, validation_error_message(e)))
+        except ValueError as e:
+            errors.append(RowError(row, str(e)))
+    return rows, errors
+
+
+async def stage(
+    db_session: AsyncSession,
+    batches: AsyncIterator[list[Record]],
+    *,
+    staging: Table,
+    convert: Converter,
+    result: ImportResponse,
+    progress: Optional[ProgressCallback] = None,
+) -> None:
+    """
+    staging（TEMPORARY テーブル）を作り、batches を検証して通った行を COPY する（commit はしない）
+    件数とエラー行は result に足していく。staging は drop_staging で消す（ロールバックでも消える）
+    """
+    conn = await db_session.connection()
+    await conn.run_sync(staging.create)
+    async for batch in batches:
+        # 検証は CPU を使うのでスレッドで行い、その間も他のリクエストを処理できるようにする
+        rows, errors = await asyncio.to_thread(_convert_batch, batch, convert)
+        await bulk_insert(db_session, staging, rows)
+        result.total += len(batch)
+        result.rejected += len(errors)
+        room = max(IMPORT_MAX_REPORTED_ERRORS - len(result.errors), 0)
+        result.errors.extend(ImportRowError(row=e.row, error=e.error) for e in errors[:room])
+        logger.debug(f"staged {result.total - result.rejected} rows into {staging.name} (rejected {result.rejected})")
+        if progress is not None:
+            progress(result)
+
+
+async def drop_staging(db_session: AsyncSession, staging: Table) -> None:
+    conn = await db_session.connection()
+    await conn.run_sync(staging.drop)
@@ -1,154 +1,506 @@
 # app/crud/step.py
-from typing import List, Optional, Tuple
-from datetime import date
-from datetime import date
+from typing import Any, AsyncIterator, List, Optional, Sequence, Tuple
+from datetime import date, datetime, timedelta
+import uuid as uuid_lib
 
-from sqlalchemy import and_, func
-from sqlalchemy.orm import Session
+from pydantic import ValidationError
+
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    Row,
+    Table,
+    and_,
+    delete,
+    func,
+    select,
+    true,
+    update,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 from sqlalchemy.exc import IntegrityError
 
 from app.models.step import Step
-from app.schemas.step import StepCreate, StepUpdate
-from app.core.timezone import jst_day_to_utc_range
+from app.models.user import User
+from app.schemas.step import StepCreate, StepUpdate, StepBatchItemResult
+from app.schemas.bulk_import import ImportResponse
+from app.core.bulk_import import Record, validation_error_message
+from app.core.timezone import to_jst_date, to_utc
+from app.core.config import DAILY_TOTALS_MAX_DAYS, EXPORT_BATCH_ROWS
+from app.db.bulk import dialect_insert
+from app.db.expressions import keyset_before
+from app.db.types import GUID
+from app.db.session import disable_statement_timeout
+from app.crud.bulk_import import ProgressCallback, drop_staging, stage
+from app.crud.step_daily_total import step_daily_total_crud
+
+# 自然キー（uq_step_user_created_at_started）。同じ計測の再送は ON CONFLICT DO NOTHING で何もしない
+NATURAL_KEY = [Step.user_uuid, Step.created_at, Step.is_started]
+
+# エクスポートで出す列（この順で書き出す）
+EXPORT_COLUMNS = ("uuid", "user_uuid", "step", "is_started", "created_at")
+
+# インポートのステージング（トランザクション内の一時テーブル）。row はファイル内の行番号で、重複したときは先の行を残す
+IMPORT_STAGING = Table(
+    "step_import",
+    MetaData(),
+    Column("row", Integer, nullable=False),
+    Column("uuid", GUID, nullable=False),
+    Column("user_uuid", GUID, nullable=False),
+    Column("step", Integer, nullable=False),
+    Column("is_started", Boolean, nullable=False),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+    prefixes=["TEMPORARY"],
+)
 
 
 class CRUDStep:
-    def get(self, db_session: Session, uuid: str) -> Optional[Step]:
-        return db_session.query(Step).filter(Step.uuid == uuid).first()
+    async def get(
+        self, db_session: AsyncSession, uuid: str, *, include_user: bool = False
+    ) -> Optional[Step]:
+        stmt = select(Step).where(Step.uuid == uuid)
+        if include_user:
+            stmt = stmt.options(joinedload(Step.user))
+        result = await db_session.execute(stmt)
+        return result.scalars().first()
 
-    def get_multi(
-        self, db_session: Session, *, skip: int = 0, limit: int = 100
+    async def get_multi(
+        self,
+        db_session: AsyncSession,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        before: Optional[Tuple[datetime, str]] = None,
+        include_user: bool = False,
     ) -> List[Step]:
-        return db_session.query(Step).offset(skip).limit(limit).all()
+        """
+        created_at の新しい順。before（(created_at, uuid) のキーセット位置）があれば skip より優先する
+        include_user: Step.user を selectinload でまとめて読み込む（1クエリ追加、行ごとの SELECT はしない）
+        """
+        stmt = select(Step).order_by(Step.created_at.desc(), Step.uuid.desc())
+        if include_user:
+            stmt = stmt.options(selectinload(Step.user))
+        if before is not None:
+            # created_at 単独の条件も付けて、インデックスの範囲とパーティションの枝刈りに使えるようにする
+            stmt = stmt.where(Step.created_at <= before[0], keyset_before(Step.created_at, Step.uuid, before))
+        else:
+            stmt = stmt.offset(skip)
+        result = await db_session.execute(stmt.limit(limit))
+        return list(result.scalars().all())
 
-    def get_by_user_and_date(
-        self, db_session: Session, *, user_uuid: str, target_date: date
+    async def get_by_user_and_date(
+        self, db_session: AsyncSession, *, user_uuid: str, target_date: date, include_user: bool = False
     ) -> Optional[Step]:
-        return (
-            db_session.query(Step)
-            .filter(Step.user_uuid == user_uuid, Step.created_at == target_date)
-            .first()
+        """target_date（JST）の最初の行。ix_step_user_local_date の等値で引く"""
+        stmt = (
+            select(Step)
+            .where(Step.user_uuid == user_uuid, Step.on_local_date(target_date))
+            .order_by(Step.created_at, Step.uuid)
+            .limit(1)
         )
+        if include_user:
+            stmt = stmt.options(joinedload(Step.user))
+        result = await db_session.execute(stmt)
+        return result.scalars().first()
 
-    def get_multi_by_user(
-        self, db_session: Session, *, user_uuid: str, skip: int = 0, limit: int = 100
+    async def get_multi_by_user(
+        self,
+        db_session: AsyncSession,
+        *,
+        user_uuid: str,
+        skip: int = 0,
+        limit: int = 100,
+        before: Optional[Tuple[datetime, str]] = None,
+        include_user: bool = False,
     ) -> List[Step]:
-        return (
-            db_session.query(Step)
-            .filter(Step.user_uuid == user_uuid)
-            .order_by(Step.created_at.desc())
-            .offset(skip)
-            .limit(limit)
-            .all()
+        """
+        created_at の新しい順。before があれば uq_step_user_created_at_started の (user_uuid, created_at) をその位置から辿る
+        """
+        stmt = (
+            select(Step)
+            .where(Step.user_uuid == user_uuid)
+            .order_by(Step.created_at.desc(), Step.uuid.desc())
         )
+        if include_user:
+            stmt = stmt.options(selectinload(Step.user))
+        if before is not None:
+            # created_at 単独の条件も付けて、インデックスの範囲とパーティションの枝刈りに使えるようにする
+            stmt = stmt.where(Step.created_at <= before[0], keyset_before(Step.created_at, Step.uuid, before))
+        else:
+            stmt = stmt.offset(skip)
+        result = await db_session.execute(stmt.limit(limit))
+        return list(result.scalars().all())
 
-    def create(self, db_session: Session, *, obj_in: StepCreate) -> Step:
-        db_obj = Step(
-            user_uuid=obj_in.user_uuid,
-            step=obj_in.step,
-            is_started=obj_in.is_started,
-            created_at=obj_in.created_at,
+    async def stream_by_user(
+        self, db_session: AsyncSession, *, user_uuid: str, batch_size: int = EXPORT_BATCH_ROWS
+    ) -> AsyncIterator[Sequence[Row]]:
+        """
+        ユーザーの全履歴を created_at の古い順に batch_size 行ずつ返す（エクスポート用）
+        サーバー側カーソル（yield_per）で読むので全件をメモリに載せない。ORM オブジェクトにせず列のタプルで返す
+        """
+        stmt = (
+            select(*(getattr(Step, name) for name in EXPORT_COLUMNS))
+            .where(Step.user_uuid == user_uuid)
+            .order_by(Step.created_at, Step.uuid)
+            .execution_options(yield_per=batch_size)
         )
-        db_session.add(db_obj)
+        result = await db_session.stream(stmt)
         try:
-            db_session.commit()
+            async for rows in result.partitions():
+                yield rows
+        finally:
+            await result.close()
+
+    async def create(self, db_session: AsyncSession, *, obj_in: StepCreate) -> Tuple[Step, bool]:
+        """
+        INSERT ... ON CONFLICT DO NOTHING RETURNING の1文で作成する
+        同じ (user_uuid, created_at, is_started) がすでにあれば（端末の再送など）何も変えずに既存の行を返す
+        return: (行, 新しく作ったか)
+        """
+        # 自然キーをどの経路（一括登録・バッファ・インポート）から入った行とも同じ値で比べられるよう UTC に揃える
+        created_at = to_utc(obj_in.created_at)
+        try:
+            conn = await db_session.connection()
+            db_obj = await db_session.scalar(
+                dialect_insert(conn.dialect.name, Step)
+                .values(
+                    user_uuid=obj_in.user_uuid,
+                    step=obj_in.step,
+                    is_started=obj_in.is_started,
+                    created_at=created_at,
+                )
+                .on_conflict_do_nothing(index_elements=NATURAL_KEY)
+                .returning(Step)
+            )
+            if db_obj is None:
+                await db_session.rollback()
+                existing = await db_session.scalar(
+                    select(Step).where(
+                        Step.user_uuid == obj_in.user_uuid,
+                        Step.created_at == created_at,
+                        Step.is_started == obj_in.is_started,
+                    )
+                )
+                return existing, False
+            await step_daily_total_crud.add_samples(
+                db_session,
+                samples=[{"user_uuid": db_obj.user_uuid, "step": db_obj.step, "created_at": db_obj.created_at}],
+            )
+            await db_session.commit()
         except IntegrityError as e:
-            db_session.rollback()
-            raise ValueError(
-                f"Step already exists for user_uuid={obj_in.user_uuid} created_at={obj_in.created_at}"
-            ) from e
+            await db_session.rollback()
+            raise ValueError(f"User not found: uuid={obj_in.user_uuid}") from e
 
-        db_session.refresh(db_obj)
-        return db_obj
+        return db_obj, True
 
-    def update(self, db_session: Session, *, db_obj: Step, obj_in: StepUpdate) -> Step:
-        update_data = obj_in.model_dump(exclude_unset=True)
+    async def create_batch(
+        self, db_session: AsyncSession, *, rows_in: List[dict[str, Any]]
+    ) -> List[StepBatchItemResult]:
+        """
+        行ごとに検証し、通った行だけを1トランザクション・1回の一括INSERTで登録する
+        return: 入力順の行ごとの accept/reject 結果
+        """
+        results: List[StepBatchItemResult] = []
+        valid: List[Tuple[int, StepCreate]] = []
+        for index, row in enumerate(rows_in):
+            try:
+                valid.append((index, StepCreate.model_validate(row)))
+            except ValidationError as e:
+                results.append(
+                    StepBatchItemResult(index=index, accepted=False, error=validation_error_message(e))
+                )
 
-        for field, value in update_data.items():
-            setattr(db_obj, field, value)
+        # FK 違反で全体が失敗しないよう、存在しないユーザーの行は事前に弾く
+        user_uuids = {obj_in.user_uuid for _, obj_in in valid}
+        existing = set()
+        if user_uuids:
+            existing = set(
+                (await db_session.scalars(select(User.uuid).where(User.uuid.in_(user_uuids)))).all()
+            )
 
-        db_session.add(db_obj)
+        rows = []
+        for index, obj_in in valid:
+            if obj_in.user_uuid not in existing:
+                results.append(
+                    StepBatchItemResult(index=index, accepted=False, error=f"User not found: uuid={obj_in.user_uuid}")
+                )
+                continue
+            step_uuid = str(uuid_lib.uuid4())
+            rows.append(
+                {
+                    "uuid": step_uuid,
+                    "user_uuid": obj_in.user_uuid,
+                    "step": obj_in.step,
+                    "is_started": obj_in.is_started,
+                    "created_at": to_utc(obj_in.created_at),
+                }
+            )
+            results.append(StepBatchItemResult(index=index, accepted=True, uuid=step_uuid))
+
+        inserted = await self.create_rows(db_session, rows=rows)
+        for result in results:
+            if result.accepted and result.uuid not in inserted:
+                # 登録済みの計測の再送。データはすでにあるので受け付け扱いにする
+                result.uuid = None
+                result.duplicate = True
+        results.sort(key=lambda r: r.index)
+        return results
+
+    async def create_rows(self, db_session: AsyncSession, *, rows: List[dict[str, Any]]) -> set[str]:
+        """
+        検証済みの行（uuid, user_uuid, step, is_started, created_at）を1トランザクションで登録して commit する
+        自然キーが重複する行は ON CONFLICT DO NOTHING で飛ばし、実際に入った行だけを集計に足す
+        一括登録と書き込みバッファ（app.crud.step_buffer）のグループコミットで使う
+        return: 登録した行の uuid
+        """
+        if not rows:
+            return set()
         try:
-            db_session.commit()
+            conn = await db_session.connection()
+            stmt = (
+                dialect_insert(conn.dialect.name, Step.__table__)
+                .on_conflict_do_nothing(index_elements=NATURAL_KEY)
+                .returning(Step.uuid, Step.user_uuid, Step.step, Step.created_at)
+            )
+            # 複数行の VALUES にまとめて送られる（insertmanyvalues）。RETURNING には入った行だけが返る
+            inserted = [row._mapping for row in (await db_session.execute(stmt, rows)).all()]
+            await step_daily_total_crud.add_samples(db_session, samples=inserted)
+            await db_session.commit()
         except IntegrityError as e:
-            db_session.rollback()
-            raise ValueError("Step update failed due to constraint violation") from e
+            await db_session.rollback()
+            raise ValueError("Step batch insert failed due to constraint violation") from e
+        return {row["uuid"] for row in inserted}
 
-        db_session.refresh(db_obj)
-        return db_obj
+    async def import_rows(
+        self,
+        db_session: AsyncSession,
+        *,
+        user_uuid: str,
+        batches: AsyncIterator[list[Record]],
+        progress: Optional[ProgressCallback] = None,
+    ) -> ImportResponse:
+        """
+        batches（app.core.bulk_import.iter_batches）の各行を StepCreate で検証し、user_uuid の歩数として登録する
+        通った行はステージングへ COPY し、最後に1文で step へマージする
+        すでにある (created_at, is_started) の行とファイル内の重複は ON CONFLICT で登録しない（同じファイルを入れ直しても増えない）
+        集計（step_daily_total）も同じトランザクションで DB 内で加算する
+        """
 
-    def remove(self, db_session: Session, *, uuid: str) -> Step:
-        obj = db_session.query(Step).filter(Step.uuid == uuid).first()
-        if obj is None:
-            raise ValueError(f"Step not found: uuid={uuid}")
-
-        db_session.delete(obj)
-        db_session.commit()
-        return obj
-    
-    def get_latest_stop(self, db_session: Session, *, user_uuid: str) -> Optional[Step]:
-        return (
-            db_session.query(Step)
-            .filter(Step.user_uuid == user_uuid, Step.is_started == False)
-            .order_by(Step.created_at.desc())
-            .first()
+        def convert(row: int, values: dict[str, Any]) -> dict[str, Any]:
+            # ファイルの user_uuid 列（エクスポート元のユーザー）は使わず、登録先のユーザーに揃える
+            obj_in = StepCreate.model_validate({**values, "user_uuid": user_uuid})
+            return {
+                "row": row,
+                "uuid": str(uuid_lib.uuid4()),
+                "user_uuid": user_uuid,
+                "step": obj_in.step,
+                "is_started": obj_in.is_started,
+                "created_at": to_utc(obj_in.created_at),
+            }
+
+        staging = IMPORT_STAGING
+        result = ImportResponse()
+        try:
+            # 行数に比例して時間がかかるので statement_timeout を外す
+            await disable_statement_timeout(db_session)
+            await stage(db_session, batches, staging=staging, convert=convert, result=result, progress=progress)
+
+            # 登録済みの計測とファイル内の重複（後の行）は自然キーの ON CONFLICT DO NOTHING で飛ばす
+            columns = ["uuid", "user_uuid", "step", "is_started", "created_at"]
+            conn = await db_session.connection()
+            merged = await db_session.execute(
+                dialect_insert(conn.dialect.name, Step.__table__)
+                .from_select(
+                    columns,
+                    # SQLite の INSERT ... SELECT ... ON CONFLICT は WHERE がないと構文が曖昧になる
+                    select(*(staging.c[name] for name in columns)).where(true()).order_by(staging.c.row),
+                )
+                .on_conflict_do_nothing(index_elements=NATURAL_KEY)
+            )
+            result.inserted = merged.rowcount
+            result.skipped = result.total - result.rejected - result.inserted
+
+            # 実際に入った行（step にあるステージングの uuid）だけを集計に足す
+            await step_daily_total_crud.add_selected(
+                db_session,
+                rows=select(Step.user_uuid, Step.step, Step.created_at).join(
+                    staging, and_(staging.c.uuid == Step.uuid, staging.c.created_at == Step.created_at)
+                ),
+            )
+            await drop_staging(db_session, staging)
+            await db_session.commit()
+        except IntegrityError as e:
+            await db_session.rollback()
+            raise ValueError("Step import failed due to constraint violation") from e
+        return result
+
+    async def update(self, db_session: AsyncSession, *, uuid: str, obj_in: StepUpdate) -> Optional[Step]:
+        """
+        UPDATE ... WHERE uuid = ... RETURNING の1文で更新する
+        集計の差分に使う更新前の歩数は、PostgreSQL では同じ文の FROM（FOR UPDATE で最新値をロック）から受け取る
+        return: 更新後の行（存在しなければ None）
+        """
+        update_data = obj_in.model_dump(exclude_unset=True)
+        if not update_data:
+            return await self.get(db_session, uuid)
+
+        old = (
+            select(Step.uuid, Step.step.label("old_step"))
+            .where(Step.uuid == uuid)
+            .with_for_update()
+            .subquery()
+        )
+        stmt = (
+            update(Step)
+            .where(Step.uuid == old.c.uuid)
+            .values(**update_data)
+            .execution_options(synchronize_session=False)
         )
+        try:
+            conn = await db_session.connection()
+            if conn.dialect.name == "postgresql":
+                row = (await db_session.execute(stmt.returning(Step, old.c.old_step))).first()
+            else:
+                # SQLite は RETURNING で FROM 側の列を参照できないので、更新前の値を先に読む
+                old_step = await db_session.scalar(select(Step.step).where(Step.uuid == uuid))
+                db_obj = await db_session.scalar(stmt.returning(Step))
+                row = None if db_obj is None else (db_obj, old_step)
+            if row is None:
+                await db_session.rollback()
+                return None
 
-    # 直前の start を取得
-    def get_previous_start_before(
-        self, db_session: Session, *, user_uuid: str, before_created_at
-    ) -> Optional[Step]:
-        return (
-            db_session.query(Step)
-            .filter(
-                Step.user_uuid == user_uuid,
-                Step.is_started == True,
-                Step.created_at < before_created_at,
+            db_obj, old_step = row
+            await step_daily_total_crud.adjust_total(
+                db_session,
+                user_uuid=db_obj.user_uuid,
+                local_date=to_jst_date(db_obj.created_at),
+                delta=db_obj.step - old_step,
             )
-            .order_by(Step.created_at.desc())
-            .first()
+            await db_session.commit()
+        except IntegrityError as e:
+            await db_session.rollback()
+            raise ValueError("Step update failed due to constraint violation") from e
+
+        return db_obj
+
+    async def remove(self, db_session: AsyncSession, *, uuid: str) -> Optional[Step]:
+        """
+        DELETE ... RETURNING の1文で削除する
+        return: 削除した行（存在しなければ None）
+        """
+        db_obj = await db_session.scalar(delete(Step).where(Step.uuid == uuid).returning(Step))
+        if db_obj is None:
+            await db_session.rollback()
+            return None
+
+        await step_daily_total_crud.recompute(
+            db_session, user_uuid=db_obj.user_uuid, local_date=to_jst_date(db_obj.created_at)
         )
+        await db_session.commit()
+        return db_obj
 
-    def calc_latest_session_steps(self, db_session: Session, *, user_uuid: str) -> Tuple[Step, Step, int]:
+    async def get_sessions(
+        self,
+        db_session: AsyncSession,
+        *,
+        user_uuid: str,
+        from_at: Optional[datetime] = None,
+        to_at: Optional[datetime] = None,
+        before: Optional[Tuple[datetime, str]] = None,
+        limit: int = 20,
+    ) -> List[Row]:
         """
-        直近 stop と、その直前 start を探して diff を返す
-        return: (start_row, stop_row, diff_steps)
+        start の直後に stop が来ている行の組をセッションとし、stop の新しい順に返す
+        (user_uuid, created_at) の降順に1回走査し、LEAD で「時間的に1つ前の行」を並べて組にする
+        before: (stopped_at, stop_uuid) のキーセット位置。これより前のセッションだけを返す
+        return: stop_uuid, stopped_at, stop_step, start_uuid, started_at, start_step を持つ行
         """
-        stop_row = self.get_latest_stop(db_session, user_uuid=user_uuid)
-        if stop_row is None:
-            raise ValueError("No stop record (is_started=False) found for this user.")
+        window = dict(
+            partition_by=Step.user_uuid,
+            order_by=(Step.created_at.desc(), Step.uuid.desc()),
+        )
+        rows = select(
+            Step.uuid.label("stop_uuid"),
+            Step.created_at.label("stopped_at"),
+            Step.step.label("stop_step"),
+            Step.is_started.label("is_started"),
+            func.lead(Step.uuid, type_=Step.uuid.type).over(**window).label("start_uuid"),
+            func.lead(Step.created_at, type_=Step.created_at.type).over(**window).label("started_at"),
+            func.lead(Step.step, type_=Step.step.type).over(**window).label("start_step"),
+            func.lead(Step.is_started, type_=Step.is_started.type).over(**window).label("prev_is_started"),
+        ).where(Step.user_uuid == user_uuid)
+        # 範囲外の行は窓関数の前に落とす（セッションは start / stop とも範囲内のものだけになる）
+        if from_at is not None:
+            rows = rows.where(Step.created_at >= from_at)
+        if to_at is not None:
+            rows = rows.where(Step.created_at < to_at)
+        if before is not None:
+            rows = rows.where(Step.created_at <= before[0], keyset_before(Step.created_at, Step.uuid, before))
+        rows = rows.subquery()
 
-        start_row = self.get_previous_start_before(
-            db_session, user_uuid=user_uuid, before_created_at=stop_row.created_at
+        result = await db_session.execute(
+            select(
+                rows.c.stop_uuid,
+                rows.c.stopped_at,
+                rows.c.stop_step,
+                rows.c.start_uuid,
+                rows.c.started_at,
+                rows.c.start_step,
+            )
+            .where(rows.c.is_started == False, rows.c.prev_is_started == True)
+            .order_by(rows.c.stopped_at.desc(), rows.c.stop_uuid.desc())
+            .limit(limit)
         )
-        if start_row is None:
-            raise ValueError("No start record (is_started=True) found before the latest stop.")
+        return list(result.all())
 
-        diff = stop_row.step - start_row.step
+    async def calc_latest_session_steps(self, db_session: AsyncSession, *, user_uuid: str) -> Tuple[Row, int]:
+        """
+        直近のセッション（get_sessions の先頭1件）の diff を返す
+        return: (session_row, diff_steps)
+        """
+        sessions = await self.get_sessions(db_session, user_uuid=user_uuid, limit=1)
+        if not sessions:
+            raise ValueError("No session (start followed by stop) found for this user.")
+
+        session = sessions[0]
+        diff = session.stop_step - session.start_step
         if diff < 0:
             # センサー値の巻き戻り/端末再起動などを想定
             raise ValueError("Step counter decreased between start and stop (diff < 0).")
 
-        return start_row, stop_row, diff
+        return session, diff
 
-    def calc_daily_total_steps(self, db: Session, *, user_uuid: str, target_date: date) -> int:
+    async def calc_daily_total_steps(self, db: AsyncSession, *, user_uuid: str, target_date: date) -> int:
         """
-        指定日の start/stop を created_at 順に見て、start->stop の差分を合算
+        指定日（JST）の合計歩数を集計テーブルから主キー1件で取得する
         """
-        start_utc, end_utc = jst_day_to_utc_range(target_date)
-
-        total = (
-            db.query(func.sum(Step.step))
-            .filter(
-                Step.user_uuid == user_uuid,
-                Step.created_at >= start_utc,
-                Step.created_at < end_utc,
-            )
-            .scalar()
-        )
+        daily_total = await step_daily_total_crud.get(db, user_uuid=user_uuid, local_date=target_date)
+        if daily_total is None:
+            return 0
+        return int(daily_total.total_steps)
 
-        return int(total or 0)
+    async def calc_daily_totals(
+        self, db: AsyncSession, *, user_uuid: str, from_date: date, to_date: date
+    ) -> Tuple[List[date], List[int]]:
+        """
+        from_date〜to_date（JST、両端含む）の日別合計歩数を、記録がない日を0で埋めて返す
+        return: (dates, totals)
+        """
+        if to_date < from_date:
+            raise ValueError("'to' must be on or after 'from'.")
+        days = (to_date - from_date).days + 1
+        if days > DAILY_TOTALS_MAX_DAYS:
+            raise ValueError(f"Date range must be at most {DAILY_TOTALS_MAX_DAYS} days.")
 
+        totals_by_date = await step_daily_total_crud.get_range(
+            db, user_uuid=user_uuid, from_date=from_date, to_date=to_date
+        )
+        dates = [from_date + timedelta(days=i) for i in range(days)]
+        return dates, [totals_by_date.get(d, 0) for d in dates]
 
 
 step_crud = CRUDStep()
@@ -0,0 +1,168 @@
+# app/crud/step_buffer.py
+# POST /step/steps の書き込みバッファ（STEP_INGEST_MODE=buffered）
+# リクエストはプロセス内のキューに積むだけで返し、バックグラウンドのタスクが最初の行から STEP_BUFFER_FLUSH_INTERVAL_MS 後
+# （STEP_BUFFER_FLUSH_ROWS たまったらすぐ）にまとめて1トランザクションで書く。COMMIT の回数がリクエスト数ではなくフラッシュ回数になる
+import asyncio
+import logging
+import time
+import uuid as uuid_lib
+from contextlib import suppress
+from typing import Any, Optional
+
+from app.core import metrics
+from app.core.config import STEP_BUFFER_FLUSH_INTERVAL_MS, STEP_BUFFER_FLUSH_ROWS, STEP_BUFFER_MAX_ROWS
+from app.core.timezone import to_utc
+from app.crud.step import step_crud
+from app.db.session import SessionLocal
+from app.schemas.step import StepCreate
+
+logger = logging.getLogger(__name__)
+
+# DB に書けなかったとき（接続断など）のやり直し回数と間隔（秒、回数に比例して延ばす）
+WRITE_RETRIES = 3
+WRITE_RETRY_BACKOFF = 0.5
+
+
+class StepBufferFull(Exception):
+    """キューが埋まっている、または停止中（呼び出し側は 429 を返す）"""
+
+
+class StepWriteBuffer:
+    def __init__(self, *, max_rows: int, flush_rows: int, flush_interval: float) -> None:
+        self.max_rows = max_rows
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._rows: list[dict[str, Any]] = []
+        # 今たまっている行が書き終わったら完了する Future（フラッシュのたびに作り直す）
+        self._done: Optional[asyncio.Future] = None
+        # ユーザー → そのユーザーの最後の行が入っているフラッシュの Future
+        self._pending: dict[str, asyncio.Future] = {}
+        self._arrived = asyncio.Event()  # 空のキューに行が入った
+        self._wake = asyncio.Event()  # 間隔を待たずにすぐ書く（flush_rows に達した・読み出しが待っている・停止する）
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        self._closing = False
+        self._done = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """受け付けを止め、たまっている行をすべて書いてから終わる"""
+        if self._task is None:
+            return
+        self._closing = True
+        self._arrived.set()
+        self._wake.set()
+        await self._task
+        self._task = None
+
+    def submit(self, obj_in: StepCreate) -> dict[str, Any]:
+        """
+        行をキューに積む（DB には触れない）。uuid はここで決める
+        return: 書き込まれる行（レスポンスにそのまま使える）
+        """
+        if not self.running or self._closing or len(self._rows) >= self.max_rows:
+            metrics.step_buffer_rejected_total.inc()
+            raise StepBufferFull()
+        row = {
+            "uuid": str(uuid_lib.uuid4()),
+            "user_uuid": obj_in.user_uuid,
+            "step": obj_in.step,
+            "is_started": obj_in.is_started,
+            "created_at": to_utc(obj_in.created_at),
+        }
+        self._rows.append(row)
+        self._pending[row["user_uuid"]] = self._done
+        if len(self._rows) == 1:
+            self._arrived.set()
+        if len(self._rows) >= self.flush_rows:
+            self._wake.set()
+        metrics.step_buffer_rows.set(len(self._rows))
+        return row
+
+    async def wait_for_user(self, user_uuid: str) -> bool:
+        """
+        user_uuid の書き込み待ちの行があれば、それが書き終わるまで待つ（read-your-writes）
+        return: 待った（= 直前に書いた行がある）なら True
+        """
+        done = self._pending.get(user_uuid)
+        if done is None:
+            return False
+        if done is self._done:
+            # まだキューにある。間隔を待たずに書かせる
+            self._wake.set()
+        await asyncio.shield(done)
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            if not self._rows:
+                if self._closing:
+                    return
+                await self._arrived.wait()
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            await self._flush()
+
+    async def _flush(self) -> None:
+        # 取り出しとイベントのクリアの間に await を挟まないので、この後に積まれた行は次のフラッシュで書かれる
+        self._arrived.clear()
+        self._wake.clear()
+        rows, done = self._rows, self._done
+        self._rows, self._done = [], asyncio.get_running_loop().create_future()
+        metrics.step_buffer_rows.set(0)
+        try:
+            for start in range(0, len(rows), self.flush_rows):
+                await self._write(rows[start : start + self.flush_rows])
+        finally:
+            done.set_result(None)
+            for row in rows:
+                if self._pending.get(row["user_uuid"]) is done:
+                    del self._pending[row["user_uuid"]]
+
+    async def _write(self, rows: list[dict[str, Any]]) -> None:
+        started = time.perf_counter()
+        written = len(rows)
+        for attempt in range(1, WRITE_RETRIES + 1):
+            try:
+                async with SessionLocal() as db:
+                    await step_crud.create_rows(db, rows=rows)
+                break
+            except ValueError:
+                # 制約違反（存在しないユーザーなど）。1行のせいで他の行まで失わないよう1行ずつ書き直す
+                written = await self._write_each(rows)
+                break
+            except Exception:
+                if attempt == WRITE_RETRIES:
+                    metrics.step_buffer_dropped_rows_total.inc(amount=len(rows))
+                    logger.exception(f"step buffer: dropped {len(rows)} rows after {attempt} attempts")
+                    return
+                logger.warning(f"step buffer: write failed (attempt {attempt}), retrying", exc_info=True)
+                await asyncio.sleep(WRITE_RETRY_BACKOFF * attempt)
+        metrics.step_buffer_flushed_rows_total.inc(amount=written)
+        metrics.step_buffer_flush_rows.observe(written)
+        metrics.step_buffer_flush_seconds.observe(time.perf_counter() - started)
+
+    async def _write_each(self, rows: list[dict[str, Any]]) -> int:
+        written = 0
+        for row in rows:
+            try:
+                async with SessionLocal() as db:
+                    await step_crud.create_rows(db, rows=[row])
+                written += 1
+            except ValueError as e:
+                metrics.step_buffer_dropped_rows_total.inc()
+                logger.warning(f"step buffer: dropped row for user_uuid={row['user_uuid']}: {e}")
+        return written
+
+
+step_write_buffer = StepWriteBuffer(
+    max_rows=STEP_BUFFER_MAX_ROWS,
+    flush_rows=STEP_BUFFER_FLUSH_ROWS,
+    flush_interval=STEP_BUFFER_FLUSH_INTERVAL_MS / 1000,
+)
@@ -0,0 +1,241 @@
+# app/crud/step_daily_total.py
+from datetime import date, datetime
+from typing import Any, Iterable, Optional
+
+from sqlalchemy import Select, case, delete, func, insert, select, true, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.step import Step
+from app.models.step_daily_total import StepDailyTotal
+from app.core.timezone import to_jst_date, to_utc
+from app.db.bulk import dialect_insert
+from app.db.expressions import jst_date
+from app.db.session import disable_statement_timeout
+
+
+def _accumulate(stmt):
+    """既存の集計行があれば合計・件数を足し、first_at / last_at を広げる ON CONFLICT にする"""
+    excluded = stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=[StepDailyTotal.user_uuid, StepDailyTotal.local_date],
+        set_={
+            "total_steps": StepDailyTotal.total_steps + excluded.total_steps,
+            "sample_count": StepDailyTotal.sample_count + excluded.sample_count,
+            "first_at": case(
+                (excluded.first_at < StepDailyTotal.first_at, excluded.first_at),
+                else_=StepDailyTotal.first_at,
+            ),
+            "last_at": case(
+                (excluded.last_at > StepDailyTotal.last_at, excluded.last_at),
+                else_=StepDailyTotal.last_at,
+            ),
+        },
+    )
+
+
+class CRUDStepDailyTotal:
+    async def get(
+        self, db_session: AsyncSession, *, user_uuid: str, local_date: date
+    ) -> Optional[StepDailyTotal]:
+        return await db_session.get(StepDailyTotal, (user_uuid, local_date))
+
+    async def get_range(
+        self, db_session: AsyncSession, *, user_uuid: str, from_date: date, to_date: date
+    ) -> dict[date, int]:
+        """from_date〜to_date（両端含む）の記録がある日の合計歩数を主キーの範囲1回で取得する"""
+        result = await db_session.execute(
+            select(StepDailyTotal.local_date, StepDailyTotal.total_steps).where(
+                StepDailyTotal.user_uuid == user_uuid,
+                StepDailyTotal.local_date >= from_date,
+                StepDailyTotal.local_date <= to_date,
+            )
+        )
+        return {local_date: int(total) for local_date, total in result.all()}
+
+    async def add_samples(self, db_session: AsyncSession, *, samples: Iterable[dict[str, Any]]) -> None:
+        """
+        新しく INSERT した step 行（user_uuid, step, created_at）を集計に加算する（commit はしない）
+        """
+        buckets: dict[tuple[str, date], dict[str, Any]] = {}
+        for sample in samples:
+            # naive / aware が混在しても比較できるよう UTC に揃える
+            created_at: datetime = to_utc(sample["created_at"])
+            key = (sample["user_uuid"], to_jst_date(created_at))
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = {
+                    "user_uuid": key[0],
+                    "local_date": key[1],
+                    "total_steps": sample["step"],
+                    "sample_count": 1,
+                    "first_at": created_at,
+                    "last_at": created_at,
+                }
+                continue
+            bucket["total_steps"] += sample["step"]
+            bucket["sample_count"] += 1
+            bucket["first_at"] = min(bucket["first_at"], created_at)
+            bucket["last_at"] = max(bucket["last_at"], created_at)
+
+        if not buckets:
+            return
+
+        conn = await db_session.connection()
+        stmt = _accumulate(dialect_insert(conn.dialect.name, StepDailyTotal.__table__))
+        await db_session.execute(stmt, list(buckets.values()))
+
+    async def add_selected(self, db_session: AsyncSession, *, rows: Select) -> None:
+        """
+        add_samples の SELECT 版。rows（user_uuid, step, created_at の列を持つ SELECT）を DB 内で日別に集計して加算する
+        インポートのように大量の行を Python に持ってこずに集計へ反映するときに使う（commit はしない）
+        """
+        sample = rows.subquery()
+        local_date = jst_date(sample.c.created_at)
+        source = (
+            select(
+                sample.c.user_uuid,
+                local_date.label("local_date"),
+                func.sum(sample.c.step),
+                func.count(),
+                func.min(sample.c.created_at),
+                func.max(sample.c.created_at),
+            )
+            # SQLite の INSERT ... SELECT ... ON CONFLICT は WHERE がないと構文が曖昧になる
+            .where(true())
+            .group_by(sample.c.user_uuid, local_date)
+        )
+        conn = await db_session.connection()
+        stmt = dialect_insert(conn.dialect.name, StepDailyTotal.__table__).from_select(
+            ["user_uuid", "local_date", "total_steps", "sample_count", "first_at", "last_at"],
+            source,
+        )
+        await db_session.execute(_accumulate(stmt))
+
+    async def adjust_total(
+        self, db_session: AsyncSession, *, user_uuid: str, local_date: date, delta: int
+    ) -> None:
+        """既存 step 行の歩数が変わった分だけ合計を増減する（commit はしない）"""
+        if delta == 0:
+            return
+        await db_session.execute(
+            update(StepDailyTotal)
+            .where(StepDailyTotal.user_uuid == user_uuid, StepDailyTotal.local_date == local_date)
+            .values(total_steps=StepDailyTotal.total_steps + delta)
+        )
+
+    async def recompute(self, db_session: AsyncSession, *, user_uuid: str, local_date: date) -> None:
+        """
+        1ユーザー×1日分を step テーブルから集計し直す（commit はしない）
+        削除で first_at / last_at が変わる場合に使う。(user_uuid, local_date) インデックスの等値で済む
+        """
+        total, count, first_at, last_at = (
+            await db_session.execute(
+                select(
+                    func.coalesce(func.sum(Step.step), 0),
+                    func.count(),
+                    func.min(Step.created_at),
+                    func.max(Step.created_at),
+                ).where(Step.user_uuid == user_uuid, Step.on_local_date(local_date))
+            )
+        ).one()
+
+        if count == 0:
+            await db_session.execute(
+                delete(StepDailyTotal).where(
+                    StepDailyTotal.user_uuid == user_uuid, StepDailyTotal.local_date == local_date
+                )
+            )
+            return
+
+        conn = await db_session.connection()
+        stmt = dialect_insert(conn.dialect.name, StepDailyTotal.__table__).values(
+            user_uuid=user_uuid,
+            local_date=local_date,
+            total_steps=total,
+            sample_count=count,
+            first_at=first_at,
+            last_at=last_at,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[StepDailyTotal.user_uuid, StepDailyTotal.local_date],
+            set_={
+                "total_steps": stmt.excluded.total_steps,
+                "sample_count": stmt.excluded.sample_count,
+                "first_at": stmt.excluded.first_at,
+                "last_at": stmt.excluded.last_at,
+            },
+        )
+        await db_session.execute(stmt)
+
+    async def rebuild(self, db_session: AsyncSession, *, user_uuid: Optional[str] = None) -> int:
+        """
+        集計テーブルを step テーブルから作り直す（既存データのバックフィル用）
+        return: 作成した集計行数
+        """
+        delete_stmt = delete(StepDailyTotal)
+        source = select(
+            Step.user_uuid,
+            Step.local_date,
+            func.sum(Step.step),
+            func.count(),
+            func.min(Step.created_at),
+            func.max(Step.created_at),
+        )
+        if user_uuid is not None:
+            delete_stmt = delete_stmt.where(StepDailyTotal.user_uuid == user_uuid)
+            source = source.where(Step.user_uuid == user_uuid)
+        source = source.group_by(Step.user_uuid, Step.local_date)
+
+        # step 全体の集計になるので statement_timeout を外す
+        await disable_statement_timeout(db_session)
+        await db_session.execute(delete_stmt)
+        result = await db_session.execute(
+            insert(StepDailyTotal).from_select(
+                ["user_uuid", "local_date", "total_steps", "sample_count", "first_at", "last_at"],
+                source,
+            )
+        )
+        await db_session.commit()
+        return result.rowcount
+
+    def rollup_range_statement(
+        self, dialect_name: str, *, start_at: datetime, end_at: datetime, overwrite: bool = True
+    ):
+        """
+        start_at〜end_at（end_at は含まない）の step 行から集計を作り直して上書きする文（同期の接続からも実行できる）
+        overwrite=False なら集計行がまだない日だけ作り、既存の集計には触れない
+        （保持期間の処理用。外した月の行が後から届いても、書き込み時に加算済みの集計を残っている行だけで上書きしない）
+        マイグレーション 3（local_date 列を足す 4 より前）からも使うので、日付は created_at から計算する
+        """
+        source = (
+            select(
+                Step.user_uuid,
+                jst_date(Step.created_at).label("local_date"),
+                func.sum(Step.step),
+                func.count(),
+                func.min(Step.created_at),
+                func.max(Step.created_at),
+            )
+            .where(Step.created_at >= start_at, Step.created_at < end_at)
+            .group_by(Step.user_uuid, jst_date(Step.created_at))
+        )
+        stmt = dialect_insert(dialect_name, StepDailyTotal.__table__).from_select(
+            ["user_uuid", "local_date", "total_steps", "sample_count", "first_at", "last_at"],
+            source,
+        )
+        if not overwrite:
+            return stmt.on_conflict_do_nothing(
+                index_elements=[StepDailyTotal.user_uuid, StepDailyTotal.local_date]
+            )
+        return stmt.on_conflict_do_update(
+            index_elements=[StepDailyTotal.user_uuid, StepDailyTotal.local_date],
+            set_={
+                "total_steps": stmt.excluded.total_steps,
+                "sample_count": stmt.excluded.sample_count,
+                "first_at": stmt.excluded.first_at,
+                "last_at": stmt.excluded.last_at,
+            },
+        )
+
+
+step_daily_total_crud = CRUDStepDailyTotal()
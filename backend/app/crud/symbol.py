@@ -1,69 +1,423 @@
 # app/crud/symbol.py
-from datetime import datetime, timedelta, timezone
-from sqlalchemy import update, func
-from sqlalchemy.orm import Session
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Optional, Sequence
+import uuid as uuid_lib
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import Column, Float, Integer, MetaData, Row, String, Table, delete, insert, select, true, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
 from app.models.symbol import Symbol
+from app.models.user import User
 from app.schemas.symbol import SymbolCreate, SymbolUpdate, SymbolResponse, UserSymbolsResponse
 from app.core.timezone import jst_day_to_utc_range
-from app.core.config import DECAY_HOURS
+from app.core.config import (
+    DECAY_HOURS,
+    EXPORT_BATCH_ROWS,
+    KIRAKIRA_DECAY_BATCH_SIZE,
+    SYMBOL_GRID_CELL_SIZE,
+    SYMBOL_NEAREST_MAX_RADIUS_CELLS,
+)
+from app.core.spatial import grid_cell, grid_index, planar_distance, x_scale
+from app.core.cache import cache
+from app.db.cache import snapshot, restore
+from app.db.bulk import dialect_insert
+from app.db.expressions import add_hours, decay_periods, keyset_before
+from app.db.types import GUID, canonical_uuid
+from app.db.session import disable_statement_timeout
+from app.core.bulk_import import Record
+from app.crud.bulk_import import ProgressCallback, drop_staging, stage
+from app.schemas.bulk_import import ImportResponse
+
+def symbol_list_namespace(user_uuid: str) -> str:
+    # user_cache_key と同じく、正規化した uuid でそろえる（パスの表記ゆれで別のキャッシュにならない）
+    return f"symbols:{canonical_uuid(user_uuid)}"
+
+
+# エクスポートで出す列（この順で書き出す）。kirakira_level は API と同じく読み出し時点の実効値
+EXPORT_COLUMNS = (
+    "uuid",
+    "user_uuid",
+    "symbol_name",
+    "symbol_x_coord",
+    "symbol_y_coord",
+    "kirakira_level",
+    "level_set_at",
+    "created_at",
+    "updated_at",
+)
+
+# インポートのステージング（トランザクション内の一時テーブル）。ファイル内で名前が重複したときは先の行を残す
+IMPORT_STAGING = Table(
+    "symbol_import",
+    MetaData(),
+    Column("row", Integer, nullable=False),
+    Column("uuid", GUID, nullable=False),
+    Column("user_uuid", GUID, nullable=False),
+    Column("symbol_name", String(255), nullable=False),
+    Column("symbol_x_coord", Float, nullable=False),
+    Column("symbol_y_coord", Float, nullable=False),
+    Column("kirakira_level", Integer, nullable=False),
+    Column("grid_x", Integer, nullable=False),
+    Column("grid_y", Integer, nullable=False),
+    prefixes=["TEMPORARY"],
+)
+
+
+@dataclass
+class KirakiraDecayStats:
+    rows: int = 0  # 減少させたシンボル数
+    batches: int = 0  # 実行したトランザクション数
+    duration_seconds: float = 0.0
+
 
 class CRUDSymbol:
-    def decay_kirakira_levels(self, db_session: Session) -> int:
+    async def decay_kirakira_levels(
+        self, db_session: AsyncSession, *, batch_size: int = KIRAKIRA_DECAY_BATCH_SIZE
+    ) -> KirakiraDecayStats:
+        """
+        level_set_at から DECAY_HOURS 以上経過したシンボルのレベルを、経過した区切りの数だけ下げる
+        lazy モードの実効レベルと同じ計算にし、level_set_at も区切りの数 × DECAY_HOURS だけ進める
+        （ジョブが止まっていた後や lazy モードから切り替えた後でも、レスポンスのレベルが戻ったり次の減少が遅れたりしない）
+        部分インデックスから batch_size 件ずつ FOR UPDATE SKIP LOCKED で取り、1件ずつ commit する
+        （ユーザーの更新中の行は飛ばし、行ロックを長時間持たない）
+        """
+        started = time.perf_counter()
+        stats = KirakiraDecayStats()
         cutoff = datetime.now(timezone.utc) - timedelta(hours=DECAY_HOURS)
-        stmt = (
-            update(Symbol)
-            .where(Symbol.kirakira_level > 0)
-            .where(Symbol.updated_at < cutoff)
-            .values(
-                kirakira_level=Symbol.kirakira_level - 1,
-                updated_at=func.now(),
+        periods = decay_periods(Symbol.level_set_at, DECAY_HOURS)
+
+        while True:
+            target_uuids = (
+                select(Symbol.uuid)
+                .where(Symbol.kirakira_level > 0)
+                .where(Symbol.level_set_at < cutoff)
+                .order_by(Symbol.level_set_at)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            stmt = (
+                update(Symbol)
+                .where(Symbol.uuid.in_(target_uuids))
+                .values(
+                    kirakira_level=Symbol.effective_kirakira_level,
+                    level_set_at=add_hours(Symbol.level_set_at, periods * DECAY_HOURS),
+                    # 減少はユーザーによる更新ではないので updated_at（onupdate）は動かさない
+                    updated_at=Symbol.updated_at,
+                )
+                .returning(Symbol.user_uuid)
+                .execution_options(synchronize_session=False)
             )
+            user_uuids = (await db_session.execute(stmt)).scalars().all()
+            await db_session.commit()
+            await cache.invalidate_namespace(*(symbol_list_namespace(u) for u in set(user_uuids)))
+
+            stats.batches += 1
+            stats.rows += len(user_uuids)
+            if len(user_uuids) < batch_size:
+                break
+
+        stats.duration_seconds = time.perf_counter() - started
+        return stats
+
+    async def get(
+        self, db_session: AsyncSession, uuid: str, *, include_user: bool = False
+    ) -> Symbol | None:
+        stmt = select(Symbol).where(Symbol.uuid == uuid)
+        if include_user:
+            stmt = stmt.options(joinedload(Symbol.user))
+        result = await db_session.execute(stmt)
+        return result.scalars().first()
+
+    async def get_multi(
+        self,
+        db_session: AsyncSession,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        before: tuple[datetime, str] | None = None,
+        include_user: bool = False,
+    ) -> list[Symbol]:
+        stmt = select(Symbol).order_by(Symbol.created_at.desc(), Symbol.uuid.desc())
+        if include_user:
+            stmt = stmt.options(selectinload(Symbol.user))
+        if before is not None:
+            stmt = stmt.where(keyset_before(Symbol.created_at, Symbol.uuid, before))
+        else:
+            stmt = stmt.offset(skip)
+        result = await db_session.execute(stmt.limit(limit))
+        return list(result.scalars().all())
+
+    async def stream_by_user(
+        self, db_session: AsyncSession, *, user_uuid: str, batch_size: int = EXPORT_BATCH_ROWS
+    ) -> AsyncIterator[Sequence[Row]]:
+        """
+        ユーザーの全シンボルを created_at の古い順に batch_size 行ずつ返す（エクスポート用、キャッシュは通さない）
+        サーバー側カーソル（yield_per）で読むので全件をメモリに載せない
+        """
+        columns = [
+            Symbol.effective_kirakira_level.label(name) if name == "kirakira_level" else getattr(Symbol, name)
+            for name in EXPORT_COLUMNS
+        ]
+        stmt = (
+            select(*columns)
+            .where(Symbol.user_uuid == user_uuid)
+            .order_by(Symbol.created_at, Symbol.uuid)
+            .execution_options(yield_per=batch_size)
         )
-        result = db_session.execute(stmt)
-        db_session.commit()
-        return result.rowcount
-
-    def get(self, db_session: Session, uuid: str) -> Symbol | None:
-        return db_session.query(Symbol).filter(Symbol.uuid == uuid).first()
-    
-    def get_multi(self, db_session: Session, *, skip: int = 0, limit: int = 100) -> list[Symbol]:
-        return db_session.query(Symbol).offset(skip).limit(limit).all()
-
-    def get_multi_by_user(
-        self, db_session: Session, *, user_uuid: str, skip: int = 0, limit: int = 100
+        result = await db_session.stream(stmt)
+        try:
+            async for rows in result.partitions():
+                yield rows
+        finally:
+            await result.close()
+
+    async def get_multi_by_user(
+        self,
+        db_session: AsyncSession,
+        *,
+        user_uuid: str,
+        skip: int = 0,
+        limit: int = 100,
+        before: tuple[datetime, str] | None = None,
+        local_date: date | None = None,
+        include_user: bool = False,
     ) -> list[Symbol]:
-        return (
-            db_session.query(Symbol)
-            .filter(Symbol.user_uuid == user_uuid)
-            .order_by(Symbol.created_at.desc())
-            .offset(skip)
-            .limit(limit)
-            .all()
+        namespace = await cache.namespace(symbol_list_namespace(user_uuid))
+        key = f"{symbol_list_namespace(user_uuid)}:{namespace}:{before}:{skip}:{limit}:{local_date}:{include_user}"
+        cached = await cache.get(key)
+        if cached is not None:
+            return await self._restore_list(db_session, cached)
+
+        stmt = (
+            select(Symbol)
+            .where(Symbol.user_uuid == user_uuid)
+            .order_by(Symbol.created_at.desc(), Symbol.uuid.desc())
         )
+        if local_date is not None:
+            # JST のその日に作ったシンボルだけ（ix_symbol_user_local_date の等値）
+            stmt = stmt.where(Symbol.local_date == local_date)
+        if include_user:
+            stmt = stmt.options(selectinload(Symbol.user))
+        if before is not None:
+            stmt = stmt.where(keyset_before(Symbol.created_at, Symbol.uuid, before))
+        else:
+            stmt = stmt.offset(skip)
+        result = await db_session.execute(stmt.limit(limit))
+        symbols = list(result.scalars().all())
 
-    def create(self, db_session: Session, *, obj_in: SymbolCreate) -> Symbol:
-        db_obj = Symbol(
-            user_uuid=obj_in.user_uuid,
-            symbol_name=obj_in.symbol_name,
-            symbol_x_coord=obj_in.symbol_x_coord,
-            symbol_y_coord=obj_in.symbol_y_coord,
-            kirakira_level=obj_in.kirakira_level,
+        await cache.set(
+            key,
+            {
+                "symbols": [snapshot(symbol) for symbol in symbols],
+                "user": snapshot(symbols[0].user) if include_user and symbols and symbols[0].user else None,
+            },
         )
-        db_session.add(db_obj)
-        db_session.commit()
-        db_session.refresh(db_obj)
+        return symbols
+
+    async def _restore_list(self, db_session: AsyncSession, cached: dict) -> list[Symbol]:
+        # include=user で読み込んだ一覧は、キャッシュしたユーザーを読み込み済みとして付ける
+        user = await restore(db_session, User, cached["user"]) if cached["user"] else None
+        symbols = []
+        for data in cached["symbols"]:
+            symbol = await restore(db_session, Symbol, data)
+            if user is not None:
+                set_committed_value(symbol, "user", user)
+            symbols.append(symbol)
+        return symbols
+
+    async def get_in_box(
+        self,
+        db_session: AsyncSession,
+        *,
+        min_x: float,
+        min_y: float,
+        max_x: float,
+        max_y: float,
+        limit: int = 1000,
+        include_user: bool = False,
+    ) -> list[Symbol]:
+        """
+        矩形（両端含む）内のシンボルを新しい順に取得する
+        (grid_x, grid_y) インデックスでセル範囲に絞ってから正確な座標で判定する（limit 件を超える分は返さない）
+        """
+        min_gx, min_gy = grid_cell(min_x, min_y)
+        max_gx, max_gy = grid_cell(max_x, max_y)
+        stmt = select(Symbol).where(
+            Symbol.grid_x.between(min_gx, max_gx),
+            Symbol.grid_y.between(min_gy, max_gy),
+            Symbol.symbol_x_coord.between(min_x, max_x),
+            Symbol.symbol_y_coord.between(min_y, max_y),
+        )
+        if include_user:
+            stmt = stmt.options(selectinload(Symbol.user))
+        # limit で切るときにどの行が返るかを決めるため、一覧と同じ (created_at, uuid) の降順に並べる
+        stmt = stmt.order_by(Symbol.created_at.desc(), Symbol.uuid.desc()).limit(limit)
+        result = await db_session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def get_nearest(
+        self,
+        db_session: AsyncSession,
+        *,
+        x: float,
+        y: float,
+        k: int = 10,
+        include_user: bool = False,
+    ) -> list[Symbol]:
+        """
+        (x, y) に近い順に k 件を取得する
+        中心セルから半径 1, 2, 4, ... セルの正方形を引き、正方形に内接する円の中に k 件そろった時点で打ち切る
+        （円の外は未探索のセルより遠いとは限らないので数えない）
+        距離順の並べ替えと k 件への絞り込みは SQL で行うので、正方形が広がっても読み込むのは毎回 k 件まで
+        """
+        gx, gy = grid_cell(x, y)
+        scale = x_scale(y)
+        # planar_distance の2乗（平方根は並べ替えに不要で、SQLite にはないので取らない）
+        dx = (Symbol.symbol_x_coord - x) * scale
+        dy = Symbol.symbol_y_coord - y
+        radius = 1
+        while True:
+            stmt = (
+                select(Symbol)
+                .where(
+                    Symbol.grid_x.between(gx - radius, gx + radius),
+                    Symbol.grid_y.between(gy - radius, gy + radius),
+                )
+                .order_by(dx * dx + dy * dy, Symbol.uuid)
+                .limit(k)
+            )
+            if include_user:
+                stmt = stmt.options(selectinload(Symbol.user))
+            symbols = list((await db_session.execute(stmt)).scalars().all())
+
+            # 探索済みの正方形の中心から辺までの最短距離（経度方向は cos(緯度) で縮む）
+            covered = radius * SYMBOL_GRID_CELL_SIZE * min(1.0, scale)
+            settled = (
+                len(symbols) >= k
+                and planar_distance(x, y, symbols[-1].symbol_x_coord, symbols[-1].symbol_y_coord) <= covered
+            )
+            if settled or radius >= SYMBOL_NEAREST_MAX_RADIUS_CELLS:
+                return symbols
+            radius *= 2
+
+    async def create(self, db_session: AsyncSession, *, obj_in: SymbolCreate) -> Symbol:
+        # INSERT ... RETURNING の1文で作成後の行を受け取る（refresh の SELECT をしない）
+        db_obj = await db_session.scalar(
+            insert(Symbol)
+            .values(
+                user_uuid=obj_in.user_uuid,
+                symbol_name=obj_in.symbol_name,
+                symbol_x_coord=obj_in.symbol_x_coord,
+                symbol_y_coord=obj_in.symbol_y_coord,
+                kirakira_level=obj_in.kirakira_level,
+                grid_x=grid_index(obj_in.symbol_x_coord),
+                grid_y=grid_index(obj_in.symbol_y_coord),
+            )
+            .returning(Symbol)
+        )
+        await db_session.commit()
+        await cache.invalidate_namespace(symbol_list_namespace(db_obj.user_uuid))
         return db_obj
 
-    def update(
-        self, db_session: Session, *, db_obj: Symbol, obj_in: SymbolUpdate
-    ) -> Symbol:
+    async def import_rows(
+        self,
+        db_session: AsyncSession,
+        *,
+        user_uuid: str,
+        batches: AsyncIterator[list[Record]],
+        progress: Optional[ProgressCallback] = None,
+    ) -> ImportResponse:
+        """
+        batches（app.core.bulk_import.iter_batches）の各行を SymbolCreate で検証し、user_uuid のシンボルとして登録する
+        通った行はステージングへ COPY し、最後に1文で symbol へマージする（同じ名前のシンボルがあれば登録しない）
+        """
+
+        def convert(row: int, values: dict[str, Any]) -> dict[str, Any]:
+            # ファイルの user_uuid 列（エクスポート元のユーザー）は使わず、登録先のユーザーに揃える
+            obj_in = SymbolCreate.model_validate({**values, "user_uuid": user_uuid})
+            return {
+                "row": row,
+                "uuid": str(uuid_lib.uuid4()),
+                "user_uuid": user_uuid,
+                "symbol_name": obj_in.symbol_name,
+                "symbol_x_coord": obj_in.symbol_x_coord,
+                "symbol_y_coord": obj_in.symbol_y_coord,
+                "kirakira_level": obj_in.kirakira_level,
+                "grid_x": grid_index(obj_in.symbol_x_coord),
+                "grid_y": grid_index(obj_in.symbol_y_coord),
+            }
+
+        staging = IMPORT_STAGING
+        result = ImportResponse()
+        # 行数に比例して時間がかかるので statement_timeout を外す
+        await disable_statement_timeout(db_session)
+        await stage(db_session, batches, staging=staging, convert=convert, result=result, progress=progress)
+
+        columns = [c.name for c in staging.columns if c.name != "row"]
+        conn = await db_session.connection()
+        stmt = dialect_insert(conn.dialect.name, Symbol.__table__).from_select(
+            columns,
+            # SQLite の INSERT ... SELECT ... ON CONFLICT は WHERE がないと構文が曖昧になる
+            select(*(staging.c[name] for name in columns)).where(true()).order_by(staging.c.row),
+        )
+        merged = await db_session.execute(
+            stmt.on_conflict_do_nothing(index_elements=[Symbol.user_uuid, Symbol.symbol_name])
+        )
+        result.inserted = merged.rowcount
+        result.skipped = result.total - result.rejected - result.inserted
+        await drop_staging(db_session, staging)
+        await db_session.commit()
+        await cache.invalidate_namespace(symbol_list_namespace(user_uuid))
+        return result
+
+    async def update(
+        self, db_session: AsyncSession, *, uuid: str, obj_in: SymbolUpdate
+    ) -> Symbol | None:
+        """
+        UPDATE ... WHERE uuid = ... RETURNING の1文で更新する
+        return: 更新後の行（存在しなければ None）
+        """
         update_data = obj_in.model_dump(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(db_obj, field, value)
-        db_session.add(db_obj)
-        db_session.commit()
-        db_session.refresh(db_obj)
+        if not update_data:
+            return await self.get(db_session, uuid)
+        if "kirakira_level" in update_data:
+            update_data["level_set_at"] = func.now()
+        # 座標が変わったらグリッドセルも合わせる（x と y は独立に決まる）
+        if update_data.get("symbol_x_coord") is not None:
+            update_data["grid_x"] = grid_index(update_data["symbol_x_coord"])
+        if update_data.get("symbol_y_coord") is not None:
+            update_data["grid_y"] = grid_index(update_data["symbol_y_coord"])
+
+        db_obj = await db_session.scalar(
+            update(Symbol)
+            .where(Symbol.uuid == uuid)
+            .values(**update_data)
+            .returning(Symbol)
+            .execution_options(synchronize_session=False)
+        )
+        await db_session.commit()
+        if db_obj is not None:
+            await cache.invalidate_namespace(symbol_list_namespace(db_obj.user_uuid))
+        return db_obj
+
+    async def remove(self, db_session: AsyncSession, *, uuid: str) -> Symbol | None:
+        """
+        DELETE ... RETURNING の1文で削除する
+        return: 削除した行（存在しなければ None）
+        """
+        db_obj = await db_session.scalar(
+            delete(Symbol)
+            .where(Symbol.uuid == uuid)
+            .returning(Symbol)
+            .execution_options(synchronize_session=False)
+        )
+        await db_session.commit()
+        if db_obj is not None:
+            await cache.invalidate_namespace(symbol_list_namespace(db_obj.user_uuid))
         return db_obj
 
-symbol_crud = CRUDSymbol()
\ No newline at end of file
+symbol_crud = CRUDSymbol()
@@ -1,54 +1,101 @@
 # app/crud/user.py
 from typing import List, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
+from app.core.cache import cache
+from app.db.cache import snapshot, restore
+from app.db.types import canonical_uuid
+from app.crud.symbol import symbol_list_namespace
+
+
+def user_cache_key(uuid: str) -> str:
+    # GUID は大文字・ハイフンなしでも同じ行に一致するので、キーは正規化した形にそろえる
+    return f"user:{canonical_uuid(uuid)}"
 
 
 class CRUDUser:
-    def get(self, db_session: Session, uuid: str) -> Optional[User]:
-        return db_session.query(User).filter(User.uuid == uuid).first()
+    async def get(self, db_session: AsyncSession, uuid: str) -> Optional[User]:
+        cached = await cache.get(user_cache_key(uuid))
+        if cached is not None:
+            return await restore(db_session, User, cached)
+
+        result = await db_session.execute(select(User).where(User.uuid == uuid))
+        user = result.scalars().first()
+        if user is not None:
+            await cache.set(user_cache_key(uuid), snapshot(user))
+        return user
+
+    async def invalidate(self, uuid: str) -> None:
+        # シンボル一覧のレスポンスにもユーザー情報が入っているので一緒に捨てる
+        await cache.delete(user_cache_key(uuid))
+        await cache.invalidate_namespace(symbol_list_namespace(uuid))
 
-    def get_multi(
-        self, db_session: Session, *, skip: int = 0, limit: int = 100
+    async def get_multi(
+        self,
+        db_session: AsyncSession,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        after: Optional[str] = None,
     ) -> List[User]:
-        return db_session.query(User).offset(skip).limit(limit).all()
+        """
+        uuid 順。after（直前ページ最後の uuid）があれば主キーをその位置から辿り、skip より優先する
+        """
+        stmt = select(User).order_by(User.uuid)
+        if after is not None:
+            stmt = stmt.where(User.uuid > after)
+        else:
+            stmt = stmt.offset(skip)
+        result = await db_session.execute(stmt.limit(limit))
+        return list(result.scalars().all())
 
-    def create(self, db_session: Session, *, obj_in: UserCreate) -> User:
-        db_obj = User(
-            name=obj_in.name,
-            length=obj_in.length,
-            weight=obj_in.weight,
+    async def create(self, db_session: AsyncSession, *, obj_in: UserCreate) -> User:
+        # INSERT ... RETURNING の1文で作成後の行を受け取る（refresh の SELECT をしない）
+        db_obj = await db_session.scalar(
+            insert(User)
+            .values(
+                name=obj_in.name,
+                length=obj_in.length,
+                weight=obj_in.weight,
+            )
+            .returning(User)
         )
-        db_session.add(db_obj)
-        db_session.commit()
-        db_session.refresh(db_obj)
+        await db_session.commit()
         return db_obj
 
-    def update(
-        self, db_session: Session, *, db_obj: User, obj_in: UserUpdate
-    ) -> User:
+    async def update(
+        self, db_session: AsyncSession, *, uuid: str, obj_in: UserUpdate
+    ) -> Optional[User]:
+        """
+        UPDATE ... WHERE uuid = ... RETURNING の1文で更新する
+        return: 更新後の行（存在しなければ None）
+        """
         # Pydantic v2: model_dump(exclude_unset=True)
         update_data = obj_in.model_dump(exclude_unset=True)
+        if not update_data:
+            return await self.get(db_session, uuid)
 
-        for field, value in update_data.items():
-            setattr(db_obj, field, value)
-
-        db_session.add(db_obj)
-        db_session.commit()
-        db_session.refresh(db_obj)
+        db_obj = await db_session.scalar(
+            update(User).where(User.uuid == uuid).values(**update_data).returning(User)
+        )
+        await db_session.commit()
+        if db_obj is not None:
+            await self.invalidate(db_obj.uuid)
         return db_obj
 
-    def remove(self, db_session: Session, *, uuid: str) -> User:
-        obj = db_session.query(User).filter(User.uuid == uuid).first()
-        if obj is None:
-            # 最低限実装なのでここは例外にしておく（必要ならHTTPExceptionに変更）
-            raise ValueError(f"User not found: uuid={uuid}")
-
-        db_session.delete(obj)
-        db_session.commit()
-        return obj
+    async def remove(self, db_session: AsyncSession, *, uuid: str) -> Optional[User]:
+        """
+        DELETE ... RETURNING の1文で削除する（step / symbol は FK の ON DELETE CASCADE で消える）
+        return: 削除した行（存在しなければ None）
+        """
+        db_obj = await db_session.scalar(delete(User).where(User.uuid == uuid).returning(User))
+        await db_session.commit()
+        if db_obj is not None:
+            await self.invalidate(db_obj.uuid)
+        return db_obj
 
 
 user_crud = CRUDUser()
@@ -0,0 +1,38 @@
+# app/db/bulk.py
+from typing import Any, Sequence
+
+from sqlalchemy import Table, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def dialect_insert(dialect_name: str, table):
+    """ON CONFLICT が使える方言ごとの insert() を返す"""
+    if dialect_name == "postgresql":
+        return postgresql.insert(table)
+    if dialect_name == "sqlite":
+        return sqlite.insert(table)
+    raise NotImplementedError(f"upsert is not supported on {dialect_name}")
+
+
+async def bulk_insert(db_session: AsyncSession, table: Table, rows: Sequence[dict[str, Any]]) -> None:
+    """
+    rows をセッションのトランザクション内で一括 INSERT する（commit はしない）
+    PostgreSQL(asyncpg) では COPY、それ以外は executemany の複数行 INSERT
+    """
+    if not rows:
+        return
+
+    conn = await db_session.connection()
+    if conn.dialect.name == "postgresql" and conn.dialect.driver == "asyncpg":
+        columns = list(rows[0].keys())
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            table.name,
+            records=[tuple(row[c] for c in columns) for row in rows],
+            columns=columns,
+            schema_name=table.schema,
+        )
+        return
+
+    await db_session.execute(insert(table), list(rows))
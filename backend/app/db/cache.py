@@ -0,0 +1,23 @@
+# app/db/cache.py
+from typing import Any, TypeVar
+
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+ModelType = TypeVar("ModelType")
+
+
+def snapshot(obj: Any) -> dict[str, Any]:
+    """ORM オブジェクトの列の値だけを取り出す（キャッシュに入れる形）"""
+    return {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+
+
+async def restore(db_session: AsyncSession, model: type[ModelType], data: dict[str, Any]) -> ModelType:
+    """
+    snapshot からセッションに永続状態のオブジェクトとして戻す（SQL は発行しない）
+    戻したオブジェクトはそのまま更新・削除にも使える
+    """
+    obj = model(**data)
+    make_transient_to_detached(obj)
+    return await db_session.merge(obj, load=False)
@@ -0,0 +1,73 @@
+# app/db/expressions.py
+from sqlalchemy import Date, DateTime, Integer, literal_column, tuple_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+class jst_date(FunctionElement):
+    """timestamptz 列を Asia/Tokyo の日付に変換する SQL 式"""
+
+    type = Date()
+    inherit_cache = True
+
+
+@compiles(jst_date)
+def _jst_date_default(element, compiler, **kw):
+    return "CAST(timezone('Asia/Tokyo', %s) AS DATE)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(jst_date, "sqlite")
+def _jst_date_sqlite(element, compiler, **kw):
+    # SQLite は UTC の文字列で保存される。JST は夏時間がないので固定オフセットで良い
+    return "date(%s, '+9 hours')" % compiler.process(element.clauses, **kw)
+
+
+class decay_periods(FunctionElement):
+    """timestamptz 列から現在までに経過した hours 時間の区切り数（切り捨て）"""
+
+    type = Integer()
+    inherit_cache = True
+
+    def __init__(self, column, hours: int):
+        super().__init__(column, literal_column(str(int(hours))))
+
+
+@compiles(decay_periods)
+def _decay_periods_default(element, compiler, **kw):
+    column, hours = (compiler.process(c, **kw) for c in element.clauses)
+    return "CAST(floor(extract(epoch FROM (now() - %s)) / (%s * 3600)) AS INTEGER)" % (column, hours)
+
+
+@compiles(decay_periods, "sqlite")
+def _decay_periods_sqlite(element, compiler, **kw):
+    # 経過時間は正なので CAST の切り捨てで floor と同じになる
+    column, hours = (compiler.process(c, **kw) for c in element.clauses)
+    return "CAST((julianday('now') - julianday(%s)) * 24 / %s AS INTEGER)" % (column, hours)
+
+
+class add_hours(FunctionElement):
+    """timestamptz 列に hours 時間（整数の SQL 式）を足す SQL 式"""
+
+    type = DateTime(timezone=True)
+    inherit_cache = True
+
+
+@compiles(add_hours)
+def _add_hours_default(element, compiler, **kw):
+    column, hours = (compiler.process(c, **kw) for c in element.clauses)
+    return "(%s + make_interval(hours => %s))" % (column, hours)
+
+
+@compiles(add_hours, "sqlite")
+def _add_hours_sqlite(element, compiler, **kw):
+    # SQLAlchemy が保存するのと同じ書式（秒の小数部つき）の文字列で返す
+    column, hours = (compiler.process(c, **kw) for c in element.clauses)
+    return "strftime('%%Y-%%m-%%d %%H:%%M:%%f', %s, (%s) || ' hours')" % (column, hours)
+
+
+def keyset_before(created_at, uuid, before):
+    """
+    (created_at, uuid) が before（キーセットの位置）より前の行の条件
+    右辺の値にも列の型を付ける（uuid 列と文字列をそのまま比べると PostgreSQL では型が合わない）
+    """
+    return tuple_(created_at, uuid) < tuple_(*before, types=(created_at.type, uuid.type))
@@ -0,0 +1,19 @@
+# app/db/init_db.py
+from app.core.config import DB_STARTUP_MODE
+from app.db import migrations
+from app.db.session import get_engine
+
+
+async def init_db(mode: str = DB_STARTUP_MODE) -> None:
+    """
+    起動時のスキーマの扱い（DB_STARTUP_MODE）
+      check  : バージョンを確かめるだけ。古ければ起動しない
+      migrate: HEAD まで上げる（単一プロセスの開発環境向け）
+      skip   : 何もしない
+    """
+    if mode == "migrate":
+        await migrations.upgrade(get_engine())
+    elif mode == "check":
+        await migrations.check(get_engine())
+    elif mode != "skip":
+        raise ValueError(f"Unknown DB_STARTUP_MODE: {mode}")
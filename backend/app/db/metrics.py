@@ -0,0 +1,44 @@
+# app/db/metrics.py
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.metrics import record_pool_wait, record_statement
+
+QUERY_START_KEY = "metrics_query_start"
+
+
+def instrument_engine(engine: Engine) -> None:
+    """SQL 文ごとの実行時間と件数を app.core.metrics に記録する（AsyncEngine は .sync_engine を渡す）"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault(QUERY_START_KEY, []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        record_statement(time.perf_counter() - conn.info[QUERY_START_KEY].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        # 失敗した文も時間は計上する（after_cursor_execute は呼ばれない）
+        conn = exception_context.connection
+        starts = conn.info.get(QUERY_START_KEY) if conn is not None else None
+        if starts:
+            record_statement(time.perf_counter() - starts.pop())
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """接続の貸し出しを待った時間とタイムアウトの回数を app.core.metrics に記録する"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            record_pool_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        record_pool_wait(time.perf_counter() - started, timed_out=False)
+        return conn
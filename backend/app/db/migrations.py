@@ -0,0 +1,417 @@
+# app/db/migrations.py
+# スキーマのバージョン管理。python -m app.cli migrate で最新（HEAD）まで上げる
+#   新しい DB        : 現在のモデルから create_all して HEAD を記録する
+#   バージョン管理前の DB: 足りないテーブルだけ作って 1 を記録し、2 以降を順に当てる
+#   管理下の DB      : 記録されたバージョンより新しいマイグレーションを順に当てる
+import logging
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, delete, func, inspect, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import AddConstraint, CreateColumn, CreateTable
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.core.config import STEP_PARTITION_PREMAKE_MONTHS, SYMBOL_GRID_CELL_SIZE
+from app.core.timezone import jst_day_to_utc_range, to_jst_date
+from app.crud.step_daily_total import step_daily_total_crud
+from app.db import partitions
+from app.db.base_class import Base
+from app.db.session import disable_statement_timeout
+from app.db.types import GUID
+import app.models  # noqa: F401  全モデルを Base.metadata に登録する
+from app.models.step import Step
+from app.models.symbol import Symbol
+
+logger = logging.getLogger(__name__)
+
+# アプリのテーブルとは別の MetaData にして create_all の対象に含めない
+schema_version_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    schema_version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(255), nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+)
+
+# 複数ワーカー・複数コンテナが同時に migrate しても DDL が競合しないように取る advisory lock のキー
+MIGRATION_LOCK_KEY = 0x706F7765  # "powe"
+
+# step の自然キー (user_uuid, created_at, is_started) の一意インデックス（app.models.step）
+NATURAL_KEY_INDEX = "uq_step_user_created_at_started"
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+def _initial_schema(conn: Connection) -> None:
+    """
+    足りないテーブルだけ現在のモデルで作る
+    既存の user.uuid はまだ文字列なので、外部キーは付けずに作り 8 で付ける（SQLite は 8 で全テーブルを作り直す）
+    """
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if inspector.has_table(table.name):
+            continue
+        conn.execute(CreateTable(table, include_foreign_key_constraints=[]))
+        for index in table.indexes:
+            index.create(conn)
+
+
+def _create_schema(conn: Connection) -> None:
+    """新しい DB を現在のモデルから作る（パーティション表には行の入れ先が必要なので、パーティションも作る）"""
+    Base.metadata.create_all(conn)
+    partitions.ensure_partitions(conn, ahead=STEP_PARTITION_PREMAKE_MONTHS)
+
+
+def _partition_step(conn: Connection) -> None:
+    """
+    step を created_at の月別レンジパーティション表に作り替える（PostgreSQL のみ）
+    旧テーブルを改名 → 新しい親と既存データの月のパーティションを作る → 行を移す → 旧テーブルを消す
+    """
+    if conn.dialect.name != "postgresql" or partitions.is_partitioned(conn):
+        return
+    legacy = "step_unpartitioned"
+    conn.execute(text(f"ALTER TABLE step RENAME TO {legacy}"))
+    # インデックス名・制約名が新しい親と衝突しないよう旧テーブル側を先に消す
+    inspector = inspect(conn)
+    for index in inspector.get_indexes(legacy):
+        conn.execute(text(f'DROP INDEX "{index["name"]}"'))
+    for fk in inspector.get_foreign_keys(legacy):
+        conn.execute(text(f'ALTER TABLE {legacy} DROP CONSTRAINT "{fk["name"]}"'))
+    pk_name = inspector.get_pk_constraint(legacy)["name"]
+    conn.execute(text(f'ALTER TABLE {legacy} DROP CONSTRAINT "{pk_name}"'))
+
+    # 外部キーは 8 で付ける（user.uuid の型をそろえてから）。自然キーの一意インデックスは重複を消してから 3 で作る
+    conn.execute(CreateTable(Step.__table__, include_foreign_key_constraints=[]))
+    for index in Step.__table__.indexes:
+        if index.name != NATURAL_KEY_INDEX:
+            index.create(conn)
+    oldest = conn.execute(text(f"SELECT min(created_at) FROM {legacy}")).scalar()
+    partitions.ensure_partitions(
+        conn,
+        ahead=STEP_PARTITION_PREMAKE_MONTHS,
+        from_month=partitions.month_start(oldest.astimezone(partitions.JST).date()) if oldest else None,
+    )
+    # 生成列（local_date）は値を入れられないので除く。旧テーブルの列はモデルの型にキャストして入れる
+    columns = [c for c in Step.__table__.columns if c.computed is None]
+    names = ", ".join(c.name for c in columns)
+    casts = ", ".join(f"CAST({c.name} AS {c.type.compile(conn.dialect)})" for c in columns)
+    conn.execute(text(f"INSERT INTO step ({names}) SELECT {casts} FROM {legacy}"))
+    conn.execute(text(f"DROP TABLE {legacy}"))
+
+
+def _unique_step_natural_key(conn: Connection) -> None:
+    """
+    step の (user_uuid, created_at, is_started) を一意にする
+    端末の再送などで重複している行は uuid が最小の1行を残して消し、消した行のある日の集計を作り直してからインデックスを作る
+    """
+    other = Step.__table__.alias("other")
+    removed = conn.execute(
+        delete(Step.__table__)
+        .where(
+            select(other.c.uuid)
+            .where(
+                other.c.user_uuid == Step.user_uuid,
+                other.c.created_at == Step.created_at,
+                other.c.is_started == Step.is_started,
+                other.c.uuid < Step.uuid,
+            )
+            .exists()
+        )
+        .returning(Step.user_uuid, Step.created_at)
+    ).all()
+    # uuid 列の型は 8 より前の DB では文字列なので、ユーザーでは絞らず日単位で作り直す
+    affected = {to_jst_date(created_at) for _, created_at in removed}
+    for local_date in sorted(affected):
+        start_at, end_at = jst_day_to_utc_range(local_date)
+        conn.execute(step_daily_total_crud.rollup_range_statement(conn.dialect.name, start_at=start_at, end_at=end_at))
+    if removed:
+        logger.info(f"removed {len(removed)} duplicate step rows ({len(affected)} days re-aggregated)")
+    next(index for index in Step.__table__.indexes if index.name == NATURAL_KEY_INDEX).create(conn)
+
+
+def _add_local_date(conn: Connection) -> None:
+    """
+    step / symbol に created_at の JST の日付を入れる生成列 local_date と (user_uuid, local_date) インデックスを足す
+    既存の行は追加時に DB が計算する。2 で step を作り直した DB にはすでにあるので、ないものだけ足す
+    SQLite は既存テーブルに STORED の生成列を足せないので VIRTUAL で足す（インデックスは張れる）
+    """
+    inspector = inspect(conn)
+    for table in (Step.__table__, Symbol.__table__):
+        column = table.c.local_date
+        if column.name not in {c["name"] for c in inspector.get_columns(table.name)}:
+            ddl = str(CreateColumn(column).compile(dialect=conn.dialect))
+            if conn.dialect.name == "sqlite":
+                ddl = ddl.replace(" STORED", " VIRTUAL")
+            conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN {ddl}'))
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if column in index.columns.values() and index.name not in existing:
+                index.create(conn)
+    if conn.dialect.name == "postgresql":
+        # 新しい列の統計がないとプランナーが (user_uuid, local_date) インデックスを選ばない
+        conn.execute(text('ANALYZE step, symbol'))
+
+
+def _add_column(conn: Connection, column: Column, backfill: str, params: Optional[dict] = None) -> None:
+    """
+    column がなければ NULL 可で足し、既存の行を backfill（SQL の式）で埋めてから NOT NULL と既定値を付ける
+    SQLite は足した列の制約を変えられないので NULL 可のまま残る（8 でテーブルを作り直すときにモデルどおりになる）
+    """
+    table = column.table
+    if column.name in {c["name"] for c in inspect(conn).get_columns(table.name)}:
+        return
+    conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column.type.compile(conn.dialect)}'))
+    # ORM / Core の update() だと updated_at の onupdate が動くので、SQL で直接埋める
+    conn.execute(text(f'UPDATE "{table.name}" SET "{column.name}" = {backfill}'), params or {})
+    if conn.dialect.name == "postgresql":
+        changes = [f'ALTER COLUMN "{column.name}" SET NOT NULL']
+        if column.server_default is not None:
+            default = column.server_default.arg.compile(dialect=conn.dialect)
+            changes.append(f'ALTER COLUMN "{column.name}" SET DEFAULT {default}')
+        conn.execute(text(f'ALTER TABLE "{table.name}" {", ".join(changes)}'))
+
+
+def _create_indexes(conn: Connection, table: Table, *names: str) -> None:
+    """table のインデックスのうち names でまだないものを作る"""
+    existing = {index["name"] for index in inspect(conn).get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name in names and index.name not in existing:
+            index.create(conn)
+
+
+# 5〜7 はバージョン管理（1）より前に create_all で足していた symbol の列とインデックス
+# それより古いコードの create_all で作られた DB にはないので、ないものだけ足す
+def _symbol_level_set_at(conn: Connection) -> None:
+    """キラキラレベルの減少の起点 level_set_at と減少ジョブ用の部分インデックス。既存の行は updated_at を起点にする"""
+    _add_column(conn, Symbol.__table__.c.level_set_at, "updated_at")
+    _create_indexes(conn, Symbol.__table__, "ix_symbol_decay_level_set_at")
+
+
+def _symbol_keyset_index(conn: Connection) -> None:
+    """ユーザーごとのシンボル一覧をキーセットで辿る (user_uuid, created_at) インデックス"""
+    _create_indexes(conn, Symbol.__table__, "ix_symbol_user_created_at")
+
+
+def _symbol_grid(conn: Connection) -> None:
+    """座標のグリッドセル grid_x / grid_y（app.core.spatial.grid_index と同じ floor(座標 / セル幅)）とそのインデックス"""
+    table = Symbol.__table__
+    for column, coord in ((table.c.grid_x, "symbol_x_coord"), (table.c.grid_y, "symbol_y_coord")):
+        _add_column(
+            conn,
+            column,
+            f"CAST(floor({coord} / :cell_size) AS INTEGER)",
+            {"cell_size": SYMBOL_GRID_CELL_SIZE},
+        )
+    _create_indexes(conn, table, "ix_symbol_grid")
+
+
+# uuid と user_uuid を GUID にしたときに消す、ほかのインデックスと重複していたインデックス
+#   ix_*_uuid                   : 主キーと同じ（step は主キー (uuid, created_at) の先頭列）
+#   ix_step_user_uuid / ix_symbol_user_uuid: 複合インデックスの先頭列と同じ
+#   ix_step_user_date_created_at: uq_step_user_created_at_started の先頭2列と同じ
+REDUNDANT_INDEXES = (
+    "ix_user_uuid",
+    "ix_step_uuid",
+    "ix_step_user_uuid",
+    "ix_step_user_date_created_at",
+    "ix_symbol_uuid",
+    "ix_symbol_user_uuid",
+)
+
+
+def _guid_columns(table: Table) -> list[Column]:
+    return [column for column in table.columns if isinstance(column.type, GUID)]
+
+
+def _native_uuid_postgresql(conn: Connection) -> None:
+    tables = [table for table in Base.metadata.sorted_tables if _guid_columns(table)]
+    targets = {table.name: [c.name for c in _guid_columns(table)] for table in tables}
+    # 保持期間で外したパーティション（archive_step_pYYYYMM）も step と同じ列なので一緒に変える（付け直せるように）
+    archives = conn.execute(
+        text("SELECT relname FROM pg_class WHERE relkind = 'r' AND relname LIKE :pattern"),
+        {"pattern": f"{partitions.ARCHIVE_PREFIX}{partitions.PARENT}_p%"},
+    ).scalars().all()
+    targets.update({name: targets[Step.__tablename__] for name in archives})
+
+    # 参照先と参照元の型を同時に変えられないので、user を参照する外部キーを外してから変えて付け直す
+    # （パーティションが親から受け継いだものは親と一緒に外れる）
+    fks = conn.execute(
+        text(
+            "SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid) FROM pg_constraint"
+            " WHERE contype = 'f' AND confrelid = '\"user\"'::regclass AND conparentid = 0"
+        )
+    ).all()
+    for table_name, name, _ in fks:
+        conn.execute(text(f'ALTER TABLE {table_name} DROP CONSTRAINT "{name}"'))
+    for name in REDUNDANT_INDEXES:
+        conn.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+
+    inspector = inspect(conn)
+    for table_name, names in targets.items():
+        # 2 で作り直した step はすでに uuid なので、文字列のままの列だけ変える
+        current = {c["name"]: c["type"] for c in inspector.get_columns(table_name)}
+        columns = [name for name in names if not isinstance(current[name], postgresql.UUID)]
+        if not columns:
+            continue
+        # 1つの ALTER TABLE にまとめて書き換えを1回にする（パーティション表は各パーティションに伝わる）
+        changes = ", ".join(f'ALTER COLUMN "{name}" TYPE uuid USING "{name}"::uuid' for name in columns)
+        conn.execute(text(f'ALTER TABLE "{table_name}" {changes}'))
+
+    for table in tables:
+        for fk in table.foreign_key_constraints:
+            conn.execute(AddConstraint(fk))
+    model_tables = {table.name for table in tables}
+    for table_name, name, definition in fks:
+        if table_name not in model_tables:
+            conn.execute(text(f'ALTER TABLE {table_name} ADD CONSTRAINT "{name}" {definition}'))
+    conn.execute(text("ANALYZE " + ", ".join(f'"{table.name}"' for table in tables)))
+
+
+def _native_uuid_sqlite(conn: Connection) -> None:
+    """SQLite は列の型を変えられないので、テーブルを作り直して行を移す（値の変換は GUID が行う）"""
+    tables = Base.metadata.sorted_tables
+    inspector = inspect(conn)
+    # 旧テーブルは改名して残す。インデックス名が新しいテーブルと衝突しないよう先に消す
+    for table in tables:
+        for index in inspector.get_indexes(table.name):
+            conn.execute(text(f'DROP INDEX "{index["name"]}"'))
+        conn.execute(text(f'ALTER TABLE "{table.name}" RENAME TO "{table.name}_old"'))
+    for table in tables:
+        table.create(conn)
+        columns = [column for column in table.columns if column.computed is None]
+        # 旧テーブルの uuid は文字列で読む（それ以外の列はモデルの型で読み書きする）
+        old = Table(
+            f"{table.name}_old",
+            MetaData(),
+            *(Column(c.name, String(36) if isinstance(c.type, GUID) else c.type) for c in columns),
+        )
+        for rows in conn.execute(select(old)).mappings().partitions(10000):
+            conn.execute(table.insert(), [dict(row) for row in rows])
+    for table in reversed(tables):
+        conn.execute(text(f'DROP TABLE "{table.name}_old"'))
+
+
+def _native_uuid(conn: Connection) -> None:
+    """
+    uuid / user_uuid を文字列（36文字）から16バイトの UUID にする
+    PostgreSQL はネイティブの uuid に型を変え、重複していたインデックスを消す。SQLite はバイナリの列で作り直す
+    UUID として読めない値があると失敗する（そのときは何も変わらない）
+    """
+    if conn.dialect.name == "postgresql":
+        _native_uuid_postgresql(conn)
+    elif conn.dialect.name == "sqlite":
+        _native_uuid_sqlite(conn)
+
+
+def _backfill_step_daily_total(conn: Connection) -> None:
+    """
+    step_daily_total を step の全期間から作り直す
+    バージョン管理前の DB では 1 が空の集計テーブルを作るだけなので、これまでの日の合計が 0 に見える
+    （保持期間で外した月は step に行がないので、その日の集計は残る）
+    user_uuid の型が step と集計でそろう 8 より後に当てる
+    """
+    oldest, newest = conn.execute(select(func.min(Step.created_at), func.max(Step.created_at))).one()
+    if oldest is None:
+        return
+    conn.execute(
+        step_daily_total_crud.rollup_range_statement(
+            conn.dialect.name, start_at=oldest, end_at=newest + timedelta(microseconds=1)
+        )
+    )
+
+
+# 追加するときは version を1つずつ増やして末尾に足す。upgrade は1つ前のバージョンのスキーマに対して当てる
+MIGRATIONS: list[Migration] = [
+    Migration(1, "initial schema", _initial_schema),
+    Migration(2, "partition step by month", _partition_step),
+    Migration(3, "unique step natural key", _unique_step_natural_key),
+    Migration(4, "local_date on step and symbol", _add_local_date),
+    Migration(5, "symbol level_set_at", _symbol_level_set_at),
+    Migration(6, "symbol keyset index", _symbol_keyset_index),
+    Migration(7, "symbol grid cells", _symbol_grid),
+    # SQLite はモデルの全列でテーブルを作り直すので、列を足すマイグレーションより後に当てる
+    Migration(8, "native uuid keys", _native_uuid),
+    Migration(9, "backfill step daily totals", _backfill_step_daily_total),
+]
+
+HEAD = MIGRATIONS[-1].version
+
+
+def _has_table(conn: Connection, name: str) -> bool:
+    return inspect(conn).has_table(name)
+
+
+async def current_version(conn: AsyncConnection) -> Optional[int]:
+    """記録されている最新のバージョン（schema_version テーブルがなければ None）"""
+    if not await conn.run_sync(_has_table, schema_version.name):
+        return None
+    return (await conn.execute(select(func.max(schema_version.c.version)))).scalar_one_or_none()
+
+
+async def _record(conn: AsyncConnection, migration: Migration) -> None:
+    await conn.execute(
+        schema_version.insert().values(version=migration.version, description=migration.description)
+    )
+
+
+async def upgrade(engine: AsyncEngine) -> list[int]:
+    """HEAD まで上げる。当てたバージョンを返す（最新なら空）"""
+    applied: list[int] = []
+    async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            # トランザクション終了で自動的に外れる
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            await disable_statement_timeout(conn)
+        elif conn.dialect.name == "sqlite":
+            # sqlite3 ドライバは DDL の前にトランザクションを始めないので、明示的に始めて失敗時に DDL ごと戻す
+            await conn.exec_driver_sql("BEGIN")
+
+        await conn.run_sync(schema_version_metadata.create_all)
+        version = await current_version(conn)
+
+        if version is None:
+            legacy = await conn.run_sync(_has_table, "user")
+            if not legacy:
+                await conn.run_sync(_create_schema)
+                for migration in MIGRATIONS:
+                    await _record(conn, migration)
+                logger.info(f"schema created at version {HEAD}")
+                return [m.version for m in MIGRATIONS]
+            # create_all で作られていた DB は初期スキーマとみなす
+            await conn.run_sync(_initial_schema)
+            await _record(conn, MIGRATIONS[0])
+            applied.append(MIGRATIONS[0].version)
+            version = MIGRATIONS[0].version
+
+        for migration in MIGRATIONS:
+            if migration.version <= version:
+                continue
+            logger.info(f"applying migration {migration.version}: {migration.description}")
+            await conn.run_sync(migration.upgrade)
+            await _record(conn, migration)
+            applied.append(migration.version)
+    return applied
+
+
+async def check(engine: AsyncEngine) -> int:
+    """DB のスキーマが HEAD であることを確かめる（DDL は発行しない）"""
+    async with engine.connect() as conn:
+        version = await current_version(conn)
+    if version != HEAD:
+        raise SchemaVersionError(
+            f"database schema is at version {version}, expected {HEAD}; run `python -m app.cli migrate`"
+        )
+    return version
@@ -0,0 +1,241 @@
+# app/db/partitions.py
+# step テーブルの月別レンジパーティション（PostgreSQL のみ）
+#   パーティション: step_pYYYYMM（JST の月初〜翌月初）。範囲外の行は step_default に入る
+#   JST の1日は必ず1つのパーティションに収まるので、jst_day_to_utc_range の範囲検索は1パーティションに絞られる
+# DDL はマイグレーション（同期の Connection）からも使うので同期関数で書き、非同期側からは run_sync で呼ぶ
+import logging
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import STEP_PARTITION_PREMAKE_MONTHS, STEP_RETENTION_ACTION, STEP_RETENTION_MONTHS
+from app.core.timezone import JST
+from app.crud.step_daily_total import step_daily_total_crud
+from app.db.session import disable_statement_timeout
+from app.models.step import Step
+
+logger = logging.getLogger(__name__)
+
+PARENT = Step.__tablename__
+DEFAULT_PARTITION = f"{PARENT}_default"
+ARCHIVE_PREFIX = "archive_"
+_PARTITION_NAME = re.compile(rf"^{PARENT}_p(\d{{4}})(\d{{2}})$")
+
+# 複数ワーカーが同時にメンテナンスしないように取る advisory lock のキー
+MAINTENANCE_LOCK_KEY = 0x73746570  # "step"
+
+
+@dataclass
+class RetentionResult:
+    cutoff: Optional[datetime] = None  # これより前の生データを外した
+    partitions: list[str] = field(default_factory=list)
+    default_rows_deleted: int = 0
+
+
+@dataclass
+class MaintenanceResult:
+    skipped: bool = False  # パーティション表でない、または他のワーカーが実行中
+    created: list[str] = field(default_factory=list)
+    retention: RetentionResult = field(default_factory=RetentionResult)
+
+
+def month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bound(month: date) -> datetime:
+    """JST の月初（パーティションの境界）"""
+    return datetime(month.year, month.month, 1, tzinfo=JST)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_p{month:%Y%m}"
+
+
+def is_partitioned(conn: Connection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(
+        conn.execute(
+            text(
+                "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:name))"
+            ),
+            {"name": PARENT},
+        ).scalar()
+    )
+
+
+def list_partitions(conn: Connection) -> dict[date, str]:
+    """月 → パーティション名（既定パーティションは含まない）"""
+    names = conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:name)"
+        ),
+        {"name": PARENT},
+    ).scalars()
+    partitions = {}
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def ensure_default_partition(conn: Connection) -> None:
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT"))
+
+
+def create_month_partition(conn: Connection, month: date) -> str:
+    """
+    month のパーティションを作る
+    既定パーティションにその月の行が入っていると直接 PARTITION OF で作れないので、
+    単独テーブルとして作る → 既定パーティションから行を移す → ATTACH の順に行う
+    """
+    name = partition_name(month)
+    lower, upper = month_bound(month), month_bound(add_months(month, 1))
+    # 生成列（local_date）は INCLUDING GENERATED で同じ式のまま作り、値は書き込まずに計算させる
+    conn.execute(
+        text(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED)")
+    )
+    columns = ", ".join(f'"{column.name}"' for column in Step.__table__.columns if column.computed is None)
+    moved = conn.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= :lower AND created_at < :upper "
+            f"RETURNING {columns}) INSERT INTO {name} ({columns}) SELECT {columns} FROM moved"
+        ),
+        {"lower": lower, "upper": upper},
+    ).rowcount
+    conn.execute(
+        text(
+            f"ALTER TABLE {PARENT} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+    )
+    logger.info(f"created partition {name} (moved {moved} rows from {DEFAULT_PARTITION})")
+    return name
+
+
+def default_partition_months(conn: Connection) -> set[date]:
+    """既定パーティションに行が入っている月（JST）"""
+    months = conn.execute(
+        text(
+            f"SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE '{JST.key}')::date "
+            f"FROM {DEFAULT_PARTITION}"
+        )
+    ).scalars()
+    return set(months)
+
+
+def ensure_partitions(conn: Connection, *, ahead: int, from_month: Optional[date] = None) -> list[str]:
+    """
+    from_month（省略時は当月）から当月 + ahead か月までのパーティションと、
+    既定パーティションに行がある月（過去の日時での登録・インポート）のパーティションを作る
+    既定パーティションに行を残さないので、保持期間の処理で行ごとの DELETE をせずにパーティションごと外せる
+    return: 新しく作ったパーティション名
+    """
+    if not is_partitioned(conn):
+        return []
+    ensure_default_partition(conn)
+    current = month_start(datetime.now(JST).date())
+    month = month_start(from_month) if from_month is not None else current
+    last = add_months(current, ahead)
+    months = set()
+    while month <= last:
+        months.add(month)
+        month = add_months(month, 1)
+    months |= default_partition_months(conn)
+    existing = list_partitions(conn)
+    return [create_month_partition(conn, month) for month in sorted(months) if month not in existing]
+
+
+def _archive(conn: Connection, name: str) -> None:
+    """DETACH 済みのパーティションを archive_ 付きに改名する。同じ月のアーカイブがあれば行をそちらへ移す"""
+    archive = f"{ARCHIVE_PREFIX}{name}"
+    if conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": archive}).scalar():
+        # 外した後に届いた行だけが入っているので件数は少ない
+        columns = ", ".join(f'"{column.name}"' for column in Step.__table__.columns if column.computed is None)
+        conn.execute(
+            text(f"INSERT INTO {archive} ({columns}) SELECT {columns} FROM {name} ON CONFLICT DO NOTHING")
+        )
+        conn.execute(text(f"DROP TABLE {name}"))
+        return
+    conn.execute(text(f"ALTER TABLE {name} RENAME TO {archive}"))
+
+
+def apply_retention(conn: Connection, *, months: int, action: str) -> RetentionResult:
+    """
+    当月から months か月より前の生データを外す
+      1. 外す範囲で集計（step_daily_total）がない日を step から作る
+      2. 範囲内のパーティションを DETACH（archive_ 付きに改名）または DROP する（行ごとの DELETE はしない）
+      3. 既定パーティションに残っている範囲内の行だけは DELETE する（ensure_partitions の後なら通常は0件）
+    """
+    if action not in ("detach", "drop"):
+        raise ValueError(f"Unknown retention action: {action}")
+    result = RetentionResult()
+    if months <= 0 or not is_partitioned(conn):
+        return result
+
+    current = month_start(datetime.now(JST).date())
+    cutoff_month = add_months(current, -months)
+    cutoff = month_bound(cutoff_month)
+    result.cutoff = cutoff
+
+    expired = {month: name for month, name in list_partitions(conn).items() if month < cutoff_month}
+    oldest = conn.execute(select(func.min(Step.created_at)).where(Step.created_at < cutoff)).scalar()
+    if oldest is not None:
+        # 集計は書き込みのたびに加算しているので、集計行がない日だけ作る
+        # （既にある日は、先に外した月の分も含めて確定しているので、残っている行だけで上書きしない）
+        conn.execute(
+            step_daily_total_crud.rollup_range_statement(
+                conn.dialect.name, start_at=oldest, end_at=cutoff, overwrite=False
+            )
+        )
+
+    for month, name in sorted(expired.items()):
+        if action == "drop":
+            conn.execute(text(f"DROP TABLE {name}"))
+        else:
+            conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+            _archive(conn, name)
+        result.partitions.append(name)
+        logger.info(f"retention: {action} {name}")
+
+    result.default_rows_deleted = conn.execute(
+        text(f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at < :cutoff"), {"cutoff": cutoff}
+    ).rowcount
+    return result
+
+
+def try_lock_maintenance(conn: Connection) -> bool:
+    """トランザクション中だけ有効な advisory lock。取れなければ他のワーカーが実行中"""
+    return bool(conn.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY}).scalar())
+
+
+async def run_maintenance(
+    engine: AsyncEngine,
+    *,
+    ahead: int = STEP_PARTITION_PREMAKE_MONTHS,
+    retention_months: int = STEP_RETENTION_MONTHS,
+    retention_action: str = STEP_RETENTION_ACTION,
+) -> MaintenanceResult:
+    """先の月のパーティション作成と保持期間切れの処理を1トランザクションで行う（定期ジョブ・CLI から呼ぶ）"""
+    async with engine.begin() as conn:
+        if not await conn.run_sync(is_partitioned):
+            return MaintenanceResult(skipped=True)
+        if not await conn.run_sync(try_lock_maintenance):
+            return MaintenanceResult(skipped=True)
+        await disable_statement_timeout(conn)
+        created = await conn.run_sync(ensure_partitions, ahead=ahead)
+        retention = await conn.run_sync(apply_retention, months=retention_months, action=retention_action)
+    return MaintenanceResult(created=created, retention=retention)
@@ -0,0 +1,92 @@
+# app/db/routing.py
+# 読み取り専用のセッション（GET リクエスト）の SELECT をリードレプリカに振り分ける
+import asyncio
+import itertools
+import logging
+from typing import Any, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+# Session.info のキー
+READ_ONLY = "read_only"  # True のセッションだけレプリカを使う
+ROUTER = "replica_router"  # 使う ReplicaRouter（app.db.session が入れる）
+REPLICA = "replica"  # セッション内で使うレプリカ（最初の読み取りで決めて以降は変えない）
+WROTE = "wrote"  # 書き込みをしたら以降の読み取りもプライマリに寄せる（read-after-write）
+
+
+class ReplicaRouter:
+    """レプリカの engine をラウンドロビンで選ぶ。ヘルスチェックに失敗しているものは飛ばす"""
+
+    def __init__(self, engines: list[AsyncEngine]) -> None:
+        self.engines = engines
+        self.healthy = [True] * len(engines)
+        self._counter = itertools.count()
+
+    def choose(self) -> Optional[AsyncEngine]:
+        """次に使うレプリカ（健全なものがなければ None = プライマリを使う）"""
+        for _ in range(len(self.engines)):
+            index = next(self._counter) % len(self.engines)
+            if self.healthy[index]:
+                return self.engines[index]
+        return None
+
+    async def check(self, timeout: float) -> None:
+        async def ping(index: int, engine: AsyncEngine) -> None:
+            try:
+                async with asyncio.timeout(timeout):
+                    async with engine.connect() as conn:
+                        await conn.execute(text("SELECT 1"))
+                healthy = True
+            except Exception as e:
+                healthy = False
+                if self.healthy[index]:
+                    logger.warning(f"replica {index} is unhealthy: {e!r}")
+            if healthy and not self.healthy[index]:
+                logger.info(f"replica {index} is healthy again")
+            self.healthy[index] = healthy
+            metrics.db_replica_healthy.set(1 if healthy else 0, str(index))
+
+        await asyncio.gather(*(ping(i, engine) for i, engine in enumerate(self.engines)))
+
+    async def run_health_checks(self, interval: float, timeout: float) -> None:
+        """interval 秒ごとに全レプリカへ SELECT 1 を投げる（lifespan でタスクとして回す）"""
+        while True:
+            await asyncio.sleep(interval)
+            await self.check(timeout)
+
+    async def dispose(self) -> None:
+        await asyncio.gather(*(engine.dispose() for engine in self.engines))
+
+
+def _is_replica_safe(clause: Any) -> bool:
+    """レプリカで実行してよい文か（FOR UPDATE なしの SELECT だけ。text() や DML はプライマリ）"""
+    if clause is None or not getattr(clause, "is_select", False):
+        return False
+    return getattr(clause, "_for_update_arg", None) is None
+
+
+class RoutingSession(Session):
+    """
+    info[READ_ONLY] が True のセッションでは SELECT を info[ROUTER] のレプリカに流す
+    flush・DML・FOR UPDATE・text() はプライマリ（bind）で、一度書いたらそのセッションの読み取りもプライマリに固定する
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw) -> Engine:
+        router: Optional[ReplicaRouter] = self.info.get(ROUTER)
+        if self.info.get(READ_ONLY) and router is not None and not self.info.get(WROTE):
+            if not self._flushing and _is_replica_safe(clause):
+                replica = self.info.get(REPLICA)
+                if replica is None:
+                    replica = self.info[REPLICA] = router.choose()
+                if replica is not None:
+                    return replica.sync_engine
+            else:
+                self.info[WROTE] = True
+        return super().get_bind(mapper, clause=clause, **kw)
@@ -1,18 +1,188 @@
 # app/db/session.py
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import asyncio
 import os
+from dataclasses import dataclass
+from typing import Any, Optional
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine, async_sessionmaker, AsyncSession
 
-engine = create_engine(
-    DATABASE_URL,
-    echo=True,
-    future=True,
+from app.core.config import (
+    DATABASE_REPLICA_URLS,
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_STATEMENT_TIMEOUT_MS,
 )
+from app.db.metrics import InstrumentedQueuePool, instrument_engine
+from app.db.routing import READ_ONLY, ROUTER, ReplicaRouter, RoutingSession
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+# 同期ドライバのURL（postgresql+psycopg2 など）が渡された場合は async ドライバに寄せる
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    parsed = make_url(url)
+    drivername = ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+    return parsed.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+def engine_options(url: str) -> dict[str, Any]:
+    """プールと statement_timeout の設定（app.core.config の DB_POOL_* / DB_STATEMENT_TIMEOUT_MS）"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        # SQLite は方言ごとの既定のプール（メモリ DB なら StaticPool）のままにする
+        return {}
+    options: dict[str, Any] = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if parsed.get_driver_name() == "asyncpg" and DB_STATEMENT_TIMEOUT_MS > 0:
+        # 接続ごとのサーバー設定にするので、文ごとに SET を送る必要はない
+        options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+    return options
+
+
+def create_engine_for(url: str) -> AsyncEngine:
+    async_url = to_async_url(url)
+    # SQL の出力は SQL_LOG_LEVEL（sqlalchemy.engine ロガーのレベル）で制御する。echo は専用ハンドラを付けてしまうので使わない
+    engine = create_async_engine(async_url, future=True, **engine_options(async_url))
+    instrument_engine(engine.sync_engine)
+    return engine
+
+
+# engine は最初に使うときに作る（import しただけでは DB に触れない・DATABASE_URL も不要）
+_engine: Optional[AsyncEngine] = None
+
+
+def get_engine() -> AsyncEngine:
+    global _engine
+    if _engine is None:
+        if not DATABASE_URL:
+            raise RuntimeError("DATABASE_URL is not set")
+        _engine = create_engine_for(DATABASE_URL)
+    return _engine
+
+
+# DATABASE_REPLICA_URLS がなければ None のまま（すべてプライマリ）
+_replica_router: Optional[ReplicaRouter] = None
+
+
+def get_replica_router() -> Optional[ReplicaRouter]:
+    global _replica_router
+    if _replica_router is None and DATABASE_REPLICA_URLS:
+        _replica_router = ReplicaRouter([create_engine_for(url) for url in DATABASE_REPLICA_URLS])
+    return _replica_router
+
 
-SessionLocal = sessionmaker(
+async def dispose_engine() -> None:
+    global _engine, _replica_router
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = None
+    if _replica_router is not None:
+        await _replica_router.dispose()
+        _replica_router = None
+
+
+# AsyncSession は commit 後の属性アクセスで暗黙の再ロード（I/O）ができないため expire しない
+_session_factory = async_sessionmaker(
     autocommit=False,
     autoflush=False,
-    bind=engine,
+    expire_on_commit=False,
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
 )
+
+
+def SessionLocal(*, read_only: bool = False, **kwargs) -> AsyncSession:
+    """
+    sessionmaker と同じ呼び方で使う。最初の呼び出しで engine を作る
+    read_only=True ならレプリカがあるとき SELECT をそちらに流す（書き込んだ時点でプライマリに固定）
+    減少ジョブなど読み取りの鮮度が必要な処理は既定の read_only=False（常にプライマリ）で使う
+    """
+    info = {}
+    if read_only:
+        router = get_replica_router()
+        if router is not None:
+            info = {READ_ONLY: True, ROUTER: router}
+    return _session_factory(bind=get_engine(), info=info, **kwargs)
+
+
+async def warm_pool(connections: int) -> None:
+    """
+    起動時にプールへ接続を connections 本張っておく（最初のリクエストが接続確立を待たないように）
+    同時に借りないと同じ1本を使い回すだけになるので、全部借りてから返す
+    """
+    engine = get_engine()
+
+    async def ping(conn) -> None:
+        await conn.execute(text("SELECT 1"))
+
+    conns = []
+    try:
+        for _ in range(connections):
+            conns.append(await engine.connect())
+        await asyncio.gather(*(ping(conn) for conn in conns))
+    finally:
+        for conn in conns:
+            await conn.close()
+
+
+async def disable_statement_timeout(conn: AsyncConnection | AsyncSession) -> None:
+    """現在のトランザクションだけ statement_timeout を外す（マイグレーション・集計の作り直しなど長い処理用）"""
+    bind = conn.bind if isinstance(conn, AsyncSession) else conn
+    if bind.dialect.name == "postgresql":
+        await conn.execute(text("SET LOCAL statement_timeout = 0"))
+
+
+# PostgreSQL の query_canceled（statement_timeout による取り消しもこれになる）
+QUERY_CANCELED_SQLSTATE = "57014"
+
+
+def is_statement_timeout(error: DBAPIError) -> bool:
+    return getattr(error.orig, "pgcode", None) == QUERY_CANCELED_SQLSTATE
+
+
+@dataclass
+class PoolStats:
+    pool: str
+    size: int
+    checked_out: int
+    checked_in: int
+    overflow: int
+    max_overflow: int
+    timeout_seconds: float
+
+
+def pool_stats() -> Optional[PoolStats]:
+    """プールの現在の状態（engine をまだ作っていない、または QueuePool でなければ None）"""
+    if _engine is None:
+        return None
+    pool = _engine.sync_engine.pool
+    if not hasattr(pool, "checkedout"):
+        return None
+    return PoolStats(
+        pool=type(pool).__name__,
+        size=pool.size(),
+        checked_out=pool.checkedout(),
+        checked_in=pool.checkedin(),
+        # pool.overflow() は pool_size まで張っていないうちは負になるので 0 に丸める
+        overflow=max(pool.overflow(), 0),
+        max_overflow=pool._max_overflow,
+        timeout_seconds=pool.timeout(),
+    )
@@ -0,0 +1,49 @@
+# app/db/types.py
+import uuid
+from typing import Any, Optional
+
+from sqlalchemy import LargeBinary
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.types import TypeDecorator
+
+
+class InvalidUUID(ValueError):
+    """UUID として読めない値が GUID 列に渡された（API では 422 にする）"""
+
+
+def canonical_uuid(value: Any) -> str:
+    """UUID を小文字・ハイフン区切りの36文字にそろえる（大文字やハイフンなしも受け付ける）"""
+    try:
+        return str(value if isinstance(value, uuid.UUID) else uuid.UUID(str(value)))
+    except ValueError:
+        raise InvalidUUID(f"invalid UUID: {value!r}") from None
+
+
+class GUID(TypeDecorator):
+    """
+    UUID の列。アプリ側では文字列（canonical_uuid の形）で受け渡す
+    PostgreSQL はネイティブの uuid（16バイト）、それ以外は16バイトのバイナリで保存する
+    """
+
+    impl = LargeBinary(16)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(postgresql.UUID(as_uuid=False))
+        return dialect.type_descriptor(LargeBinary(16))
+
+    def process_bind_param(self, value: Any, dialect) -> Optional[Any]:
+        if value is None:
+            return None
+        canonical = canonical_uuid(value)
+        if dialect.name == "postgresql":
+            return canonical
+        return uuid.UUID(canonical).bytes
+
+    def process_result_value(self, value: Any, dialect) -> Optional[str]:
+        if value is None:
+            return None
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return str(uuid.UUID(bytes=bytes(value)))
+        return str(value)
@@ -1,42 +1,178 @@
 # app/main.py
-from fastapi import FastAPI
-from apscheduler.schedulers.background import BackgroundScheduler
+import time
+
+# コールドスタートの計測起点（import にかかる時間も含める）
+PROCESS_STARTED_AT = time.perf_counter()
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager, suppress
+
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import DBAPIError, StatementError, TimeoutError as PoolTimeoutError
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 
 from app.core.logging import setup_logging
-from app.db.session import SessionLocal
+from app.core.config import (
+    DB_WARM_CONNECTIONS,
+    KIRAKIRA_DECAY_MODE,
+    REPLICA_HEALTH_CHECK_INTERVAL,
+    REPLICA_HEALTH_CHECK_TIMEOUT,
+    STEP_INGEST_MODE,
+)
+from app.core import metrics
+from app.db import partitions
+from app.db.types import InvalidUUID
+from app.db.session import (
+    SessionLocal,
+    dispose_engine,
+    get_engine,
+    get_replica_router,
+    is_statement_timeout,
+    warm_pool,
+)
 from app.crud.symbol import symbol_crud
+from app.crud.step_buffer import step_write_buffer
 from app.api.api import api_router
-from app.db.base_class import Base
-from app.db.session import engine
+from app.api.middleware import MetricsMiddleware, RequestIdMiddleware
+from app.db.init_db import init_db
 
 setup_logging()
+metrics.process_started_at = PROCESS_STARTED_AT
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
 
-Base.metadata.create_all(bind=engine)
+scheduler = AsyncIOScheduler(timezone="UTC")
 
-scheduler = BackgroundScheduler(timezone="UTC")
+async def run_kirakira_decay():
+    # 減少対象の選定は最新の値で行うので常にプライマリ（read_only にしない）
+    async with SessionLocal() as db:
+        stats = await symbol_crud.decay_kirakira_levels(db)
+    metrics.kirakira_decay_runs_total.inc()
+    metrics.kirakira_decay_rows_total.inc(amount=stats.rows)
+    metrics.kirakira_decay_duration_seconds.observe(stats.duration_seconds)
+    metrics.kirakira_decay_last_rows.set(stats.rows)
+    logger.info(
+        f"kirakira decay: rows={stats.rows} batches={stats.batches} duration={stats.duration_seconds:.3f}s",
+        extra={"rows": stats.rows, "batches": stats.batches, "duration_seconds": stats.duration_seconds},
+    )
 
-def run_kirakira_decay():
-    db = SessionLocal()
-    try:
-        symbol_crud.decay_kirakira_levels(db)
-    finally:
-        db.close()
+async def run_step_partition_maintenance():
+    # 先の月のパーティションを作り、保持期間を過ぎた月を外す（他のワーカーが実行中なら何もしない）
+    result = await partitions.run_maintenance(get_engine())
+    if result.skipped:
+        return
+    logger.info(
+        f"step partitions: created={result.created} retired={result.retention.partitions}",
+        extra={
+            "partitions_created": result.created,
+            "retired": result.retention.partitions,
+            "default_rows_deleted": result.retention.default_rows_deleted,
+        },
+    )
+
+def warm_validators(app: FastAPI) -> None:
+    """OpenAPI スキーマとリクエスト・レスポンスモデルの組み立てを最初のリクエストより前に済ませる"""
+    for route in app.routes:
+        for field in (getattr(route, "body_field", None), getattr(route, "response_field", None)):
+            model = getattr(getattr(field, "field_info", None), "annotation", None)
+            if isinstance(model, type) and hasattr(model, "model_rebuild"):
+                model.model_rebuild()
+    app.openapi()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # スキーマはバージョンを確かめるだけ（作成・更新は python -m app.cli migrate）
+    await init_db()
+    if DB_WARM_CONNECTIONS > 0:
+        await warm_pool(DB_WARM_CONNECTIONS)
+    warm_validators(app)
 
-@app.on_event("startup")
-def start_scheduler():
+    replica_router = get_replica_router()
+    health_checks = None
+    if replica_router is not None:
+        # 最初の状態を確かめてから受け付ける
+        await replica_router.check(REPLICA_HEALTH_CHECK_TIMEOUT)
+        health_checks = asyncio.create_task(
+            replica_router.run_health_checks(REPLICA_HEALTH_CHECK_INTERVAL, REPLICA_HEALTH_CHECK_TIMEOUT)
+        )
+
+    # lazy モードでは読み出し時に減少を計算するので定期UPDATEは不要
+    if KIRAKIRA_DECAY_MODE == "job":
+        scheduler.add_job(
+            run_kirakira_decay,
+            IntervalTrigger(minutes=10),
+            id="kirakira_decay",
+            replace_existing=True,
+        )
+    # パーティションは数か月先まで作ってあるので1日1回で足りる（JST の深夜）
     scheduler.add_job(
-        run_kirakira_decay,
-        IntervalTrigger(minutes=10),
-        id="kirakira_decay",
+        run_step_partition_maintenance,
+        CronTrigger(hour=3, minute=0, timezone="Asia/Tokyo"),
+        id="step_partition_maintenance",
         replace_existing=True,
     )
     scheduler.start()
 
-@app.on_event("shutdown")
-def stop_scheduler():
-    scheduler.shutdown(wait=False)
+    if STEP_INGEST_MODE == "buffered":
+        step_write_buffer.start()
+
+    startup_seconds = time.perf_counter() - PROCESS_STARTED_AT
+    metrics.app_startup_seconds.set(startup_seconds)
+    logger.info(f"startup complete in {startup_seconds:.3f}s", extra={"startup_seconds": startup_seconds})
+    try:
+        yield
+    finally:
+        scheduler.shutdown(wait=False)
+        # 受け付け済みの歩数を書き切ってから接続を閉じる
+        await step_write_buffer.stop()
+        if health_checks is not None:
+            health_checks.cancel()
+            with suppress(asyncio.CancelledError):
+                await health_checks
+        await dispose_engine()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+# 最後に追加したものが一番外側になる。メトリクスの計測中のログにも request_id が付くように外側に置く
+app.add_middleware(RequestIdMiddleware)
+
+# プールが埋まっている・重い文が打ち切られたときは待たせ続けずに 503 ですぐ返す
+DB_BUSY_HEADERS = {"Retry-After": "1"}
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    logger.warning(f"connection pool exhausted: {request.method} {request.url.path}")
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Database is busy"},
+        headers=DB_BUSY_HEADERS,
+    )
+
+# パス・クエリの uuid が UUID として読めない（キャッシュキーを作るか GUID 列に渡したところで分かる）
+@app.exception_handler(InvalidUUID)
+async def invalid_uuid_handler(request: Request, exc: InvalidUUID):
+    return JSONResponse(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content={"detail": str(exc)})
+
+@app.exception_handler(StatementError)
+async def invalid_uuid_statement_handler(request: Request, exc: StatementError):
+    if not isinstance(exc.orig, InvalidUUID):
+        raise exc
+    return await invalid_uuid_handler(request, exc.orig)
+
+@app.exception_handler(DBAPIError)
+async def statement_timeout_handler(request: Request, exc: DBAPIError):
+    if not is_statement_timeout(exc):
+        raise exc
+    metrics.db_statement_timeouts_total.inc()
+    logger.warning(f"statement timeout: {request.method} {request.url.path}")
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Database query timed out"},
+        headers=DB_BUSY_HEADERS,
+    )
 
-app.include_router(api_router)
\ No newline at end of file
+app.include_router(api_router)
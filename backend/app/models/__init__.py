@@ -1,2 +1,5 @@
 # app/models/__init__.py
-from app.models.user import User
\ No newline at end of file
+from app.models.user import User
+from app.models.step import Step
+from app.models.symbol import Symbol
+from app.models.step_daily_total import StepDailyTotal
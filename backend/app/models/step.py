@@ -1,28 +1,32 @@
 # app/models/step.py
 import uuid
+from datetime import date
 
-from sqlalchemy import Column, Integer, String, Date, ForeignKey, Boolean, DateTime, func, Index
+from sqlalchemy import Column, Computed, Integer, Date, ForeignKey, Boolean, DateTime, and_, func, Index
 from sqlalchemy.orm import relationship
 
+from app.core.timezone import jst_day_to_utc_range
 from app.db.base_class import Base
+from app.db.expressions import jst_date
+from app.db.types import GUID
 
 
 class Step(Base):
     __tablename__ = "step"
 
+    # 主キー (uuid, created_at) の先頭列なので uuid だけの検索も主キーのインデックスで引ける
     uuid = Column(
-        String(36),
+        GUID,
         primary_key=True,
         default=lambda: str(uuid.uuid4()),
-        index=True
     )
 
     # ユーザーのuuid（FK）
+    # 単独のインデックスは張らない（uq_step_user_created_at_started の先頭列で引ける）
     user_uuid = Column(
-        String(36),
+        GUID,
         ForeignKey("user.uuid", ondelete="CASCADE"),
         nullable=False,
-        index=True,
     )
 
     # 歩数
@@ -38,17 +42,46 @@ class Step(Base):
         default=False,
     )
 
+    # PostgreSQL では月ごとのパーティションキー（app.db.partitions）。パーティション表の主キーはキーを含む必要があるので
+    # テーブルの主キーは (uuid, created_at)、ORM 上の識別子は uuid だけにする
+    # created_at 単独のインデックス（ix_step_created_at）は全ユーザーの一覧（GET /step/steps）の新しい順 + LIMIT に使う
+    # ほかのインデックスは user_uuid か uuid が先頭なので、これがないとページごとに step 全体を読んで並べ替える
     created_at = Column(
         DateTime(timezone=True),
+        primary_key=True,
         nullable=False,
         server_default=func.now(),
         index=True,
     )
 
+    # created_at の JST（Asia/Tokyo）での日付。DB が created_at から計算して保存する生成列で、書き込み側では値を渡さない
+    local_date = Column(
+        Date,
+        Computed(jst_date(created_at), persisted=True),
+        nullable=False,
+    )
+
     __table_args__ = (
-        Index("ix_step_user_date_created_at", "user_uuid", "created_at"),
+        # 日付指定の取得・日別集計の作り直しを (user_uuid, local_date) の等値で引く
+        Index("ix_step_user_local_date", "user_uuid", "local_date"),
+        # 自然キー。端末の再送で同じ計測が二重に入らないよう INSERT は ON CONFLICT DO NOTHING で行う（パーティションキーを含む）
+        # 先頭の (user_uuid, created_at) はユーザーごとの履歴・セッションの走査にも使う
+        Index("uq_step_user_created_at_started", "user_uuid", "created_at", "is_started", unique=True),
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
 
+    __mapper_args__ = {"primary_key": [uuid]}
+
+    @classmethod
+    def on_local_date(cls, local_date: date):
+        """
+        JST の local_date の行の条件
+        パーティションキーは created_at なので、同じ日の created_at の範囲も付けてパーティションを1つに絞る
+        """
+        start_at, end_at = jst_day_to_utc_range(local_date)
+        return and_(cls.local_date == local_date, cls.created_at >= start_at, cls.created_at < end_at)
+
 
     # リレーション
-    user = relationship("User", back_populates="steps")
+    # 暗黙の読み込みはしない（レスポンスでは null）。必要なときだけ ?include=user で明示的に読み込む
+    user = relationship("User", back_populates="steps", lazy="noload")
@@ -0,0 +1,29 @@
+# app/models/step_daily_total.py
+from sqlalchemy import Column, Integer, BigInteger, Date, ForeignKey, DateTime
+
+from app.db.base_class import Base
+from app.db.types import GUID
+
+
+# step テーブルのユーザー×JST日付ごとの集計（step の書き込みと同じトランザクションで更新する）
+class StepDailyTotal(Base):
+    __tablename__ = "step_daily_total"
+
+    # ユーザーのuuid（FK）
+    user_uuid = Column(
+        GUID,
+        ForeignKey("user.uuid", ondelete="CASCADE"),
+        primary_key=True,
+    )
+
+    # JST（Asia/Tokyo）での日付
+    local_date = Column(Date, primary_key=True)
+
+    # その日の合計歩数
+    total_steps = Column(BigInteger, nullable=False, default=0)
+
+    # その日の step 行数
+    sample_count = Column(Integer, nullable=False, default=0)
+
+    first_at = Column(DateTime(timezone=True), nullable=False)
+    last_at = Column(DateTime(timezone=True), nullable=False)
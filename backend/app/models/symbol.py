@@ -1,26 +1,33 @@
 # app/models/symbol.py
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, func, UniqueConstraint, Float
+from sqlalchemy import (
+    Column, Computed, Date, Integer, String, ForeignKey, DateTime, func, UniqueConstraint, Float, Index, case, text
+)
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 
 from app.db.base_class import Base
+from app.db.expressions import decay_periods, jst_date
+from app.db.types import GUID
+from app.core.config import DECAY_HOURS
+from app.core.kirakira import effective_kirakira_level
 import uuid
 
 class Symbol(Base):
     __tablename__ = "symbol"
 
+    # 主キーのインデックスで引けるので別のインデックスは張らない
     uuid = Column(
-        String(36),
+        GUID,
         primary_key=True,
         default=lambda: str(uuid.uuid4()),
-        index=True
     )
 
     # ユーザーのuuid（FK）
+    # 単独のインデックスは張らない（uq_user_symbol_name / ix_symbol_user_created_at の先頭列で引ける）
     user_uuid = Column(
-        String(36),
+        GUID,
         ForeignKey("user.uuid", ondelete="CASCADE"),
         nullable=False,
-        index=True,
     )
 
     symbol_name = Column(String(255), nullable=False)
@@ -31,6 +38,17 @@ class Symbol(Base):
 
     kirakira_level = Column(Integer, nullable=False)
 
+    # 座標を含むグリッドセル（app.core.spatial.grid_cell）。範囲検索・近傍検索はこのインデックスで絞る
+    grid_x = Column(Integer, nullable=False)
+    grid_y = Column(Integer, nullable=False)
+
+    # kirakira_level を設定した日時（減少の起点）。updated_at と違い名前や座標の変更では動かない
+    level_set_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+    )
+
     created_at = Column(
         DateTime(timezone=True),
         nullable=False,
@@ -38,6 +56,13 @@ class Symbol(Base):
         index=True,
     )
 
+    # created_at の JST（Asia/Tokyo）での日付（DB が計算して保存する生成列）
+    local_date = Column(
+        Date,
+        Computed(jst_date(created_at), persisted=True),
+        nullable=False,
+    )
+
     updated_at = Column(
         DateTime(timezone=True),
         nullable=False,
@@ -48,7 +73,32 @@ class Symbol(Base):
 
     __table_args__ = (
         UniqueConstraint('user_uuid', 'symbol_name', name='uq_user_symbol_name'),
+        # ユーザーごとの一覧をキーセットで辿るためのインデックス
+        Index("ix_symbol_user_created_at", "user_uuid", "created_at"),
+        # 日付を指定した一覧を (user_uuid, local_date) の等値で引く
+        Index("ix_symbol_user_local_date", "user_uuid", "local_date"),
+        # 地図の表示範囲・近傍検索用。セル範囲で引いてから正確な座標で絞る
+        Index("ix_symbol_grid", "grid_x", "grid_y"),
+        # 減少ジョブの対象（レベルが残っているシンボル）だけを level_set_at 順に引く部分インデックス
+        Index(
+            "ix_symbol_decay_level_set_at",
+            "level_set_at",
+            postgresql_where=text("kirakira_level > 0"),
+            sqlite_where=text("kirakira_level > 0"),
+        ),
     )
 
+    # 読み出し時点の実効キラキラレベル（Python でも SQL 式としても使える）
+    @hybrid_property
+    def effective_kirakira_level(self) -> int:
+        return effective_kirakira_level(self.kirakira_level, self.level_set_at)
+
+    @effective_kirakira_level.inplace.expression
+    @classmethod
+    def _effective_kirakira_level_expression(cls):
+        decayed = cls.kirakira_level - decay_periods(cls.level_set_at, DECAY_HOURS)
+        return case((decayed > 0, decayed), else_=0)
+
     # リレーション
-    user = relationship("User", back_populates="symbols")
\ No newline at end of file
+    # 暗黙の読み込みはしない（レスポンスでは null）。必要なときだけ ?include=user で明示的に読み込む
+    user = relationship("User", back_populates="symbols", lazy="noload")
\ No newline at end of file
@@ -3,16 +3,17 @@ from sqlalchemy import Column, Integer, String
 from sqlalchemy.orm import relationship
 
 from app.db.base_class import Base
+from app.db.types import GUID
 import uuid
 
 class User(Base):
     __tablename__ = "user"
 
+    # 主キーのインデックスで引けるので別のインデックスは張らない
     uuid = Column(
-        String(36),
+        GUID,
         primary_key=True,
         default=lambda: str(uuid.uuid4()),
-        index=True
     )
 
     name = Column(String(255), nullable=False)
@@ -0,0 +1,17 @@
+# app/schemas/bulk_import.py
+from pydantic import BaseModel, Field
+
+
+class ImportRowError(BaseModel):
+    row: int = Field(..., description="ファイル内のデータ行の番号（1始まり。CSV の列名の行は数えない）")
+    error: str
+
+
+class ImportResponse(BaseModel):
+    total: int = Field(0, ge=0, description="読み取ったデータ行の数")
+    inserted: int = Field(0, ge=0, description="登録した件数")
+    skipped: int = Field(0, ge=0, description="登録済み・ファイル内の重複で登録しなかった件数")
+    rejected: int = Field(0, ge=0, description="検証に失敗した件数")
+    errors: list[ImportRowError] = Field(
+        default_factory=list, description="検証に失敗した行（先頭から IMPORT_MAX_REPORTED_ERRORS 件まで）"
+    )
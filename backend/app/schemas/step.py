@@ -1,11 +1,12 @@
 # app/schemas/step.py
-from datetime import datetime as DateTimeType
+from datetime import date as DateType, datetime as DateTimeType
 from zoneinfo import ZoneInfo
-from typing import Optional
+from typing import Any, Optional
 
 from pydantic import BaseModel, Field, ConfigDict, field_serializer
 
-from app.schemas.user import UserResponse
+from app.schemas.user import UserResponse, UUIDStr
+from app.core.config import STEP_BATCH_MAX_ROWS
 
 JST = ZoneInfo("Asia/Tokyo")
 UTC = ZoneInfo("UTC")
@@ -23,7 +24,7 @@ class JSTResponseModel(BaseModel):
         return v
 
 class StepCreate(BaseModel):
-    user_uuid: str = Field(..., description="ユーザーUUID")
+    user_uuid: UUIDStr = Field(..., description="ユーザーUUID")
     step: int = Field(..., ge=0, description="歩数")
     is_started: bool = Field(..., description="開始の歩数か判断")
     created_at: DateTimeType = Field(..., description="作成日時")
@@ -55,6 +56,44 @@ class LatestSessionStepsResponse(JSTResponseModel):
     stopped_at: DateTimeType
     steps: int = Field(..., description="歩数")
 
+class StepSessionResponse(JSTResponseModel):
+    start_uuid: str
+    stop_uuid: str
+    started_at: DateTimeType
+    stopped_at: DateTimeType
+    duration_seconds: float = Field(..., description="start から stop までの秒数")
+    steps: int = Field(..., description="stop と start の歩数の差（負ならセンサーの巻き戻り）")
+
+class StepSessionsResponse(JSTResponseModel):
+    user_uuid: str
+    sessions: list[StepSessionResponse] = Field(..., description="stop の新しい順")
+    next_cursor: Optional[str] = Field(None, description="次のページのカーソル（最後のページなら null）")
+
 class DailyTotalStepsResponse(JSTResponseModel):
     user_uuid: str
-    total_steps: int = Field(..., ge=0, description="その日の合計歩数")
\ No newline at end of file
+    total_steps: int = Field(..., ge=0, description="その日の合計歩数")
+
+class DailyTotalsResponse(BaseModel):
+    # 1年分でも小さく返せるよう、日付と合計を同じ長さの配列（列形式）で返す
+    user_uuid: str
+    dates: list[DateType] = Field(..., description="JSTの日付（from〜to、欠けなし）")
+    totals: list[int] = Field(..., description="dates と同じ順の合計歩数（記録なしの日は0）")
+
+class StepBatchCreate(BaseModel):
+    # 1件ずつ StepCreate として検証し、不正な行だけを reject するため dict で受ける
+    steps: list[dict[str, Any]] = Field(
+        ..., max_length=STEP_BATCH_MAX_ROWS, description="StepCreate 形式の歩数データの配列"
+    )
+
+class StepBatchItemResult(BaseModel):
+    index: int = Field(..., description="リクエスト内の行番号（0始まり）")
+    accepted: bool
+    uuid: Optional[str] = None
+    error: Optional[str] = None
+    duplicate: bool = Field(False, description="同じ (created_at, is_started) の歩数が登録済みだったため何もしなかった")
+
+class StepBatchResponse(BaseModel):
+    accepted: int = Field(..., ge=0, description="登録された件数（登録済みの重複を含む）")
+    rejected: int = Field(..., ge=0, description="登録されなかった件数")
+    duplicates: int = Field(0, ge=0, description="登録済みだったため何もしなかった件数")
+    results: list[StepBatchItemResult]
@@ -3,9 +3,10 @@ from datetime import datetime as DateTimeType
 from zoneinfo import ZoneInfo
 from typing import Optional
 
-from pydantic import BaseModel, Field, ConfigDict, field_serializer
+from pydantic import BaseModel, Field, ConfigDict, field_serializer, model_validator
 
-from app.schemas.user import UserResponse
+from app.schemas.user import UserResponse, UUIDStr
+from app.core.kirakira import effective_kirakira_level
 
 JST = ZoneInfo("Asia/Tokyo")
 UTC = ZoneInfo("UTC")
@@ -23,7 +24,7 @@ class JSTResponseModel(BaseModel):
         return v
 
 class SymbolCreate(BaseModel):
-    user_uuid: str = Field(..., description="ユーザーUUID")
+    user_uuid: UUIDStr = Field(..., description="ユーザーUUID")
     symbol_name: str = Field(..., description="シンボル名")
     symbol_x_coord: float = Field(..., description="シンボルのX座標")
     symbol_y_coord: float = Field(..., description="シンボルのY座標")
@@ -45,7 +46,8 @@ class SymbolResponse(JSTResponseModel):
     symbol_name: str
     symbol_x_coord: float
     symbol_y_coord: float
-    kirakira_level: int
+    kirakira_level: int = Field(..., description="読み出し時点の実効キラキラレベル")
+    level_set_at: DateTimeType = Field(..., description="キラキラレベルを設定した日時（減少の起点）")
     created_at: DateTimeType
     updated_at: DateTimeType
 
@@ -53,8 +55,15 @@ class SymbolResponse(JSTResponseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+    @model_validator(mode="after")
+    def _apply_kirakira_decay(self):
+        # 保存値から DECAY_HOURS ごとの減少分を差し引く（job モードでも level_set_at が更新されるので同じ値になる）
+        self.kirakira_level = effective_kirakira_level(self.kirakira_level, self.level_set_at)
+        return self
+
 class UserSymbolsResponse(JSTResponseModel):
     user_uuid: str
     symbols: list[SymbolResponse] = Field(..., description="ユーザーのシンボル一覧")
+    next_cursor: Optional[str] = Field(None, description="次のページのカーソル（最後のページなら null）")
 
     model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
@@ -1,6 +1,11 @@
 # app/schemas/user.py
-from typing import Optional
-from pydantic import BaseModel, Field, ConfigDict
+from typing import Annotated, Optional
+from pydantic import AfterValidator, BaseModel, Field, ConfigDict
+
+from app.db.types import canonical_uuid
+
+# UUID 形式の文字列（小文字・ハイフン区切りにそろえる）。UUID でない値は DB に渡す前に 422 で弾く
+UUIDStr = Annotated[str, AfterValidator(canonical_uuid)]
 
 class UserCreate(BaseModel):
     name: str = Field(..., max_length=255)
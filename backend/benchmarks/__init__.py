@@ -0,0 +1,4 @@
+# 負荷試験・ベンチマーク
+#   python -m benchmarks.seed  : DATABASE_URL の DB に合成データを投入する
+#   python -m benchmarks.run   : API に実運用に近いリクエストを流し、ルートごとの結果を JSON で出力する
+#   python -m benchmarks.cold_start: uvicorn を起動し、最初のリクエストが成功するまでの時間を測る
@@ -0,0 +1,96 @@
+# benchmarks/cold_start.py
+# コールドスタートの計測: python -m benchmarks.cold_start --runs 5 --output cold_start.json
+#   uvicorn を子プロセスで起動し、最初のリクエストが成功するまでの時間を測る（DATABASE_URL の DB を使う）
+#   DB は先に python -m app.cli migrate で最新にしておく
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Optional
+
+import httpx
+
+from benchmarks.run import git_revision, summarize
+
+# 起動の完了を確かめるリクエスト（DB まで通るもの）
+PROBE_PATH = "/user/users?limit=1"
+
+
+def read_gauge(body: str, name: str) -> Optional[float]:
+    for line in body.splitlines():
+        if line.startswith(f"{name} "):
+            return float(line.split()[1])
+    return None
+
+
+def measure_once(args: argparse.Namespace) -> dict:
+    base_url = f"http://127.0.0.1:{args.port}"
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(args.port)],
+        env={**os.environ, "LOG_LEVEL": "WARNING"},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = started + args.timeout
+        with httpx.Client(base_url=base_url, timeout=1.0) as client:
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"server exited with code {proc.returncode}")
+                if time.perf_counter() > deadline:
+                    raise TimeoutError(f"no successful response within {args.timeout}s")
+                try:
+                    if client.get(PROBE_PATH).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(args.poll_interval)
+            first_request_ms = (time.perf_counter() - started) * 1000
+            # 2回目のリクエスト（温まった状態）との差も見る
+            second_started = time.perf_counter()
+            client.get(PROBE_PATH)
+            second_request_ms = (time.perf_counter() - second_started) * 1000
+            scraped = client.get("/metrics").text
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    startup_seconds = read_gauge(scraped, "app_startup_seconds")
+    return {
+        "first_request_ms": round(first_request_ms, 3),
+        "second_request_ms": round(second_request_ms, 3),
+        # サーバー側で測った値（プロセス内の import 開始から）
+        "server_startup_ms": round(startup_seconds * 1000, 3) if startup_seconds is not None else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.cold_start")
+    parser.add_argument("--runs", type=int, default=5, help="起動を繰り返す回数")
+    parser.add_argument("--port", type=int, default=18000)
+    parser.add_argument("--timeout", type=float, default=60.0, help="1回の起動を待つ上限（秒）")
+    parser.add_argument("--poll-interval", type=float, default=0.01, help="起動待ちのポーリング間隔（秒）")
+    parser.add_argument("--output", default=None, help="結果 JSON の出力先（省略時は標準出力）")
+    args = parser.parse_args()
+
+    runs = [measure_once(args) for _ in range(args.runs)]
+    result = {
+        "meta": {"git_revision": git_revision(), "runs": args.runs, "probe": PROBE_PATH},
+        "first_request": {
+            k: v for k, v in summarize([r["first_request_ms"] for r in runs], 1.0).items() if k.endswith("_ms")
+        },
+        "runs": runs,
+    }
+    body = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            fp.write(body + "\n")
+    else:
+        sys.stdout.write(body + "\n")
+
+
+if __name__ == "__main__":
+    main()
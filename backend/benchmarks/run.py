@@ -0,0 +1,349 @@
+# benchmarks/run.py
+# 負荷試験: python -m benchmarks.run --duration 60 --concurrency 32 --output result.json
+#   --base-url を省略するとプロセス内の app に直接リクエストする（DATABASE_URL の DB を使う）
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+import httpx
+from sqlalchemy import select
+
+from app.db.session import SessionLocal, dispose_engine, get_engine
+from app.crud.symbol import symbol_crud
+from app.core.timezone import to_jst_date
+from app.models.symbol import Symbol
+from app.models.user import User
+
+from benchmarks.seed import AREA_MAX_X, AREA_MAX_Y, AREA_MIN_X, AREA_MIN_Y
+
+# リクエストに使うユーザー・シンボルの最大数（DB から先に読んでおく）
+SAMPLE_USERS = 1000
+SAMPLE_SYMBOLS = 5000
+
+
+@dataclass
+class Fixtures:
+    user_uuids: list[str]
+    symbol_uuids: list[str]
+
+
+@dataclass
+class RouteStats:
+    latencies_ms: list[float] = field(default_factory=list)
+    errors: int = 0
+    status_codes: dict[int, int] = field(default_factory=lambda: defaultdict(int))
+
+
+def percentile(sorted_values: list[float], p: float) -> Optional[float]:
+    """nearest-rank 方式のパーセンタイル"""
+    if not sorted_values:
+        return None
+    rank = max(1, round(p / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies_ms: list[float], elapsed: float) -> dict:
+    values = sorted(latencies_ms)
+    return {
+        "count": len(values),
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed > 0 else 0.0,
+        "mean_ms": round(sum(values) / len(values), 3) if values else None,
+        "p50_ms": percentile(values, 50),
+        "p95_ms": percentile(values, 95),
+        "p99_ms": percentile(values, 99),
+        "max_ms": values[-1] if values else None,
+    }
+
+
+# ---- リクエストの組み合わせ ----
+# (ルート名, 重み, リクエストを作る関数)。ルート名は集計のキーになるので URL のテンプレートで書く
+Request = tuple[str, str, dict]
+
+
+def post_step(rng: random.Random, f: Fixtures) -> Request:
+    created_at = datetime.now(timezone.utc) - timedelta(microseconds=rng.randrange(10**9))
+    return "POST", "/step/steps", {
+        "json": {
+            "user_uuid": rng.choice(f.user_uuids),
+            "step": rng.randint(0, 3000),
+            "is_started": rng.random() < 0.5,
+            "created_at": created_at.isoformat(),
+        }
+    }
+
+
+def post_step_batch(rng: random.Random, f: Fixtures) -> Request:
+    user_uuid = rng.choice(f.user_uuids)
+    base = datetime.now(timezone.utc) - timedelta(hours=rng.randrange(24))
+    return "POST", "/step/steps/batch", {
+        "json": {
+            "steps": [
+                {
+                    "user_uuid": user_uuid,
+                    "step": rng.randint(0, 3000),
+                    "is_started": i % 2 == 0,
+                    "created_at": (base + timedelta(seconds=i, microseconds=rng.randrange(10**6))).isoformat(),
+                }
+                for i in range(20)
+            ]
+        }
+    }
+
+
+def get_daily_total(rng: random.Random, f: Fixtures) -> Request:
+    target_date = to_jst_date(datetime.now(timezone.utc) - timedelta(days=rng.randrange(7)))
+    return "GET", f"/step/users/{rng.choice(f.user_uuids)}/steps/daily-total/{target_date}", {}
+
+
+def get_daily_totals(rng: random.Random, f: Fixtures) -> Request:
+    to_date = to_jst_date(datetime.now(timezone.utc))
+    return "GET", f"/step/users/{rng.choice(f.user_uuids)}/steps/daily-totals", {
+        "params": {"from": str(to_date - timedelta(days=29)), "to": str(to_date)}
+    }
+
+
+def get_latest_session(rng: random.Random, f: Fixtures) -> Request:
+    return "GET", f"/step/users/{rng.choice(f.user_uuids)}/steps/steps/session/latest", {}
+
+
+def get_sessions(rng: random.Random, f: Fixtures) -> Request:
+    return "GET", f"/step/users/{rng.choice(f.user_uuids)}/steps/sessions", {"params": {"limit": 20}}
+
+
+def get_steps_by_user(rng: random.Random, f: Fixtures) -> Request:
+    return "GET", f"/step/users/{rng.choice(f.user_uuids)}/steps", {"params": {"limit": 50}}
+
+
+def get_user(rng: random.Random, f: Fixtures) -> Request:
+    return "GET", f"/user/users/{rng.choice(f.user_uuids)}", {}
+
+
+def get_users(rng: random.Random, f: Fixtures) -> Request:
+    return "GET", "/user/users", {"params": {"limit": 50}}
+
+
+def get_symbols_by_user(rng: random.Random, f: Fixtures) -> Request:
+    return "GET", f"/symbol/users/{rng.choice(f.user_uuids)}/symbols", {}
+
+
+def get_symbol(rng: random.Random, f: Fixtures) -> Request:
+    return "GET", f"/symbol/symbols/{rng.choice(f.symbol_uuids)}", {}
+
+
+def get_kirakira_remaining_time(rng: random.Random, f: Fixtures) -> Request:
+    return "GET", f"/symbol/symbols/{rng.choice(f.symbol_uuids)}/kirakira_remaining_time", {}
+
+
+def put_symbol(rng: random.Random, f: Fixtures) -> Request:
+    return "PUT", f"/symbol/symbols/{rng.choice(f.symbol_uuids)}", {
+        "json": {"kirakira_level": rng.randint(0, 3)}
+    }
+
+
+def get_symbols_in_box(rng: random.Random, f: Fixtures) -> Request:
+    # スマホの地図1画面分（約 2km 四方）
+    min_x = rng.uniform(AREA_MIN_X, AREA_MAX_X - 0.02)
+    min_y = rng.uniform(AREA_MIN_Y, AREA_MAX_Y - 0.02)
+    return "GET", "/symbol/symbols/in-box", {
+        "params": {"min_x": min_x, "min_y": min_y, "max_x": min_x + 0.02, "max_y": min_y + 0.02}
+    }
+
+
+def get_nearest_symbols(rng: random.Random, f: Fixtures) -> Request:
+    return "GET", "/symbol/symbols/nearest", {
+        "params": {"x": rng.uniform(AREA_MIN_X, AREA_MAX_X), "y": rng.uniform(AREA_MIN_Y, AREA_MAX_Y), "k": 10}
+    }
+
+
+def get_cache_stats(rng: random.Random, f: Fixtures) -> Request:
+    return "GET", "/cache/stats", {}
+
+
+WORKLOAD: list[tuple[str, int, Callable[[random.Random, Fixtures], Request]]] = [
+    ("POST /step/steps", 30, post_step),
+    ("POST /step/steps/batch", 2, post_step_batch),
+    ("GET /step/users/{user_uuid}/steps/daily-total/{target_date}", 20, get_daily_total),
+    ("GET /step/users/{user_uuid}/steps/daily-totals", 3, get_daily_totals),
+    ("GET /step/users/{user_uuid}/steps/steps/session/latest", 5, get_latest_session),
+    ("GET /step/users/{user_uuid}/steps/sessions", 2, get_sessions),
+    ("GET /step/users/{user_uuid}/steps", 2, get_steps_by_user),
+    ("GET /user/users/{uuid}", 5, get_user),
+    ("GET /user/users", 1, get_users),
+    ("GET /symbol/users/{user_uuid}/symbols", 12, get_symbols_by_user),
+    ("GET /symbol/symbols/{uuid}", 3, get_symbol),
+    ("GET /symbol/symbols/{uuid}/kirakira_remaining_time", 3, get_kirakira_remaining_time),
+    ("PUT /symbol/symbols/{uuid}", 2, put_symbol),
+    ("GET /symbol/symbols/in-box", 6, get_symbols_in_box),
+    ("GET /symbol/symbols/nearest", 3, get_nearest_symbols),
+    ("GET /cache/stats", 1, get_cache_stats),
+]
+
+
+async def load_fixtures() -> Fixtures:
+    async with SessionLocal() as db:
+        user_uuids = list((await db.execute(select(User.uuid).limit(SAMPLE_USERS))).scalars().all())
+        symbol_uuids = list((await db.execute(select(Symbol.uuid).limit(SAMPLE_SYMBOLS))).scalars().all())
+    if not user_uuids or not symbol_uuids:
+        raise SystemExit("no users/symbols found: run `python -m benchmarks.seed` first")
+    return Fixtures(user_uuids=user_uuids, symbol_uuids=symbol_uuids)
+
+
+async def worker(
+    client: httpx.AsyncClient,
+    rng: random.Random,
+    fixtures: Fixtures,
+    deadline: float,
+    stats: dict[str, RouteStats],
+) -> None:
+    names = [name for name, _, _ in WORKLOAD]
+    weights = [weight for _, weight, _ in WORKLOAD]
+    builders = {name: build for name, _, build in WORKLOAD}
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        method, url, kwargs = builders[name](rng, fixtures)
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            status_code = response.status_code
+        except httpx.HTTPError:
+            status_code = 0
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        route = stats[name]
+        route.latencies_ms.append(round(elapsed_ms, 3))
+        route.status_codes[status_code] += 1
+        # 404（セッションがない等）は正常な応答として扱う
+        if status_code == 0 or status_code >= 500:
+            route.errors += 1
+
+
+async def decay_loop(deadline: float, interval: float, durations_ms: list[float], rows: list[int]) -> None:
+    """API と並行して減少ジョブを流す（KIRAKIRA_DECAY_MODE=job の運用を再現する）"""
+    while time.perf_counter() < deadline:
+        async with SessionLocal() as db:
+            result = await symbol_crud.decay_kirakira_levels(db)
+        durations_ms.append(round(result.duration_seconds * 1000, 3))
+        rows.append(result.rows)
+        await asyncio.sleep(interval)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> dict:
+    started_at = datetime.now(timezone.utc)
+    fixtures = await load_fixtures()
+
+    if args.base_url:
+        transport = None
+        base_url = args.base_url
+    else:
+        from app.main import app
+
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://bench"
+
+    stats: dict[str, RouteStats] = defaultdict(RouteStats)
+    decay_durations_ms: list[float] = []
+    decay_rows: list[int] = []
+
+    async with httpx.AsyncClient(base_url=base_url, transport=transport, timeout=args.timeout) as client:
+        # ウォームアップ（コネクションプール・キャッシュを温める。結果には含めない）
+        warmup_deadline = time.perf_counter() + args.warmup
+        warmup_stats: dict[str, RouteStats] = defaultdict(RouteStats)
+        await asyncio.gather(
+            *(
+                worker(client, random.Random(args.seed * 1000 + i), fixtures, warmup_deadline, warmup_stats)
+                for i in range(args.concurrency)
+            )
+        )
+
+        started = time.perf_counter()
+        deadline = started + args.duration
+        tasks = [
+            worker(client, random.Random(args.seed * 1000 + args.concurrency + i), fixtures, deadline, stats)
+            for i in range(args.concurrency)
+        ]
+        if args.decay_interval > 0:
+            tasks.append(decay_loop(deadline, args.decay_interval, decay_durations_ms, decay_rows))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    all_latencies = [latency for route in stats.values() for latency in route.latencies_ms]
+    return {
+        "meta": {
+            "git_revision": git_revision(),
+            "started_at": started_at.isoformat(),
+            "target": args.base_url or "in-process",
+            "database": get_engine().dialect.name,
+            "python": platform.python_version(),
+            "duration_seconds": round(elapsed, 3),
+            "warmup_seconds": args.warmup,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "users": len(fixtures.user_uuids),
+            "symbols": len(fixtures.symbol_uuids),
+        },
+        "total": {
+            **summarize(all_latencies, elapsed),
+            "errors": sum(route.errors for route in stats.values()),
+        },
+        "routes": {
+            name: {
+                **summarize(stats[name].latencies_ms, elapsed),
+                "errors": stats[name].errors,
+                "status_codes": {str(code): count for code, count in sorted(stats[name].status_codes.items())},
+            }
+            for name, _, _ in WORKLOAD
+            if name in stats
+        },
+        "decay_job": {
+            "runs": len(decay_durations_ms),
+            "rows": sum(decay_rows),
+            **{k: v for k, v in summarize(decay_durations_ms, elapsed).items() if k.endswith("_ms")},
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run")
+    parser.add_argument("--base-url", default=None, help="計測する API の URL（省略時はプロセス内の app）")
+    parser.add_argument("--duration", type=float, default=60.0, help="計測時間（秒）")
+    parser.add_argument("--warmup", type=float, default=5.0, help="計測前のウォームアップ時間（秒）")
+    parser.add_argument("--concurrency", type=int, default=16, help="同時に投げるリクエスト数")
+    parser.add_argument("--decay-interval", type=float, default=5.0, help="減少ジョブの実行間隔（秒）。0 で実行しない")
+    parser.add_argument("--timeout", type=float, default=30.0, help="1リクエストのタイムアウト（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード（同じ値なら同じリクエスト列になる）")
+    parser.add_argument("--output", default=None, help="結果 JSON の出力先（省略時は標準出力）")
+    args = parser.parse_args()
+
+    async def main_async() -> dict:
+        try:
+            return await run(args)
+        finally:
+            await dispose_engine()
+
+    result = asyncio.run(main_async())
+    body = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            fp.write(body + "\n")
+    else:
+        sys.stdout.write(body + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# benchmarks/seed.py
+# 合成データの投入: python -m benchmarks.seed --users 1000 --days 30 --steps-per-day 20 --symbols-per-user 10
+import argparse
+import asyncio
+import random
+import time
+import uuid as uuid_lib
+from datetime import datetime, timedelta, timezone
+
+from app.db.bulk import bulk_insert
+from app.db import migrations
+from app.db.session import SessionLocal, dispose_engine, get_engine
+from app.core.spatial import grid_index
+from app.crud.step_daily_total import step_daily_total_crud
+from app.models.step import Step
+from app.models.symbol import Symbol
+from app.models.user import User
+
+# シンボルを置く範囲（経度, 緯度）。東京周辺
+AREA_MIN_X, AREA_MAX_X = 139.5, 139.9
+AREA_MIN_Y, AREA_MAX_Y = 35.5, 35.8
+
+# 1トランザクションで投入する最大行数
+CHUNK_ROWS = 10000
+
+
+def build_user(rng: random.Random) -> dict:
+    return {
+        "uuid": str(uuid_lib.UUID(int=rng.getrandbits(128), version=4)),
+        "name": f"bench-{rng.randrange(10**8):08d}",
+        "length": rng.randint(140, 200),
+        "weight": rng.randint(40, 110),
+    }
+
+
+def build_steps(rng: random.Random, user_uuid: str, days: int, steps_per_day: int, now: datetime) -> list[dict]:
+    """1日 steps_per_day 件（開始・停止の組）を、過去 days 日分作る"""
+    rows = []
+    for day in range(days):
+        day_start = (now - timedelta(days=day)).replace(hour=0, minute=0, second=0, microsecond=0)
+        offsets = sorted(rng.sample(range(24 * 3600), steps_per_day))
+        for i, offset in enumerate(offsets):
+            rows.append(
+                {
+                    "uuid": str(uuid_lib.UUID(int=rng.getrandbits(128), version=4)),
+                    "user_uuid": user_uuid,
+                    "step": rng.randint(0, 3000),
+                    "is_started": i % 2 == 0,
+                    "created_at": day_start + timedelta(seconds=offset),
+                }
+            )
+    return rows
+
+
+def build_symbols(rng: random.Random, user_uuid: str, count: int, now: datetime) -> list[dict]:
+    rows = []
+    for i in range(count):
+        x = rng.uniform(AREA_MIN_X, AREA_MAX_X)
+        y = rng.uniform(AREA_MIN_Y, AREA_MAX_Y)
+        created_at = now - timedelta(seconds=rng.randrange(30 * 24 * 3600))
+        rows.append(
+            {
+                "uuid": str(uuid_lib.UUID(int=rng.getrandbits(128), version=4)),
+                "user_uuid": user_uuid,
+                "symbol_name": f"symbol-{i}",
+                "symbol_x_coord": x,
+                "symbol_y_coord": y,
+                "kirakira_level": rng.randint(0, 3),
+                "grid_x": grid_index(x),
+                "grid_y": grid_index(y),
+                # 減少ジョブの対象が常にある程度残るよう、設定日時を過去1週間に散らす
+                "level_set_at": now - timedelta(seconds=rng.randrange(7 * 24 * 3600)),
+                "created_at": created_at,
+                "updated_at": created_at,
+            }
+        )
+    return rows
+
+
+async def insert_chunked(table, rows: list[dict]) -> None:
+    for start in range(0, len(rows), CHUNK_ROWS):
+        async with SessionLocal() as db:
+            await bulk_insert(db, table, rows[start:start + CHUNK_ROWS])
+            await db.commit()
+
+
+async def seed(args: argparse.Namespace) -> None:
+    await migrations.upgrade(get_engine())
+
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone.utc)
+    started = time.perf_counter()
+
+    users = [build_user(rng) for _ in range(args.users)]
+    await insert_chunked(User.__table__, users)
+
+    step_count = symbol_count = 0
+    steps: list[dict] = []
+    symbols: list[dict] = []
+    for user in users:
+        steps += build_steps(rng, user["uuid"], args.days, args.steps_per_day, now)
+        symbols += build_symbols(rng, user["uuid"], args.symbols_per_user, now)
+        if len(steps) >= CHUNK_ROWS:
+            await insert_chunked(Step.__table__, steps)
+            step_count += len(steps)
+            steps = []
+        if len(symbols) >= CHUNK_ROWS:
+            await insert_chunked(Symbol.__table__, symbols)
+            symbol_count += len(symbols)
+            symbols = []
+    await insert_chunked(Step.__table__, steps)
+    await insert_chunked(Symbol.__table__, symbols)
+    step_count += len(steps)
+    symbol_count += len(symbols)
+
+    # 日別集計は step テーブルからまとめて作る
+    async with SessionLocal() as db:
+        rollup_count = await step_daily_total_crud.rebuild(db)
+
+    print(
+        f"seeded users={len(users)} steps={step_count} symbols={symbol_count} "
+        f"step_daily_total={rollup_count} in {time.perf_counter() - started:.1f}s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.seed")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=30, help="歩数を作る過去の日数")
+    parser.add_argument("--steps-per-day", type=int, default=20, help="1ユーザー1日あたりの step 行数")
+    parser.add_argument("--symbols-per-user", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード（同じ値なら同じデータになる）")
+    args = parser.parse_args()
+
+    async def run() -> None:
+        try:
+            await seed(args)
+        finally:
+            await dispose_engine()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+# tests/conftest.py
+# python -m pytest -q（backend ディレクトリで実行）。一時ファイルの SQLite に対して app をプロセス内で動かす
+import os
+import tempfile
+
+# 設定は app の import 時に環境変数から読むので、import より前に決める
+_TMPDIR = tempfile.mkdtemp(prefix="powers-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMPDIR, 'test.db')}"
+os.environ["DB_STARTUP_MODE"] = "migrate"
+# 発行する SQL を数えるテストがあるので、読み取りキャッシュは使わない
+os.environ["CACHE_BACKEND"] = "none"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,91 @@
+# tests/test_migrations.py
+# バージョン管理前（create_all で作っていた頃）の SQLite DB を HEAD まで上げて、既存のデータが読めることを確かめる
+import asyncio
+import sqlite3
+import uuid
+from datetime import date
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud.step_daily_total import step_daily_total_crud
+from app.db import migrations
+from app.db.session import create_engine_for
+
+# バージョン管理前のモデルが create_all で作っていたスキーマ（uuid は36文字の文字列）
+LEGACY_SCHEMA = """
+CREATE TABLE user (
+    uuid VARCHAR(36) NOT NULL PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    length INTEGER NOT NULL,
+    weight INTEGER NOT NULL
+);
+CREATE INDEX ix_user_uuid ON user (uuid);
+CREATE TABLE step (
+    uuid VARCHAR(36) NOT NULL PRIMARY KEY,
+    user_uuid VARCHAR(36) NOT NULL REFERENCES user (uuid) ON DELETE CASCADE,
+    step INTEGER NOT NULL,
+    is_started BOOLEAN NOT NULL,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL
+);
+CREATE INDEX ix_step_uuid ON step (uuid);
+CREATE INDEX ix_step_user_uuid ON step (user_uuid);
+CREATE INDEX ix_step_created_at ON step (created_at);
+CREATE INDEX ix_step_user_date_created_at ON step (user_uuid, created_at);
+CREATE TABLE symbol (
+    uuid VARCHAR(36) NOT NULL PRIMARY KEY,
+    user_uuid VARCHAR(36) NOT NULL REFERENCES user (uuid) ON DELETE CASCADE,
+    symbol_name VARCHAR(255) NOT NULL,
+    symbol_x_coord FLOAT NOT NULL,
+    symbol_y_coord FLOAT NOT NULL,
+    kirakira_level INTEGER NOT NULL,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL,
+    updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL,
+    CONSTRAINT uq_user_symbol_name UNIQUE (user_uuid, symbol_name)
+);
+CREATE INDEX ix_symbol_uuid ON symbol (uuid);
+CREATE INDEX ix_symbol_user_uuid ON symbol (user_uuid);
+CREATE INDEX ix_symbol_created_at ON symbol (created_at);
+CREATE INDEX ix_symbol_updated_at ON symbol (updated_at);
+"""
+
+
+def _create_legacy_db(path: str, user_uuid: str) -> None:
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.execute("INSERT INTO user VALUES (?, 'legacy', 170, 60)", (user_uuid,))
+    # JST の 10/1 に 100 + 250 歩、10/2 に 40 歩（created_at は UTC）
+    conn.executemany(
+        "INSERT INTO step VALUES (?, ?, ?, 0, ?)",
+        [
+            (str(uuid.uuid4()), user_uuid, 100, "2026-10-01 00:00:00.000000"),
+            (str(uuid.uuid4()), user_uuid, 250, "2026-10-01 09:00:00.000000"),
+            (str(uuid.uuid4()), user_uuid, 40, "2026-10-01 15:30:00.000000"),
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+
+async def _upgrade_and_read(url: str, user_uuid: str) -> tuple[list[int], dict[date, int]]:
+    engine = create_engine_for(url)
+    try:
+        applied = await migrations.upgrade(engine)
+        async with AsyncSession(engine) as db:
+            totals = await step_daily_total_crud.get_range(
+                db, user_uuid=user_uuid, from_date=date(2026, 9, 30), to_date=date(2026, 10, 2)
+            )
+    finally:
+        await engine.dispose()
+    return applied, totals
+
+
+def test_upgrade_keeps_daily_totals(tmp_path):
+    user_uuid = str(uuid.uuid4())
+    path = tmp_path / "legacy.db"
+    _create_legacy_db(str(path), user_uuid)
+
+    applied, totals = asyncio.run(_upgrade_and_read(f"sqlite:///{path}", user_uuid))
+
+    assert applied == [m.version for m in migrations.MIGRATIONS]
+    # 1 で作った空の集計テーブルが step から埋まっている
+    assert totals == {date(2026, 10, 1): 350, date(2026, 10, 2): 40}
@@ -0,0 +1,102 @@
+# tests/test_query_count.py
+# 一覧のレスポンスで user を行ごとに読み込まない（N+1 にならない）ことを、1リクエストで発行した SQL の数で確かめる
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+
+from app.db.session import get_engine
+
+USERS = 3
+ROWS_PER_USER = 5
+
+# (パス, ?include=user なしの文の数, ありの文の数)
+# 一覧の SELECT が1文。?include=user のときは全行のユーザーをまとめて引く1文（selectinload の IN）が増えるだけで、行数によらない
+LIST_ENDPOINTS = [
+    ("/step/steps", 1, 2),
+    ("/step/users/{user_uuid}/steps", 1, 2),
+    ("/symbol/symbols", 1, 2),
+    ("/symbol/users/{user_uuid}/symbols", 1, 2),
+    ("/symbol/symbols/in-box?min_x=139&min_y=35&max_x=140&max_y=36", 1, 2),
+    ("/symbol/symbols/nearest?x=139.7&y=35.6&k=10", 1, 2),
+]
+
+
+@contextmanager
+def count_statements():
+    """with の中で DB に送った SQL 文を集める"""
+    statements: list[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = get_engine().sync_engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture(scope="module")
+def user_uuids(client) -> list[str]:
+    """USERS 人のユーザーと、それぞれ ROWS_PER_USER 件の歩数・シンボルを作る"""
+    uuids = []
+    started = datetime(2026, 10, 1, tzinfo=timezone.utc)
+    for i in range(USERS):
+        response = client.post("/user/users", json={"name": f"user-{i}", "length": 170, "weight": 60})
+        assert response.status_code == 201, response.text
+        user_uuid = response.json()["uuid"]
+        uuids.append(user_uuid)
+        steps = [
+            {
+                "user_uuid": user_uuid,
+                "step": 100,
+                "is_started": False,
+                "created_at": (started + timedelta(minutes=j)).isoformat(),
+            }
+            for j in range(ROWS_PER_USER)
+        ]
+        response = client.post("/step/steps/batch", json={"steps": steps})
+        assert response.json()["accepted"] == ROWS_PER_USER, response.text
+        for j in range(ROWS_PER_USER):
+            response = client.post(
+                "/symbol/symbols",
+                json={
+                    "user_uuid": user_uuid,
+                    "symbol_name": f"symbol-{j}",
+                    "symbol_x_coord": 139.7 + 0.001 * j,
+                    "symbol_y_coord": 35.6 + 0.001 * i,
+                    "kirakira_level": 1,
+                },
+            )
+            assert response.status_code == 201, response.text
+    return uuids
+
+
+def _items(body):
+    # ユーザーごとのシンボル一覧だけは {"symbols": [...]} で返る
+    return body["symbols"] if isinstance(body, dict) else body
+
+
+@pytest.mark.parametrize("path, expected, expected_with_user", LIST_ENDPOINTS)
+def test_list_statement_count(client, user_uuids, path, expected, expected_with_user):
+    path = path.format(user_uuid=user_uuids[0])
+    separator = "&" if "?" in path else "?"
+
+    with count_statements() as statements:
+        response = client.get(path)
+    assert response.status_code == 200, response.text
+    items = _items(response.json())
+    assert len(items) > 1
+    # 指定がなければ user は読み込まない（null）
+    assert all(item["user"] is None for item in items)
+    assert len(statements) == expected, statements
+
+    with count_statements() as statements_with_user:
+        response = client.get(f"{path}{separator}include=user")
+    assert response.status_code == 200, response.text
+    items = _items(response.json())
+    assert all(item["user"] is not None for item in items)
+    assert len(statements_with_user) == expected_with_user, statements_with_user
@@ -0,0 +1,39 @@
+# tests/test_step_buffer.py
+# 書き込みバッファ（STEP_INGEST_MODE=buffered）の read-your-writes
+import pytest
+
+from app.api.endpoints import step as step_endpoints
+from app.crud.step_buffer import step_write_buffer
+
+
+@pytest.fixture
+def buffered(client, monkeypatch):
+    """バッファを有効にする。間隔ではまず書かれないので、読み出しが待たなければ行はキューに残ったまま"""
+    monkeypatch.setattr(step_endpoints, "STEP_INGEST_MODE", "buffered")
+    monkeypatch.setattr(step_write_buffer, "flush_interval", 60.0)
+
+    async def start() -> None:
+        step_write_buffer.start()
+
+    client.portal.call(start)
+    yield
+    client.portal.call(step_write_buffer.stop)
+
+
+@pytest.mark.parametrize(
+    "spell", [str.upper, lambda value: value.replace("-", "")], ids=["uppercase", "unhyphenated"]
+)
+def test_read_waits_for_buffered_steps_with_non_canonical_uuid(client, buffered, spell):
+    response = client.post("/user/users", json={"name": "buffered", "length": 170, "weight": 60})
+    assert response.status_code == 201, response.text
+    user_uuid = response.json()["uuid"]
+
+    response = client.post(
+        "/step/steps",
+        json={"user_uuid": user_uuid, "step": 120, "is_started": False, "created_at": "2026-10-01T12:00:00+09:00"},
+    )
+    assert response.status_code == 202, response.text
+
+    response = client.get(f"/step/users/{spell(user_uuid)}/steps/daily-total/2026-10-01")
+    assert response.status_code == 200, response.text
+    assert response.json()["total_steps"] == 120